@@ -1,25 +1,126 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 from flask_cors import CORS
 import os
 import uuid
 from datetime import datetime
 import json
 
-from config import MUSIC_DIR, OUTPUT_DIR, ALLOWED_EXTENSIONS, DANCE_STYLES
-from models.music_processor import MusicProcessor
-from models.dance_generator import DanceGenerator
-from models.visualization import DanceVisualizer
+from config import MUSIC_DIR, OUTPUT_DIR, ALLOWED_EXTENSIONS, DANCE_STYLES, FORMATION_CONFIG, \
+    PROFILING_CONFIG, CAMERA_CONFIG, REHEARSAL_CONFIG, PRACTICE_CONFIG, ANALYSIS_PROFILES, ANALYSIS_ENDPOINT_PROFILES
+from models import pipeline
 from utils.file_utils import allowed_file, save_uploaded_file
+from utils.profiling import metrics, trace_request, count
+from utils.admission import AdmissionController, AdmissionRejected, estimate_audio_duration, \
+    estimate_render_cost
+from utils.sequence_store import load_meta
+from utils.peaks import select_range
+from models.practice import quantize_speed
+from models.rehearsal import parse_keypoints, keypoints_from_json
+from models.animation_export import EXPORT_FORMATS
 
 app = Flask(__name__)
 CORS(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB限制
 
-# 初始化处理器
-music_processor = MusicProcessor()
-dance_generator = DanceGenerator()
-dance_visualizer = DanceVisualizer()
+# 准入控制：分析和渲染分别限流
+admission = AdmissionController()
+
+
+def _estimate_upload_cost():
+    """上传分析的成本：按上传大小和格式估算音频时长"""
+    file = request.files.get('music_file')
+    extension = file.filename.rsplit('.', 1)[-1] if file and '.' in file.filename else None
+    return estimate_audio_duration(size_bytes=request.content_length, extension=extension)
+
+
+def _estimate_generation_cost():
+    """生成的成本：音频时长 × 画面分辨率（群舞按人数增加）"""
+    data = request.get_json(silent=True) or {}
+    duration = 0.0
+    if data.get('music_file'):
+        duration = estimate_audio_duration(str(MUSIC_DIR / data['music_file']))
+
+    dancer_count = 1
+    formation = data.get('formation')
+    if isinstance(formation, dict) and isinstance(formation.get('dancers'), int) \
+            and not isinstance(formation['dancers'], bool):
+        dancer_count = min(max(formation['dancers'], 1), FORMATION_CONFIG['max_dancers'])
+
+    # 练习速度下视频时长按速度变长
+    speed = _parse_practice_speed(data.get('practice_speed'))
+    if speed:
+        duration /= speed
+
+    visualizer = pipeline.get_dance_visualizer()
+    return estimate_render_cost(duration, visualizer.width, visualizer.height, dancer_count)
+
+
+def _estimate_practice_cost():
+    """按练习速度重新渲染的成本：整段视频，时长按速度变长"""
+    data = request.get_json(silent=True) or {}
+    try:
+        meta = load_meta(data.get('sequence_id'))
+    except KeyError:
+        return 0.0
+
+    speed = _parse_practice_speed(data.get('practice_speed')) or 1.0
+    duration = (meta['music_features'].get('duration') or 0) / speed
+    dancer_count = (meta.get('formation') or {}).get('dancers', 1)
+    visualizer = pipeline.get_dance_visualizer()
+    return estimate_render_cost(duration, visualizer.width, visualizer.height, dancer_count)
+
+
+def _estimate_scoring_cost():
+    """排练评分的成本：DTW 计算的格数（百万），即录制帧数 × 窗口宽度"""
+    if request.files.get('keypoints_file'):
+        data = request.form
+        file = request.files['keypoints_file']
+        try:
+            keypoints, fps = parse_keypoints(file.read(), file.filename)
+        except (ValueError, UnicodeDecodeError):
+            return 0.0
+        finally:
+            file.seek(0)
+        frames = len(keypoints)
+    else:
+        data = request.get_json(silent=True) or {}
+        keypoints, fps = data.get('keypoints'), None
+        frames = len(keypoints) if isinstance(keypoints, list) else 0
+
+    try:
+        meta = load_meta(data.get('sequence_id'))
+        fps = float(data.get('fps') or fps or 0) or None
+        cells = pipeline.estimate_scoring_cells(meta, min(frames, REHEARSAL_CONFIG['max_frames']), fps)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return 0.0
+    return max(cells, 0) / 1e6
+
+
+def _parse_practice_speed(value):
+    """练习速度：在配置范围内的数值（取整到 speed_step），否则返回 None"""
+    try:
+        speed = quantize_speed(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not PRACTICE_CONFIG['min_speed'] <= speed <= PRACTICE_CONFIG['max_speed']:
+        return None
+    return speed
+
+
+def _estimate_splice_cost():
+    """局部重新生成的成本：只按重新生成的范围时长计算"""
+    data = request.get_json(silent=True) or {}
+    try:
+        meta = load_meta(data.get('sequence_id'))
+        start_time, end_time = pipeline.resolve_time_range(meta, data)
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+    dancer_count = (meta.get('formation') or {}).get('dancers', 1)
+    visualizer = pipeline.get_dance_visualizer()
+    return estimate_render_cost(max(0.0, end_time - start_time), visualizer.width, visualizer.height,
+                                dancer_count)
 
 
 @app.route('/')
@@ -29,6 +130,7 @@ def index():
 
 
 @app.route('/api/upload_music', methods=['POST'])
+@admission.guard('analysis', _estimate_upload_cost)
 def upload_music():
     """上传音乐文件"""
     if 'music_file' not in request.files:
@@ -41,21 +143,125 @@ def upload_music():
     if not allowed_file(file.filename, ALLOWED_EXTENSIONS):
         return jsonify({'error': '不支持的文件格式'}), 400
 
+    # 预览分析的档位，默认 fast
+    analysis_profile = request.form.get('analysis_profile') or ANALYSIS_ENDPOINT_PROFILES['upload']
+    if analysis_profile not in ANALYSIS_PROFILES:
+        return jsonify({'error': f'未知的分析档位: {analysis_profile}'}), 400
+
     # 保存文件
     filename = save_uploaded_file(file, MUSIC_DIR)
 
     # 分析音乐
     try:
-        music_info = music_processor.analyze_music(str(MUSIC_DIR / filename))
+        with trace_request() as trace:
+            music_info = pipeline.execute(pipeline.analyze_music, str(MUSIC_DIR / filename), analysis_profile)
+        count('music_analyzed')
+
+        # 分析图在后台生成（频谱图已在分析时写入特征缓存），不阻塞上传请求
+        pipeline.music_visualization(str(MUSIC_DIR / filename))
+
         return jsonify({
             'success': True,
             'filename': filename,
-            'music_info': music_info
+            'music_info': music_info,
+            'visualization_url': f'/api/music_visualization/{filename}',
+            'profiling': trace.to_dict()
         })
     except Exception as e:
         return jsonify({'error': f'音乐分析失败: {str(e)}'}), 500
 
 
+def _image_response(path, state, error):
+    """分析图：已生成时返回图片，生成中返回202，生成失败返回500"""
+    if state == 'ready':
+        return send_file(path, mimetype='image/png', max_age=86400)
+    if state == 'failed':
+        return jsonify({'error': f'图片生成失败: {error}'}), 500
+    response = jsonify({'state': 'pending'})
+    response.status_code = 202
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+@app.route('/api/music_visualization/<filename>')
+def get_music_visualization(filename):
+    """音乐分析图（波形、梅尔频谱图、色度图），按音频内容缓存"""
+    music_path = MUSIC_DIR / filename
+    if os.path.basename(filename) != filename or not music_path.is_file():
+        return jsonify({'error': '文件不存在'}), 404
+    try:
+        return _image_response(*pipeline.music_visualization(str(music_path)))
+    except Exception as e:
+        return jsonify({'error': f'图片生成失败: {str(e)}'}), 500
+
+
+@app.route('/api/peaks/<filename>')
+def get_music_peaks(filename):
+    """音乐时间轴：按缩放范围返回波形峰值，以及拍点和起音标记"""
+    music_path = MUSIC_DIR / filename
+    if os.path.basename(filename) != filename or not music_path.is_file():
+        return jsonify({'error': '文件不存在'}), 404
+
+    try:
+        width = min(max(int(request.args.get('width', 1000)), 1), 20000)
+        start_time = float(request.args.get('start', 0))
+        end_time = float(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': '参数格式错误'}), 400
+
+    try:
+        peaks_path, peaks, markers = pipeline.music_timeline(str(music_path))
+    except Exception as e:
+        return jsonify({'error': f'波形峰值生成失败: {str(e)}'}), 500
+
+    # 整个峰值金字塔（二进制，格式见 utils/peaks.py），前端可在本地任意缩放
+    if request.args.get('format') == 'binary':
+        return send_file(peaks_path, mimetype='application/octet-stream', max_age=86400)
+
+    level, samples_per_peak, first, values = select_range(peaks, width, start_time, end_time)
+    sample_rate = peaks['sample_rate']
+    return jsonify({
+        'sample_rate': sample_rate,
+        'duration': peaks['sample_count'] / sample_rate,
+        'level': level,
+        'level_count': len(peaks['levels']),
+        'peak_seconds': samples_per_peak / sample_rate,
+        'start': first * samples_per_peak / sample_rate,
+        'peaks': values.reshape(-1).tolist(),  # 依次为每对的最小值、最大值，振幅按 127 量化
+        'beats': markers['beats'],
+        'onsets': markers['onsets']
+    })
+
+
+@app.route('/api/sequence/<sequence_id>/analysis.png')
+def get_dance_analysis(sequence_id):
+    """舞蹈分析图（关节轨迹、速度、动作幅度），按序列内容缓存"""
+    try:
+        return _image_response(*pipeline.dance_analysis_image(sequence_id))
+    except KeyError:
+        return jsonify({'error': '舞蹈序列不存在'}), 404
+
+
+@app.route('/api/sequence/<sequence_id>/animation.<fmt>')
+def export_animation(sequence_id, fmt):
+    """导出舞蹈动画数据（BVH 或 GLB），边生成边以流的形式返回"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式: {fmt}'}), 404
+    try:
+        length, chunks = pipeline.export_animation(sequence_id, fmt)
+    except KeyError:
+        return jsonify({'error': '舞蹈序列不存在'}), 404
+    except Exception as e:
+        return jsonify({'error': f'动画导出失败: {str(e)}'}), 500
+
+    count('animations_exported')
+    response = Response(chunks, mimetype=EXPORT_FORMATS[fmt])
+    if length is not None:
+        response.headers['Content-Length'] = str(length)
+    response.headers['Content-Disposition'] = f'attachment; filename=dance_{sequence_id}.{fmt}'
+    return response
+
+
 @app.route('/api/get_music_list')
 def get_music_list():
     """获取音乐列表"""
@@ -70,73 +276,82 @@ def get_music_list():
     return jsonify(music_files)
 
 
-@app.route('/api/generate_dance', methods=['POST'])
-def generate_dance():
-    """生成舞蹈动作"""
-    data = request.json
-
+def _parse_generation_request(data):
+    """校验生成请求，返回 (params, None) 或 (None, 错误响应)"""
     # 验证输入
     if not data.get('music_file'):
-        return jsonify({'error': '请选择音乐文件'}), 400
+        return None, (jsonify({'error': '请选择音乐文件'}), 400)
 
     if not data.get('dance_style'):
-        return jsonify({'error': '请选择舞蹈风格'}), 400
-
-    # 获取输入参数
-    music_path = str(MUSIC_DIR / data['music_file'])
-    dance_style = data['dance_style']
-    additional_keywords = data.get('keywords', '')
-
-    try:
-        # 步骤1: 分析音乐
-        print("分析音乐中...")
-        music_features = music_processor.extract_features(music_path)
-
-        # 步骤2: 生成舞蹈序列
-        print("生成舞蹈序列中...")
-        dance_sequence = dance_generator.generate(
-            music_features=music_features,
-            dance_style=dance_style,
-            keywords=additional_keywords
-        )
-
-        # 步骤3: 生成视频
-        print("生成视频中...")
-        output_filename = f"dance_{uuid.uuid4().hex[:8]}.mp4"
-        output_path = str(OUTPUT_DIR / output_filename)
-
-        # 创建骨骼动画视频
-        video_path = dance_visualizer.create_skeleton_video(
-            dance_sequence=dance_sequence,
-            music_path=music_path,
-            output_path=output_path,
-            dance_style=dance_style
-        )
-
-        # 步骤4: 生成分析报告
-        report = {
-            'generation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'music_file': data['music_file'],
-            'dance_style': dance_style,
-            'music_features': {
-                'tempo': music_features.get('tempo', 0),
-                'duration': music_features.get('duration', 0),
-                'beat_count': len(music_features.get('beats', []))
-            },
-            'dance_info': {
-                'frame_count': len(dance_sequence),
-                'joint_count': dance_sequence.shape[1] if len(dance_sequence.shape) > 1 else 0
-            },
-            'output_files': {
-                'video': output_filename
-            }
-        }
+        return None, (jsonify({'error': '请选择舞蹈风格'}), 400)
+
+    # 群舞队形（可选）
+    formation = data.get('formation')
+    if formation is not None and not isinstance(formation, dict):
+        return None, (jsonify({'error': '队形参数格式错误'}), 400)
+    if formation:
+        if formation.get('mode', 'unison') not in FORMATION_CONFIG['modes']:
+            return None, (jsonify({'error': '不支持的队形模式'}), 400)
+        if formation.get('layout', 'line') not in FORMATION_CONFIG['layouts']:
+            return None, (jsonify({'error': '不支持的队形'}), 400)
+        # bool 是 int 的子类，{"dancers": true} 也要拒绝
+        dancer_count = formation.get('dancers', 6)
+        if not isinstance(dancer_count, int) or isinstance(dancer_count, bool) \
+                or not 1 <= dancer_count <= FORMATION_CONFIG['max_dancers']:
+            return None, (jsonify({'error': f"舞者人数需在1到{FORMATION_CONFIG['max_dancers']}之间"}), 400)
+
+    # 相机视角（可选）：不指定时使用正交的正面画面
+    views = data.get('views')
+    if views:
+        if not isinstance(views, list) or len(views) > CAMERA_CONFIG['max_views']:
+            return None, (jsonify({'error': f"视角数量需在1到{CAMERA_CONFIG['max_views']}之间"}), 400)
+        if any(not isinstance(view, str) or view not in CAMERA_CONFIG['presets'] for view in views):
+            return None, (jsonify({'error': '不支持的视角'}), 400)
+
+    # 练习速度（可选）：音乐变速不变调，动作按时间重新采样
+    practice_speed = 1.0
+    if data.get('practice_speed') is not None:
+        practice_speed = _parse_practice_speed(data['practice_speed'])
+        if practice_speed is None:
+            return None, (jsonify({
+                'error': f"练习速度需在{PRACTICE_CONFIG['min_speed']}到{PRACTICE_CONFIG['max_speed']}之间"
+            }), 400)
+
+    # 可选的单请求性能剖析（cProfile 或 pyinstrument）
+    profile_engine = data.get('profile') or request.args.get('profile')
+    if profile_engine and not PROFILING_CONFIG['allow_request_profiling']:
+        profile_engine = None
+    if profile_engine and profile_engine not in ('cprofile', 'pyinstrument'):
+        profile_engine = 'cprofile'
+
+    return {
+        'music_file': data['music_file'],
+        'dance_style': data['dance_style'],
+        'keywords': data.get('keywords', ''),
+        'formation': formation,
+        'views': views or None,
+        'practice_speed': practice_speed,
+        'profile': profile_engine
+    }, None
+
+
+@app.route('/api/generate_dance', methods=['POST'])
+@admission.guard('render', _estimate_generation_cost)
+def generate_dance():
+    """生成舞蹈动作"""
+    params, error = _parse_generation_request(request.json)
+    if error:
+        return error
+
+    try:
+        # 分析、生成和渲染在后台任务进程中执行（开发模式下直接在当前线程执行）
+        with trace_request() as trace:
+            report, output_filename = pipeline.execute(pipeline.run_generation, params)
+        count('dances_generated')
+        report['profiling'] = trace.to_dict()
 
         # 保存报告
-        report_filename = f"report_{uuid.uuid4().hex[:8]}.json"
-        report_path = str(OUTPUT_DIR / report_filename)
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, ensure_ascii=False, indent=2)
+        pipeline.save_report(report)
 
         return jsonify({
             'success': True,
@@ -145,10 +360,198 @@ def generate_dance():
         })
 
     except Exception as e:
+        count('generation_failures')
         print(f"生成失败: {str(e)}")
         return jsonify({'error': f'生成失败: {str(e)}'}), 500
 
 
+@app.route('/api/generate_stream', methods=['POST'])
+def generate_stream():
+    """流式生成：立即返回 HLS 播放列表地址，第一个分段渲染完成后即可开始播放"""
+    params, error = _parse_generation_request(request.json)
+    if error:
+        return error
+
+    # 渲染在请求返回后继续进行，准入资源由后台任务结束时释放
+    try:
+        release = admission.reserve('render', _estimate_generation_cost())
+    except AdmissionRejected as e:
+        return admission.reject_response('render', e)
+
+    try:
+        job_id = pipeline.start_stream(params, on_done=release)
+    except Exception as e:
+        release()
+        return jsonify({'error': f'生成失败: {str(e)}'}), 500
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'playlist_url': f'/api/stream/{job_id}/playlist.m3u8',
+        'status_url': f'/api/stream/{job_id}'
+    })
+
+
+@app.route('/api/stream/<job_id>')
+def get_stream_status(job_id):
+    """流式生成任务状态：running / done（含 video_url 和报告）/ failed"""
+    try:
+        return jsonify(pipeline.stream_status(job_id))
+    except KeyError:
+        return jsonify({'error': '任务不存在'}), 404
+
+
+@app.route('/api/stream/<job_id>/playlist.m3u8')
+def get_stream_playlist(job_id):
+    """HLS 播放列表，渲染过程中随分段增加而更新"""
+    try:
+        path = pipeline.stream_file(job_id, 'playlist.m3u8')
+    except KeyError:
+        return jsonify({'error': '任务不存在'}), 404
+    response = send_file(path, mimetype='application/vnd.apple.mpegurl')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/stream/<job_id>/segments/<name>')
+def get_stream_segment(job_id, name):
+    """HLS 分段（内容寻址，可长期缓存）"""
+    try:
+        path = pipeline.stream_file(job_id, name)
+    except KeyError:
+        return jsonify({'error': '分段不存在'}), 404
+    return send_file(path, mimetype='video/mp2t', max_age=86400)
+
+
+@app.route('/api/regenerate_segment', methods=['POST'])
+@admission.guard('render', _estimate_splice_cost)
+def regenerate_segment():
+    """只重新生成已有舞蹈的某个时间范围，未受影响的视频分段直接复用"""
+    data = request.get_json(silent=True) or {}
+
+    try:
+        meta = load_meta(data.get('sequence_id'))
+    except KeyError:
+        return jsonify({'error': '舞蹈序列不存在'}), 404
+
+    has_time = data.get('start_time') is not None and data.get('end_time') is not None
+    has_bar = data.get('start_bar') is not None and data.get('end_bar') is not None
+    if not has_time and not has_bar:
+        return jsonify({'error': '请指定 start_time/end_time 或 start_bar/end_bar'}), 400
+
+    try:
+        start_time, end_time = pipeline.resolve_time_range(meta, data)
+    except (TypeError, ValueError):
+        return jsonify({'error': '范围格式错误'}), 400
+    duration = meta['music_features'].get('duration') or 0
+    if not 0 <= start_time < end_time or (duration and start_time >= duration):
+        return jsonify({'error': '范围无效'}), 400
+
+    params = {
+        'sequence_id': data['sequence_id'],
+        'start_time': start_time,
+        'end_time': end_time
+    }
+
+    try:
+        with trace_request() as trace:
+            report, output_filename = pipeline.execute(pipeline.run_splice, params)
+        count('segments_regenerated')
+        report['profiling'] = trace.to_dict()
+
+        return jsonify({
+            'success': True,
+            'video_url': f'/api/download/{output_filename}',
+            'report': report
+        })
+
+    except Exception as e:
+        count('generation_failures')
+        print(f"局部重新生成失败: {str(e)}")
+        return jsonify({'error': f'局部重新生成失败: {str(e)}'}), 500
+
+
+@app.route('/api/render_practice', methods=['POST'])
+@admission.guard('render', _estimate_practice_cost)
+def render_practice():
+    """按练习速度重新渲染已生成的舞蹈（动作不变，音乐变速不变调）"""
+    data = request.get_json(silent=True) or {}
+
+    try:
+        load_meta(data.get('sequence_id'))
+    except KeyError:
+        return jsonify({'error': '舞蹈序列不存在'}), 404
+
+    practice_speed = _parse_practice_speed(data.get('practice_speed'))
+    if practice_speed is None:
+        return jsonify({
+            'error': f"练习速度需在{PRACTICE_CONFIG['min_speed']}到{PRACTICE_CONFIG['max_speed']}之间"
+        }), 400
+
+    params = {'sequence_id': data['sequence_id'], 'practice_speed': practice_speed}
+    try:
+        with trace_request() as trace:
+            report, output_filename = pipeline.execute(pipeline.run_practice, params)
+        count('practice_rendered')
+        report['profiling'] = trace.to_dict()
+
+        return jsonify({
+            'success': True,
+            'video_url': f'/api/download/{output_filename}',
+            'report': report
+        })
+
+    except Exception as e:
+        count('generation_failures')
+        print(f"练习速度渲染失败: {str(e)}")
+        return jsonify({'error': f'练习速度渲染失败: {str(e)}'}), 500
+
+
+@app.route('/api/score_rehearsal', methods=['POST'])
+@admission.guard('scoring', _estimate_scoring_cost)
+def score_rehearsal():
+    """排练评分：上传舞者的关键点轨迹，与生成的舞蹈序列对齐后返回各关节、各小节的误差"""
+    if request.files.get('keypoints_file'):
+        data = request.form
+        file = request.files['keypoints_file']
+        try:
+            keypoints, fps = parse_keypoints(file.read(), file.filename)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({'error': f'关键点文件格式错误: {str(e)}'}), 400
+    else:
+        data = request.get_json(silent=True) or {}
+        try:
+            keypoints, fps = keypoints_from_json(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': f'关键点格式错误: {str(e)}'}), 400
+
+    if len(keypoints) > REHEARSAL_CONFIG['max_frames']:
+        return jsonify({'error': f"关键点帧数超过上限 {REHEARSAL_CONFIG['max_frames']}"}), 400
+
+    try:
+        load_meta(data.get('sequence_id'))
+    except KeyError:
+        return jsonify({'error': '舞蹈序列不存在'}), 404
+
+    try:
+        fps = float(data.get('fps') or fps or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'fps 格式错误'}), 400
+
+    params = {'sequence_id': data['sequence_id'], 'keypoints': keypoints, 'fps': fps}
+    try:
+        with trace_request() as trace:
+            result = pipeline.execute(pipeline.run_scoring, params)
+        count('rehearsals_scored')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'评分失败: {str(e)}'}), 500
+
+    result['profiling'] = trace.to_dict()
+    return jsonify(dict(result, success=True))
+
+
 @app.route('/api/download/<filename>')
 def download_file(filename):
     """下载生成的文件"""
@@ -159,6 +562,18 @@ def download_file(filename):
     return send_file(file_path, as_attachment=True)
 
 
+@app.route('/api/queue_status')
+def queue_status():
+    """分析、渲染和排练评分的排队情况"""
+    return jsonify(admission.status())
+
+
+@app.route('/metrics')
+def export_metrics():
+    """Prometheus 格式的性能指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/get_outputs')
 def get_outputs():
     """获取生成结果列表"""
@@ -175,4 +590,10 @@ def get_outputs():
 
 
 if __name__ == '__main__':
+    # 开发服务器默认允许单请求性能剖析
+    if PROFILING_CONFIG['allow_request_profiling'] is None:
+        PROFILING_CONFIG['allow_request_profiling'] = True
+    # 调试模式下由重载器启动的子进程负责服务，只在子进程中预热
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        pipeline.start_warm_up()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染后端的速度和画面差异比较
+
+以第一个后端为参考，逐帧比较其他后端的画面，差异超过阈值时返回非零退出码。
+除可在配置中选择的后端外，也可以比较只用于核对画面的参考实现（numpy）。
+
+用法:
+    python -m benchmarks.compare_backends
+    python -m benchmarks.compare_backends --backends opencv numpy --frames 300 --output backends.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from models.dance_generator import DanceGenerator
+from models.formation import FormationGenerator
+from models.render_backends import RENDER_BACKENDS, REFERENCE_BACKENDS
+from models.visualization import DanceVisualizer
+
+BACKENDS = dict(RENDER_BACKENDS, **REFERENCE_BACKENDS)
+
+# 允许的差异像素比例（单帧最大值），差异主要来自小圆点的抗锯齿边缘
+MAX_CHANGED = 0.005
+
+
+def build_cases(frames, seed=0):
+    """生成比较用的序列：单人、群舞和多视角"""
+    random.seed(seed)
+    np.random.seed(seed)
+    generator = DanceGenerator()
+    features = {'tempo': 120, 'duration': frames / generator.frame_rate, 'beats': []}
+    sequence = generator.generate(features, '刀郎舞')
+    formation, _ = FormationGenerator(generator.skeleton).generate(sequence, 8, 'canon', 'v', 120)
+
+    return {
+        'single': lambda v: v._skeleton_frame_renderer(sequence, '刀郎舞')[0],
+        'formation': lambda v: v._formation_frame_renderer(formation, '刀郎舞')[0],
+        'multi_view': lambda v: v._camera_frame_renderer(sequence, '刀郎舞', ['front', 'side', 'top', 'orbit'])[0]
+    }, len(sequence)
+
+
+def render_all(make_renderer, backend, total_frames):
+    """用指定后端渲染全部帧，返回 (帧列表, 每帧毫秒)"""
+    visualizer = DanceVisualizer(backend=BACKENDS[backend]())
+    render_frame = make_renderer(visualizer)
+    render_frame(0)  # 预热（字形贴图等）
+
+    frames = []
+    start = time.perf_counter()
+    for frame_idx in range(total_frames):
+        frames.append(render_frame(frame_idx).copy())
+    elapsed = time.perf_counter() - start
+    return frames, elapsed * 1000 / total_frames
+
+
+def image_diff(reference, frames):
+    """逐帧画面差异：平均绝对误差、最大误差、差异超过32的像素比例"""
+    mean_errors, max_errors, changed = [], [], []
+    for a, b in zip(reference, frames):
+        diff = np.abs(a.astype(np.int16) - b.astype(np.int16)).max(axis=2)
+        mean_errors.append(diff.mean())
+        max_errors.append(diff.max())
+        changed.append((diff > 32).mean())
+    return {
+        'mean_abs_error': round(float(np.mean(mean_errors)), 4),
+        'max_abs_error': int(np.max(max_errors)),
+        'changed_pixel_ratio': round(float(np.max(changed)), 6)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较渲染后端的速度和画面差异')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS),
+                        choices=list(BACKENDS), help='要比较的后端，第一个为参考')
+    parser.add_argument('--frames', type=int, default=150, help='每种情况渲染的帧数')
+    parser.add_argument('--max-changed', type=float, default=MAX_CHANGED,
+                        help='允许的差异像素比例（单帧最大值），差异主要来自小圆点的抗锯齿边缘')
+    parser.add_argument('--output', help='结果JSON路径')
+    args = parser.parse_args()
+
+    cases, total_frames = build_cases(args.frames)
+    reference_backend = args.backends[0]
+    results = []
+    failed = False
+
+    for case, make_renderer in cases.items():
+        reference, reference_ms = render_all(make_renderer, reference_backend, total_frames)
+        print(f"{case:12s} {reference_backend:8s} {reference_ms:7.3f} ms/帧 (参考)")
+        results.append({'case': case, 'backend': reference_backend, 'ms_per_frame': round(reference_ms, 3)})
+
+        for backend in args.backends[1:]:
+            frames, ms = render_all(make_renderer, backend, total_frames)
+            diff = image_diff(reference, frames)
+            ok = diff['changed_pixel_ratio'] <= args.max_changed
+            failed = failed or not ok
+            print(f"{case:12s} {backend:8s} {ms:7.3f} ms/帧  平均误差 {diff['mean_abs_error']:.4f}  "
+                  f"差异像素 {diff['changed_pixel_ratio']:.4%}  {'OK' if ok else 'FAIL'}")
+            results.append(dict({'case': case, 'backend': backend, 'ms_per_frame': round(ms, 3), 'ok': ok}, **diff))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'frames': total_frames, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
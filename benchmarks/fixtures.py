@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""基准测试用的确定性音频素材（节拍器点击音和扫频音，无需网络）"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from config import MUSIC_CONFIG
+
+# 素材时长（秒）
+FIXTURE_DURATIONS = {
+    '10s': 10,
+    '1min': 60,
+    '5min': 300,
+    '30min': 1800
+}
+
+FIXTURE_KINDS = ['click', 'sweep']
+
+DEFAULT_FIXTURE_DIR = Path(tempfile.gettempdir()) / 'dance_benchmark_fixtures'
+
+
+def synthesize_click_track(duration, sample_rate, bpm=100):
+    """节拍器点击音轨，每小节第一拍重音"""
+    n_samples = int(duration * sample_rate)
+    y = np.zeros(n_samples, dtype=np.float32)
+
+    click_length = int(0.03 * sample_rate)
+    t = np.arange(click_length) / sample_rate
+    envelope = np.exp(-t * 150)
+    accent_click = (np.sin(2 * np.pi * 1500 * t) * envelope * 0.8).astype(np.float32)
+    normal_click = (np.sin(2 * np.pi * 1000 * t) * envelope * 0.5).astype(np.float32)
+
+    beat_interval = 60.0 / bpm
+    beat_starts = (np.arange(0, duration, beat_interval) * sample_rate).astype(int)
+    for beat_idx, start in enumerate(beat_starts):
+        click = accent_click if beat_idx % 4 == 0 else normal_click
+        end = min(start + click_length, n_samples)
+        y[start:end] += click[:end - start]
+
+    return y
+
+
+def synthesize_tone_sweep(duration, sample_rate, f_start=110.0, f_end=3520.0, bpm=120):
+    """按周期重复的对数扫频音，叠加节拍点击以保证有可检测的节奏"""
+    n_samples = int(duration * sample_rate)
+    period = min(duration, 10.0)
+    t = (np.arange(n_samples) / sample_rate) % period
+
+    # 对数扫频的瞬时相位
+    k = np.log(f_end / f_start) / period
+    phase = 2 * np.pi * f_start * (np.exp(k * t) - 1) / k
+    y = (np.sin(phase) * 0.3).astype(np.float32)
+
+    return y + synthesize_click_track(duration, sample_rate, bpm=bpm) * 0.5
+
+
+def ensure_fixture(label, kind='click', fixture_dir=None, sample_rate=None):
+    """生成（或复用已存在的）素材文件，返回路径"""
+    if label not in FIXTURE_DURATIONS:
+        raise Exception(f"未知的素材时长: {label}")
+    if kind not in FIXTURE_KINDS:
+        raise Exception(f"未知的素材类型: {kind}")
+
+    sample_rate = sample_rate or MUSIC_CONFIG['sample_rate']
+    fixture_dir = Path(fixture_dir or DEFAULT_FIXTURE_DIR)
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+
+    path = fixture_dir / f"{kind}_{label}_{sample_rate}.wav"
+    if not path.exists():
+        duration = FIXTURE_DURATIONS[label]
+        if kind == 'click':
+            y = synthesize_click_track(duration, sample_rate)
+        else:
+            y = synthesize_tone_sweep(duration, sample_rate)
+        sf.write(str(path), y, sample_rate, subtype='PCM_16')
+
+    return path
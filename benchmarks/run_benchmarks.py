@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析、生成、渲染流水线的基准测试
+
+用法:
+    python -m benchmarks.run_benchmarks --durations 10s 1min --output bench.json
+    python -m benchmarks.run_benchmarks --durations 10s --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from config import DANCE_STYLES
+from benchmarks.fixtures import FIXTURE_DURATIONS, FIXTURE_KINDS, ensure_fixture
+from models.music_processor import MusicProcessor
+from models.dance_generator import DanceGenerator
+from models.visualization import DanceVisualizer
+
+STAGES = ['analyze_music', 'extract_features', 'generate', 'smooth_sequence', 'create_skeleton_video']
+
+# 比较时参与回归判断的指标
+COMPARED_METRICS = ['wall_time_s', 'peak_rss_mb']
+
+
+def _reset_peak_rss():
+    """重置进程的峰值内存记录（Linux），不支持时返回 False"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """读取进程峰值内存（MB），无法读取时返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # resource 模块只在 Unix 上可用；ru_maxrss 在 Linux 上单位为KB，在 macOS 上为字节
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+    # Windows：psutil 的峰值工作集（字节）
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def measure(func, repeat=1):
+    """多次运行取最短墙钟时间，返回 (结果, 墙钟时间, 峰值内存MB)"""
+    best = None
+    result = None
+    peak_rss = None
+    for _ in range(repeat):
+        _reset_peak_rss()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        peak = _peak_rss_mb()
+        if peak is not None:
+            peak_rss = peak if peak_rss is None else max(peak_rss, peak)
+    return result, best, peak_rss
+
+
+def _seed(seed=0):
+    """固定随机种子，保证生成结果可复现"""
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def run_benchmarks(durations, kinds, styles, stages, repeat=1, fixture_dir=None, work_dir=None):
+    """运行基准测试，返回结果列表"""
+    processor = MusicProcessor()
+    generator = DanceGenerator()
+    visualizer = DanceVisualizer()
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix='dance_benchmark_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+
+    def add_result(stage, fixture, audio_duration, wall_time, peak_rss, frames=None, style=None):
+        entry = {
+            'case': '/'.join(part for part in [stage, fixture, style] if part),
+            'stage': stage,
+            'fixture': fixture,
+            'style': style,
+            'audio_duration_s': audio_duration,
+            'wall_time_s': round(wall_time, 4),
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+            'realtime_factor': round(audio_duration / wall_time, 2) if wall_time > 0 else None
+        }
+        if frames is not None:
+            entry['frames'] = frames
+            entry['fps'] = round(frames / wall_time, 1) if wall_time > 0 else None
+        results.append(entry)
+        memory = f"{peak_rss:>8.1f}MB" if peak_rss is not None else f"{'-':>10}"
+        print(f"{entry['case']:<50} {wall_time:>9.3f}s {memory}"
+              + (f" {entry['fps']:>9.1f} fps" if frames is not None else ''))
+
+    for label in durations:
+        for kind in kinds:
+            fixture = f"{kind}_{label}"
+            audio_duration = FIXTURE_DURATIONS[label]
+            path = str(ensure_fixture(label, kind, fixture_dir))
+
+            if 'analyze_music' in stages:
+                _, wall, rss = measure(lambda: processor.analyze_music(path), repeat)
+                add_result('analyze_music', fixture, audio_duration, wall, rss)
+
+            features = None
+            if 'extract_features' in stages:
+                features, wall, rss = measure(lambda: processor.extract_features(path), repeat)
+                add_result('extract_features', fixture, audio_duration, wall, rss)
+
+            needs_sequence = {'generate', 'smooth_sequence', 'create_skeleton_video'} & set(stages)
+            if not needs_sequence:
+                continue
+            if features is None:
+                features = processor.extract_features(path)
+
+            for style in styles:
+                def generate():
+                    _seed()
+                    return generator.generate(music_features=features, dance_style=style)
+
+                sequence, wall, rss = measure(generate, repeat)
+                if 'generate' in stages:
+                    add_result('generate', fixture, audio_duration, wall, rss,
+                               frames=len(sequence), style=style)
+
+                if 'smooth_sequence' in stages:
+                    _, wall, rss = measure(lambda: generator._smooth_sequence(sequence), repeat)
+                    add_result('smooth_sequence', fixture, audio_duration, wall, rss,
+                               frames=len(sequence), style=style)
+
+                if 'create_skeleton_video' in stages:
+                    output_path = str(work_dir / f"{fixture}_{len(results)}.mp4")
+                    _, wall, rss = measure(lambda: visualizer.create_skeleton_video(
+                        dance_sequence=sequence,
+                        music_path=path,
+                        output_path=output_path,
+                        dance_style=style
+                    ), repeat)
+                    add_result('create_skeleton_video', fixture, audio_duration, wall, rss,
+                               frames=len(sequence), style=style)
+
+    return results
+
+
+def compare_results(results, baseline, threshold):
+    """与基线比较，返回回归列表"""
+    baseline_cases = {entry['case']: entry for entry in baseline.get('results', [])}
+    regressions = []
+
+    for entry in results:
+        base = baseline_cases.get(entry['case'])
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old_value = base.get(metric)
+            new_value = entry.get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value
+            status = 'REGRESSION' if change > threshold else ('improved' if change < -threshold else 'ok')
+            print(f"{entry['case']:<50} {metric:<12} {old_value:>10} -> {new_value:>10} "
+                  f"({change:+.1%}) {status}")
+            if status == 'REGRESSION':
+                regressions.append({
+                    'case': entry['case'],
+                    'metric': metric,
+                    'baseline': old_value,
+                    'current': new_value,
+                    'change': round(change, 4)
+                })
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='音乐分析、舞蹈生成和视频渲染的基准测试')
+    parser.add_argument('--durations', nargs='+', default=list(FIXTURE_DURATIONS),
+                        choices=list(FIXTURE_DURATIONS), help='素材时长')
+    parser.add_argument('--kinds', nargs='+', default=FIXTURE_KINDS, choices=FIXTURE_KINDS,
+                        help='素材类型')
+    parser.add_argument('--styles', nargs='+', default=list(DANCE_STYLES), help='舞蹈风格')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help='要测试的阶段')
+    parser.add_argument('--repeat', type=int, default=1, help='每项重复次数（取最短时间）')
+    parser.add_argument('--fixture-dir', help='素材缓存目录')
+    parser.add_argument('--work-dir', help='渲染输出目录')
+    parser.add_argument('--output', help='结果JSON路径')
+    parser.add_argument('--compare', help='基线结果JSON路径')
+    parser.add_argument('--threshold', type=float, default=0.15, help='回归判定阈值（相对变化）')
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        durations=args.durations,
+        kinds=args.kinds,
+        styles=args.styles,
+        stages=args.stages,
+        repeat=args.repeat,
+        fixture_dir=args.fixture_dir,
+        work_dir=args.work_dir
+    )
+
+    report = {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'numpy': np.__version__
+        },
+        'results': results
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n与基线比较 (阈值 {args.threshold:.0%}):")
+        regressions = compare_results(results, baseline, args.threshold)
+        report['regressions'] = regressions
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能回归")
+            exit_code = 1
+        else:
+            print("\n未发现性能回归")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
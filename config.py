@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 
 # 项目根目录
@@ -8,9 +9,18 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 MUSIC_DIR = DATA_DIR / "music"
 OUTPUT_DIR = DATA_DIR / "outputs"
+CACHE_DIR = DATA_DIR / "cache"
+SEQUENCE_DIR = DATA_DIR / "sequences"
+FARM_DIR = DATA_DIR / "farm"
+STREAM_DIR = DATA_DIR / "streams"
+SEGMENT_DIR = CACHE_DIR / "segments"
+IMAGE_DIR = CACHE_DIR / "images"
+PEAKS_DIR = CACHE_DIR / "peaks"
+AUDIO_DIR = CACHE_DIR / "audio"
 
 # 创建必要的目录
-for dir_path in [DATA_DIR, MUSIC_DIR, OUTPUT_DIR]:
+for dir_path in [DATA_DIR, MUSIC_DIR, OUTPUT_DIR, CACHE_DIR, SEQUENCE_DIR, STREAM_DIR, SEGMENT_DIR,
+                 IMAGE_DIR, PEAKS_DIR, AUDIO_DIR, FARM_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
 
 # 允许的音乐文件扩展名
@@ -46,9 +56,227 @@ MUSIC_CONFIG = {
     "n_mels": 128
 }
 
+# 音乐分析档位：控制采样率、STFT参数、梅尔带数和计算哪些特征，每个档位的分析结果分别缓存
+# 特征：beats 拍点（总是计算）、spectrogram 梅尔频谱图和色度图、mfcc、pulse 节拍脉冲、
+#       onsets 起音、energy 能量、spectral 频谱质心和带宽、zcr 零交叉率
+ANALYSIS_FEATURES = ["beats", "spectrogram", "mfcc", "pulse", "onsets", "energy", "spectral", "zcr"]
+ANALYSIS_PROFILES = {
+    # 上传预览和时间轴：半采样率、只做节拍跟踪和起音检测（帧长和帧移的时长与 balanced 相同）
+    "fast": {"sample_rate": 11025, "n_fft": 1024, "hop_length": 256, "n_mels": 64,
+             "features": ["beats", "onsets"]},
+    "balanced": dict(MUSIC_CONFIG, features=ANALYSIS_FEATURES),
+    # 舞蹈生成：帧移减半，拍点和起音的时间分辨率约 12ms
+    "precise": {"sample_rate": 22050, "n_fft": 2048, "hop_length": 256, "n_mels": 128,
+                "features": ANALYSIS_FEATURES}
+}
+
+# 各接口使用的分析档位
+ANALYSIS_ENDPOINT_PROFILES = {
+    "upload": "fast",  # /api/upload_music 的预览信息
+    "timeline": "fast",  # 波形峰值和拍点/起音标记，与上传使用同一档位，上传时一次生成
+    "visualization": "balanced",  # 音乐分析图
+    "generation": "precise"  # 舞蹈生成、流式生成
+}
+
+# 分析图片配置：图片按内容哈希缓存在 data/cache/images，在后台生成
+VISUALIZATION_CONFIG = {
+    "figure_width": 12,  # 图片宽度（英寸），波形按 宽度 × dpi 个像素列降采样
+    "dpi": 150,
+    "spectrogram_columns": 600,  # 特征缓存中保存的频谱图/色度图列数（按时间平均降采样）
+    "max_bytes": 512 * 1024 ** 2  # 图片缓存的总大小上限，超过时淘汰最久未用的
+}
+
+# 波形峰值金字塔配置：上传时从解码后的信号生成，保存在 data/cache/peaks
+PEAKS_CONFIG = {
+    "samples_per_peak": 256,  # 第0级每对 (最小值, 最大值) 覆盖的采样数
+    "levels": 10  # 级数，每级的峰值对数减半
+}
+
 # 舞蹈生成配置
 DANCE_CONFIG = {
     "frame_rate": 30,
-    "joint_count": 25,  # 25个关节点
+    "skeleton": "dance17",  # 骨架布局（models/skeleton.py），决定关节数
+    "dtype": "float32",  # 序列的数据类型
     "sequence_length": 300  # 10秒的序列
-}
\ No newline at end of file
+}
+
+# 动作质量分析配置：生成报告中的 motion_analytics，长度和高度阈值以静止姿态的身高为单位
+MOTION_ANALYTICS_CONFIG = {
+    "beat_sigma": 0.1,  # 节拍对齐得分的高斯宽度（秒）
+    "speed_smoothing": 5,  # 检测动作节拍（平均关节速度的局部极小值）前的平滑窗口（帧）
+    "contact_height": 0.05,  # 脚离地面低于该高度视为着地
+    "skate_speed": 0.2,  # 着地的脚水平速度超过该值（身高/秒）视为滑步
+    "penetration_tolerance": 0.01,  # 关节低于地面超过该深度视为穿地
+    "bone_tolerance": 0.1  # 骨骼长度相对静止姿态的偏差超过该比例视为违规
+}
+
+# 动画导出配置：已保存的序列导出为 BVH / GLB，按块求解关节旋转并以流的形式返回
+EXPORT_CONFIG = {
+    "body_height": 1.7,  # 静止姿态缩放到的身高（米），脚踝位于地面 Y=0
+    "bvh_units_per_meter": 100,  # BVH 的长度单位（厘米）
+    "precision": 4,  # BVH 数值的小数位数
+    "chunk_frames": 2048  # 每块求解和输出的帧数
+}
+
+# 动作匹配配置
+MOTION_MATCHING_CONFIG = {
+    "velocity_weight": 10.0,  # 速度特征权重
+    "transition_frames": 8,  # 入口帧处的过渡帧数
+    "leaf_size": 16  # KD树叶子大小
+}
+
+# 群舞队形配置
+FORMATION_CONFIG = {
+    "max_dancers": 12,
+    "modes": ["unison", "canon", "mirror"],  # 齐舞、卡农、镜像
+    "layouts": ["line", "v", "circle", "grid"],  # 横排、V字、圆形、方阵
+    "spacing": 0.9,  # 舞者间距
+    "row_depth": 1.0,  # 前后排间距
+    "canon_delay_beats": 1  # 卡农模式下相邻舞者间隔的拍数
+}
+
+# 性能监控配置
+PROFILING_CONFIG = {
+    # 是否允许请求中开启 cProfile/pyinstrument（剖析文件写入输出目录，可通过 /api/download 下载）；
+    # None 表示只在开发模式下允许，可在 system_config.json 的 "profiling" 中设为 true/false
+    "allow_request_profiling": None,
+    # 阶段耗时直方图的分桶（秒）
+    "histogram_buckets": [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300]
+}
+
+# 启动预热配置
+WARMUP_CONFIG = {
+    "enabled": True,  # 启动后在后台线程中预热
+    "signal_duration": 2.0  # 预热用合成信号时长（秒）
+}
+
+# 特征缓存配置
+FEATURE_CACHE_CONFIG = {
+    "memory_entries": 256,  # 每个进程内存中保留的特征条数
+    "prewarm_songs": 20  # 工作进程启动时预加载最近使用的歌曲数
+}
+
+# 解码音频缓存配置：重采样后的 float32 信号保存在 data/cache/pcm，读取时内存映射
+PCM_CACHE_CONFIG = {
+    "max_bytes": 2 * 1024 ** 3  # 磁盘上的总大小上限（3分钟歌曲约 16MB），超过时淘汰最久未用的
+}
+
+# 分布式渲染配置（farm.py）：协调者把已保存的序列按时间切块写入 SQLite 队列，工作进程按租约领取
+# 多台主机时 data 目录（队列、序列、音乐、分段缓存）需放在共享存储上，队列不能使用 WAL
+FARM_CONFIG = {
+    "queue_path": FARM_DIR / "queue.db",
+    # auto：队列在本地磁盘上时用 WAL，在网络文件系统（NFS、SMB 等）上时用 DELETE
+    # （WAL 依赖同一台主机上的共享内存，多台主机同时访问会损坏数据库）；也可直接指定 WAL 或 DELETE
+    "journal_mode": "auto",
+    "chunk_seconds": 10,  # 每块的视频时长，按分段时长取整
+    "lease_seconds": 120,  # 租约时长，每渲染完一个分段续约；工作进程失联后其他进程可重新领取
+    "max_attempts": 3,  # 每块最多尝试次数，超过后整个任务失败
+    "poll_interval": 1.0  # 队列为空时的轮询间隔（秒）
+}
+
+# 批量导入配置（ingest.py）：多进程分析整个曲库，预先填充特征、波形峰值和解码音频缓存
+INGEST_CONFIG = {
+    "workers": 0,  # 分析进程数，0表示CPU核数
+    "checkpoint": CACHE_DIR / "ingest_checkpoint.jsonl",  # 进度文件，中断后再次运行时跳过已完成的文件
+    "progress_every": 10  # 每完成多少个文件打印一次吞吐量
+}
+
+# 服务部署配置，可在 system_config.json 的 "server" 中覆盖
+SERVER_CONFIG = {
+    "mode": "development",  # development: Flask开发服务器; production: 多进程WSGI
+    "host": "0.0.0.0",
+    "port": 5000,
+    "workers": 2,  # WSGI工作进程数
+    "threads": 4,  # 每个工作进程的请求线程数
+    "job_workers": 2,  # 每个工作进程用于分析/渲染的后台进程数，0表示在请求线程中执行
+    "timeout": 900  # 单个请求超时（秒）
+}
+
+SYSTEM_CONFIG_FILE = BASE_DIR / "system_config.json"
+if SYSTEM_CONFIG_FILE.exists():
+    with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8-sig') as f:
+        _system_config = json.load(f)
+    SERVER_CONFIG.update(_system_config.get('server', {}))
+    PROFILING_CONFIG.update(_system_config.get('profiling', {}))
+
+# 准入控制配置（每个服务进程独立计数）
+# analysis 的成本单位为音频秒数；render 的成本单位为参考分辨率下的视频秒数；
+# scoring 的成本单位为排练评分时 DTW 计算的格数（百万格，录制帧数 × 窗口宽度）
+ADMISSION_CONFIG = {
+    "analysis": {
+        "slots": 4,  # 同时进行的分析数
+        "capacity": 1800,  # 同时分析的音频总时长（秒）
+        "max_queue": 16,  # 排队上限，超过直接返回429
+        "max_wait": 30  # 排队最长等待（秒）
+    },
+    "render": {
+        "slots": 2,
+        "capacity": 1200,
+        "max_queue": 8,
+        "max_wait": 60
+    },
+    "scoring": {
+        "slots": 2,
+        "capacity": 20,
+        "max_queue": 8,
+        "max_wait": 30
+    },
+    "reference_resolution": (800, 600),
+    # 无法读取音频信息时按文件大小估算时长（字节/秒）
+    "bytes_per_second": {"wav": 176400, "flac": 100000, "mp3": 16000, "m4a": 16000, "aac": 16000}
+}
+
+# 渲染配置
+RENDER_CONFIG = {
+    # 单人视频的画面缩放：global 按整段序列统一缩放（镜头稳定），frame 按每帧重新缩放
+    "camera_fit": "global",
+    # 骨骼绘制后端，目前只有 opencv，见 models/render_backends.py
+    # （NumPy 参考实现只用于测试中核对画面，不能在这里选择）
+    "backend": "opencv"
+}
+
+# 相机配置：透视投影和多视角渲染
+# 坐标系：X向右、Y向上、Z为前后（正值为远离观众），观众位于 -Z 方向
+CAMERA_CONFIG = {
+    "fov": 45,  # 垂直视场角（度）
+    "max_views": 4,  # 同一画面中的最多视角数
+    "chunk_frames": 1024,  # 分块投影的帧数，限制群舞多视角时的内存
+    "presets": {
+        "front": {"yaw": 0, "pitch": 5},  # 正面
+        "side": {"yaw": 90, "pitch": 5},  # 侧面（从右侧看）
+        "top": {"yaw": 0, "pitch": 89},  # 俯视
+        "orbit": {"yaw": 0, "pitch": 15, "orbit_seconds": 8}  # 环绕，每 orbit_seconds 秒转一圈
+    }
+}
+
+# 练习速度配置：按速度变速音乐（不变调）并重新采样动作，变速后的音乐按 (歌曲, 速度) 缓存
+PRACTICE_CONFIG = {
+    "min_speed": 0.5,
+    "max_speed": 1.5,  # 变速后的音乐与原速音轨使用同一码率（SEGMENT_CONFIG['audio_bitrate']）
+    "speed_step": 0.05  # 请求的速度取整到该步长，同一首歌最多缓存 (max - min) / step 条变速音轨
+}
+
+# 排练评分配置：录制的关键点与生成序列做DTW对齐
+REHEARSAL_CONFIG = {
+    "band_seconds": 2.0,  # Sakoe-Chiba 窗口半宽（秒），允许的最大时间偏差
+    "error_tolerance": 0.5,  # 平均关节误差（以躯干长度为单位）达到该值时得分为0
+    "chunk_rows": 256,  # 分块计算帧间距离的行数，限制内存
+    "max_frames": 108000  # 上传关键点的最大帧数（30fps 下1小时）
+}
+
+# 分段渲染配置：视频按固定时长切成独立编码的分段，局部重新生成时只重新渲染受影响的分段
+SEGMENT_CONFIG = {
+    "segment_seconds": 2,  # 每个分段的时长（秒）
+    "codec": "libx264",
+    "preset": "veryfast",
+    "crf": 23,
+    "audio_bitrate": "192k",  # 每首歌（每个练习速度）只编码一次的 AAC 音轨（data/cache/audio），合成时直接复制
+    "audio_max_bytes": 2 * 1024 ** 3,  # 音轨缓存的总大小上限，超过时淘汰最久未用的
+    "blend_frames": 12,  # 局部重新生成时两端的过渡帧数
+    "beats_per_bar": 4,  # 按小节指定范围时每小节的拍数
+    # 分段缓存（data/cache/segments 中的 MP4 和 TS 分段）的总大小上限，超过时淘汰最久未用的；
+    # 流式任务的播放列表和未完成的分布式渲染任务引用的分段、最近 min_age_seconds 内用过的分段不淘汰
+    "max_bytes": 5 * 1024 ** 3,
+    "min_age_seconds": 3600,
+    "stream_retention_hours": 24  # 流式任务目录（播放列表和状态）最后更新后保留的时长
+}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+音乐驱动舞蹈辅助排演系统 - 分布式渲染
+
+协调者把已保存的舞蹈序列按时间切块发布到 SQLite 队列（FARM_CONFIG），
+任意数量的工作进程（本机或共享 data 目录的其他主机）按租约领取分块并渲染，
+全部完成后由协调者无重编码地拼接分段并合入音轨。
+
+用法:
+    python farm.py run <sequence_id> --workers 4        # 本机：发布、启动4个工作进程、等待并合成
+    python farm.py submit <sequence_id>                 # 只发布，打印 job_id
+    python farm.py worker                               # 启动一个工作进程（在每台渲染主机上运行）
+    python farm.py wait <job_id>                        # 等待完成并合成视频
+    python farm.py status <job_id>
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config import FARM_CONFIG
+from models import render_farm
+from utils.work_queue import WorkQueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分布式分块渲染')
+    parser.add_argument('--queue', default=str(FARM_CONFIG['queue_path']), help='队列数据库路径')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='在本机用多个工作进程渲染')
+    run_parser.add_argument('sequence_id')
+    run_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run_parser.add_argument('--practice-speed', type=float)
+    run_parser.add_argument('--chunk-seconds', type=float)
+
+    submit_parser = commands.add_parser('submit', help='发布渲染任务')
+    submit_parser.add_argument('sequence_id')
+    submit_parser.add_argument('--practice-speed', type=float)
+    submit_parser.add_argument('--chunk-seconds', type=float)
+
+    worker_parser = commands.add_parser('worker', help='启动工作进程')
+    worker_parser.add_argument('--id', help='工作进程标识，默认为 主机名:进程号')
+    worker_parser.add_argument('--idle-exit', type=float, help='队列空闲超过该秒数后退出')
+
+    wait_parser = commands.add_parser('wait', help='等待任务完成并合成视频')
+    wait_parser.add_argument('job_id')
+    wait_parser.add_argument('--timeout', type=float)
+
+    status_parser = commands.add_parser('status', help='查看任务状态')
+    status_parser.add_argument('job_id')
+
+    args = parser.parse_args()
+    queue = WorkQueue(args.queue)
+
+    try:
+        if args.command == 'run':
+            report = render_farm.run_local(args.sequence_id, args.workers, args.practice_speed,
+                                           args.chunk_seconds, args.queue)
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        elif args.command == 'submit':
+            print(render_farm.submit_render(args.sequence_id, args.practice_speed, args.chunk_seconds, queue))
+        elif args.command == 'worker':
+            worker = render_farm.FarmWorker(queue, worker_id=args.id)
+            print(f"工作进程 {worker.worker_id} 已启动，队列: {args.queue}")
+            processed = worker.run(idle_exit=args.idle_exit)
+            print(f"工作进程退出，共处理 {processed} 个分块")
+        elif args.command == 'wait':
+            status = render_farm.wait_for_job(args.job_id, queue, args.timeout)
+            if status['state'] == 'failed':
+                print(f"渲染任务失败: {status['error']}")
+                sys.exit(1)
+            print(json.dumps(render_farm.finalize_job(args.job_id, queue), ensure_ascii=False, indent=2))
+        elif args.command == 'status':
+            print(json.dumps(queue.status(args.job_id), ensure_ascii=False, indent=2))
+    except KeyError as e:
+        print(f"错误: 序列或任务不存在: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n已停止")
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
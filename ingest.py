@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+音乐驱动舞蹈辅助排演系统 - 曲库批量导入
+
+扫描目录中的音乐文件，在多个进程中分析，预先填充特征缓存、波形峰值和解码音频缓存。
+分析调用与在线接口相同的处理器（models.pipeline），结果与 /api/upload_music、
+/api/generate_dance 等接口完全一致。进度逐个文件写入进度文件，中断后再次运行时跳过已完成的文件。
+
+用法:
+    python ingest.py /path/to/library
+    python ingest.py /path/to/library --workers 8 --images
+    python ingest.py --restart          # 忽略进度文件，重新分析 data/music 中的全部文件
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from config import MUSIC_DIR, ALLOWED_EXTENSIONS, ANALYSIS_PROFILES, ANALYSIS_ENDPOINT_PROFILES, INGEST_CONFIG
+from models import pipeline
+
+
+def ingest_file(path, images=False):
+    """在工作进程中分析一首歌，返回 (音频时长, 耗时)
+
+    依次完成各接口需要的分析：上传预览、时间轴（波形峰值和拍点/起音标记）、
+    音乐分析图用的频谱图，以及舞蹈生成用的特征。解码后的信号在各档位之间按采样率共享。
+    """
+    start = time.perf_counter()
+
+    music_info = pipeline.analyze_music(path)
+    for endpoint in ('timeline', 'visualization'):
+        # 完整分析时顺便写入拍点/起音标记和频谱图缓存
+        pipeline.get_music_processor(ANALYSIS_ENDPOINT_PROFILES[endpoint]).analyze_music(path)
+    pipeline.music_timeline(path)
+    if images:
+        pipeline.render_music_visualization(path)
+    pipeline.get_music_processor(ANALYSIS_ENDPOINT_PROFILES['generation']).extract_features(path)
+
+    return music_info['duration'], time.perf_counter() - start
+
+
+def scan_music_files(directory):
+    """递归查找目录中的音乐文件（跳过隐藏文件），按路径排序"""
+    return sorted(
+        path for path in Path(directory).rglob('*')
+        if path.is_file() and not path.name.startswith('.')
+        and path.suffix.lower()[1:] in ALLOWED_EXTENSIONS
+    )
+
+
+def profiles_signature():
+    """分析档位配置的摘要，配置变化后进度文件中的记录不再有效"""
+    content = json.dumps(ANALYSIS_PROFILES, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+
+
+def file_key(path):
+    """进度记录的键：路径、大小和修改时间（不读取文件内容，扫描大曲库时也很快）"""
+    stat = path.stat()
+    return f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def load_checkpoint(checkpoint_path, signature):
+    """读取已成功分析的文件键；中断时可能写了一半的最后一行直接忽略"""
+    done = set()
+    if not checkpoint_path.exists():
+        return done
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == 'ok' and record.get('profiles') == signature:
+                done.add(record['key'])
+    return done
+
+
+class Progress:
+    """已完成文件数和吞吐量（文件/分钟、音频时长/实际时长）"""
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.start = time.perf_counter()
+
+    def add(self, duration=None):
+        self.completed += 1
+        if duration is None:
+            self.failed += 1
+        else:
+            self.audio_seconds += duration
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        files_per_minute = self.completed * 60 / elapsed if elapsed > 0 else 0.0
+        realtime = self.audio_seconds / elapsed if elapsed > 0 else 0.0
+        return (f"[{self.completed}/{self.total}] {files_per_minute:.1f} 文件/分钟, "
+                f"{realtime:.1f}× 实时, 失败 {self.failed}, 用时 {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量分析曲库，预先填充分析缓存')
+    parser.add_argument('directory', nargs='?', default=str(MUSIC_DIR), help='音乐目录（递归扫描）')
+    parser.add_argument('--workers', type=int, default=INGEST_CONFIG['workers'],
+                        help='分析进程数，0表示CPU核数')
+    parser.add_argument('--checkpoint', default=str(INGEST_CONFIG['checkpoint']), help='进度文件路径')
+    parser.add_argument('--restart', action='store_true', help='忽略进度文件，重新分析全部文件')
+    parser.add_argument('--images', action='store_true', help='同时生成音乐分析图')
+    args = parser.parse_args()
+
+    directory = Path(args.directory)
+    if not directory.is_dir():
+        print(f"错误: 目录不存在: {directory}")
+        sys.exit(1)
+
+    checkpoint_path = Path(args.checkpoint)
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+
+    signature = profiles_signature()
+    done = load_checkpoint(checkpoint_path, signature)
+    files = scan_music_files(directory)
+    pending = [(path, file_key(path)) for path in files]
+    pending = [(path, key) for path, key in pending if key not in done]
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"• 音乐目录: {directory}")
+    print(f"• 文件: {len(files)} 个, 已完成 {len(files) - len(pending)} 个, 待分析 {len(pending)} 个")
+    print(f"• 分析进程: {workers}")
+    if not pending:
+        return
+
+    # 每个进程单线程计算，避免数值库的线程数与进程数相乘
+    if workers > 1:
+        for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+            os.environ.setdefault(name, '1')
+
+    progress = Progress(len(pending))
+    # spawn 方式启动，与服务端的后台任务进程池一致
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            futures = {executor.submit(ingest_file, str(path), args.images): (path, key) for path, key in pending}
+            for future in as_completed(futures):
+                path, key = futures[future]
+                record = {'key': key, 'path': str(path), 'profiles': signature}
+                try:
+                    duration, elapsed = future.result()
+                    record.update(status='ok', duration=round(duration, 3), seconds=round(elapsed, 3))
+                    progress.add(duration)
+                except Exception as e:
+                    record.update(status='failed', error=str(e))
+                    progress.add()
+                    print(f"分析失败 {path.name}: {str(e)}")
+
+                # 每完成一个文件写一行，中断后从这里继续
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+
+                if progress.completed % INGEST_CONFIG['progress_every'] == 0:
+                    print(progress.summary())
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"\n已中断，进度已保存到 {checkpoint_path}，再次运行即可继续")
+        print(progress.summary())
+        sys.exit(130)
+
+    executor.shutdown()
+    print(progress.summary())
+    if progress.failed:
+        print(f"{progress.failed} 个文件分析失败，再次运行时会重试")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""动画导出：把 (T, J, 3) 关节位置序列转换为关节旋转，写成 BVH 或 GLB
+
+每个关节的全局旋转由它到子关节的方向求得：有两个以上不共线子关节的关节（胸部、脊柱）
+对全部子关节的方向做最小二乘拟合（Kabsch），各子关节的位置误差平方和最小；
+只有一个子关节的用最小旋转（扭转继承父关节），末端关节与父关节相同。
+骨骼长度固定为静止姿态的长度。按块求解，每块内对全部帧一次性向量化计算；
+BVH 逐块格式化输出，GLB 的 JSON 只包含少量描述，动画数据按访问器逐段输出。
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from config import EXPORT_CONFIG
+
+EXPORT_FORMATS = {
+    'bvh': 'text/plain',
+    'glb': 'model/gltf-binary'
+}
+
+_EPSILON = 1e-8
+
+
+def _normalize(vectors):
+    """按最后一维归一化，返回 (单位向量, 长度)，长度为零的向量保持为零"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, _EPSILON), norms[..., 0]
+
+
+def _swing(a, b):
+    """把单位向量 a 转到单位向量 b 的最小旋转矩阵 (..., 3, 3)"""
+    axis = np.cross(a, b)
+    cos = np.einsum('...i,...i->...', a, b)
+    skew = np.zeros(axis.shape + (3,))
+    skew[..., 0, 1], skew[..., 0, 2] = -axis[..., 2], axis[..., 1]
+    skew[..., 1, 0], skew[..., 1, 2] = axis[..., 2], -axis[..., 0]
+    skew[..., 2, 0], skew[..., 2, 1] = -axis[..., 1], axis[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rotation = np.eye(3) + skew + skew @ skew / (1 + cos)[..., None, None]
+
+    # 方向相反时绕任一垂直轴旋转180度
+    opposite = cos < -1 + 1e-6
+    if opposite.any():
+        a_opp = a[opposite]
+        helper = np.where(np.abs(a_opp[:, :1]) < 0.9, [[1.0, 0, 0]], [[0, 1.0, 0]])
+        perpendicular, _ = _normalize(np.cross(a_opp, helper))
+        rotation[opposite] = 2 * perpendicular[:, :, None] * perpendicular[:, None, :] - np.eye(3)
+    return rotation
+
+
+def _kabsch(rest, current):
+    """把静止方向 rest (K, 3) 对齐到当前方向 current (..., K, 3) 的最小二乘旋转 (..., 3, 3)，
+    以及子关节方向共线、旋转无法确定的掩码"""
+    covariance = np.einsum('ki,...kj->...ij', rest, current)
+    u, singular, vt = np.linalg.svd(covariance)
+    # 保证是旋转而不是镜像
+    sign = np.sign(np.linalg.det(np.swapaxes(vt, -1, -2) @ np.swapaxes(u, -1, -2)))
+    correction = np.broadcast_to(np.eye(3), covariance.shape).copy()
+    correction[..., 2, 2] = np.where(sign == 0, 1.0, sign)
+    rotation = np.swapaxes(vt, -1, -2) @ correction @ np.swapaxes(u, -1, -2)
+    return rotation, singular[..., 1] < _EPSILON * np.maximum(singular[..., 0], _EPSILON)
+
+
+class RotationSolver:
+    """由关节位置求解各关节的局部旋转（相对父关节）"""
+
+    def __init__(self, skeleton):
+        self.skeleton = skeleton
+        self.parents = skeleton.parents
+        rest_pose = skeleton.rest_pose.astype(np.float64)
+        self.offsets = np.zeros_like(rest_pose)
+        has_parent = self.parents >= 0
+        self.offsets[has_parent] = rest_pose[has_parent] - rest_pose[self.parents[has_parent]]
+
+        # 每个关节的子关节；子关节方向不全部共线时整体拟合旋转，否则只用第一个子关节的方向
+        self.children = [[child for child in range(skeleton.joint_count) if self.parents[child] == joint]
+                         for joint in range(skeleton.joint_count)]
+        self.axes = []
+        for joint, children in enumerate(self.children):
+            if not children:
+                self.axes.append(None)
+                continue
+            fitted = len(children) > 1 and np.linalg.matrix_rank(self.offsets[children], tol=_EPSILON) > 1
+            self.axes.append((children[0], children if fitted else None))
+
+    def solve(self, positions):
+        """positions: (T, J, 3) -> 局部旋转矩阵 (T, J, 3, 3)"""
+        positions = np.asarray(positions, dtype=np.float64)
+        total_frames, joint_count = positions.shape[:2]
+        world = np.empty((total_frames, joint_count, 3, 3))
+        local = np.empty_like(world)
+        identity = np.broadcast_to(np.eye(3), (total_frames, 3, 3))
+
+        # 父关节在子关节之前，按序号依次求解，每个关节对全部帧一次计算
+        for joint in range(joint_count):
+            parent = self.parents[joint]
+            parent_world = world[:, parent] if parent >= 0 else identity
+            if self.axes[joint] is None:
+                world[:, joint] = parent_world
+                local[:, joint] = np.eye(3)
+                continue
+
+            primary, children = self.axes[joint]
+            direction, length = _normalize(positions[:, primary] - positions[:, joint])
+            rest_direction = parent_world @ _normalize(self.offsets[primary])[0]
+            rotation = _swing(rest_direction, direction) @ parent_world
+            # 子关节与当前关节重合时无法确定方向，沿用父关节的旋转
+            rotation[length < _EPSILON] = parent_world[length < _EPSILON]
+
+            if children is not None:
+                # 当前方向按静止姿态的骨骼长度缩放，拟合结果使子关节的位置误差平方和最小；
+                # 与当前关节重合的子关节方向为零，不参与拟合
+                current = _normalize(positions[:, children] - positions[:, joint, None])[0]
+                current = current * np.linalg.norm(self.offsets[children], axis=-1)[:, None]
+                solved, degenerate = _kabsch(self.offsets[children], current)
+                rotation = np.where(degenerate[:, None, None], rotation, solved)
+
+            world[:, joint] = rotation
+            local[:, joint] = np.swapaxes(parent_world, -1, -2) @ rotation
+        return local
+
+
+def euler_zxy(rotations):
+    """旋转矩阵 (..., 3, 3) -> BVH 的 Zrotation Xrotation Yrotation 角度（度），R = Rz·Rx·Ry"""
+    x = np.arcsin(np.clip(rotations[..., 2, 1], -1.0, 1.0))
+    z = np.arctan2(-rotations[..., 0, 1], rotations[..., 1, 1])
+    y = np.arctan2(-rotations[..., 2, 0], rotations[..., 2, 2])
+
+    # 万向节锁：X 为 ±90 度时只有 Z±Y 可确定，取 Z=0
+    locked = np.cos(x) < 1e-6
+    z = np.where(locked, 0.0, z)
+    y = np.where(locked, np.arctan2(rotations[..., 0, 2], rotations[..., 0, 0]), y)
+    return np.degrees(np.stack([z, x, y], axis=-1))
+
+
+def quaternions(rotations):
+    """旋转矩阵 (..., 3, 3) -> 单位四元数 (..., 4)，glTF 顺序 (x, y, z, w)"""
+    m = rotations
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # 分别以 w、x、y、z 为最大分量计算，按对角元素选择数值最稳定的一种
+    candidates = np.stack([
+        np.stack([m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1],
+                  1 + trace], axis=-1),
+        np.stack([1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], m[..., 0, 1] + m[..., 1, 0],
+                  m[..., 0, 2] + m[..., 2, 0], m[..., 2, 1] - m[..., 1, 2]], axis=-1),
+        np.stack([m[..., 0, 1] + m[..., 1, 0], 1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2],
+                  m[..., 1, 2] + m[..., 2, 1], m[..., 0, 2] - m[..., 2, 0]], axis=-1),
+        np.stack([m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1],
+                  1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2], m[..., 1, 0] - m[..., 0, 1]], axis=-1)
+    ], axis=-2)
+    choice = np.argmax(np.stack([trace, m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]], axis=-1), axis=-1)
+    quat = np.take_along_axis(candidates, choice[..., None, None], axis=-2)[..., 0, :]
+    return _normalize(quat)[0]
+
+
+class AnimationExporter:
+    def __init__(self, skeleton, frame_rate, config=None):
+        self.config = dict(EXPORT_CONFIG, **(config or {}))
+        self.skeleton = skeleton
+        self.frame_rate = frame_rate
+        self.solver = RotationSolver(skeleton)
+
+        # 缩放到指定身高（米），脚踝放在地面上
+        rest_pose = skeleton.rest_pose.astype(np.float64)
+        self.ground = float(rest_pose[:, 1].min())
+        self.scale = self.config['body_height'] / (float(rest_pose[:, 1].max()) - self.ground or 1.0)
+
+    def _chunks(self, sequence):
+        """按块返回 (起始帧, 根节点位置（米）, 局部旋转矩阵)"""
+        chunk_frames = self.config['chunk_frames']
+        for start in range(0, len(sequence), chunk_frames):
+            positions = np.asarray(sequence[start:start + chunk_frames], dtype=np.float64)
+            root = (positions[:, 0] - [0, self.ground, 0]) * self.scale
+            yield start, root, self.solver.solve(positions)
+
+    def bvh(self, sequence):
+        """逐块生成 BVH 文本"""
+        unit = self.scale * self.config['bvh_units_per_meter']
+        yield self._bvh_hierarchy(unit)
+        yield f"MOTION\nFrames: {len(sequence)}\nFrame Time: {1 / self.frame_rate:.6f}\n"
+
+        # 各帧的旋转通道按层级中关节出现的顺序（深度优先）排列
+        order = self._depth_first_order()
+        columns = 3 + 3 * len(order)
+        row_format = ' '.join([f"%.{self.config['precision']}f"] * columns) + '\n'
+        for _, root, local in self._chunks(sequence):
+            values = np.concatenate([root * self.config['bvh_units_per_meter'],
+                                     euler_zxy(local[:, order]).reshape(len(local), -1)], axis=1)
+            # 整块用一次格式化，不逐个数值拼接字符串
+            yield (row_format * len(values)) % tuple(values.ravel().tolist())
+
+    def _bvh_hierarchy(self, unit):
+        lines = ['HIERARCHY']
+        precision = self.config['precision']
+
+        def vector(values):
+            return ' '.join(f"{value:.{precision}f}" for value in values)
+
+        def write_joint(joint, depth):
+            indent = '\t' * depth
+            name = self.skeleton.joint_names[joint]
+            if self.skeleton.parents[joint] < 0:
+                lines.append(f"{indent}ROOT {name}")
+                offset = np.zeros(3)
+                channels = 'CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation'
+            else:
+                lines.append(f"{indent}JOINT {name}")
+                offset = self.solver.offsets[joint] * unit
+                channels = 'CHANNELS 3 Zrotation Xrotation Yrotation'
+            lines.append(f"{indent}{{")
+            lines.append(f"{indent}\tOFFSET {vector(offset)}")
+            lines.append(f"{indent}\t{channels}")
+            if self.solver.children[joint]:
+                for child in self.solver.children[joint]:
+                    write_joint(child, depth + 1)
+            else:
+                # 末端沿最后一段骨骼方向延伸半个骨骼长度
+                end = self.solver.offsets[joint] * unit * 0.5
+                lines.append(f"{indent}\tEnd Site")
+                lines.append(f"{indent}\t{{")
+                lines.append(f"{indent}\t\tOFFSET {vector(end)}")
+                lines.append(f"{indent}\t}}")
+            lines.append(f"{indent}}}")
+
+        write_joint(0, 0)
+        return '\n'.join(lines) + '\n'
+
+    def _depth_first_order(self):
+        """从根节点深度优先遍历的关节顺序"""
+        order = []
+        stack = [0]
+        while stack:
+            joint = stack.pop()
+            order.append(joint)
+            stack.extend(reversed(self.solver.children[joint]))
+        return order
+
+    def glb(self, sequence):
+        """返回 (文件总字节数, 逐段生成 GLB 内容的迭代器)
+
+        局部旋转按块求解后写入按关节排列的数组，每个关节的动画数据在缓冲区中连续存放。
+        """
+        total_frames = len(sequence)
+        joint_count = self.skeleton.joint_count
+        animated = [joint for joint in range(joint_count) if self.solver.children[joint]]
+
+        root = np.empty((total_frames, 3), dtype=np.float32)
+        rotations = np.empty((len(animated), total_frames, 4), dtype=np.float32)
+        for start, chunk_root, local in self._chunks(sequence):
+            end = start + len(local)
+            root[start:end] = chunk_root
+            rotations[:, start:end] = quaternions(local[:, animated]).transpose(1, 0, 2)
+
+        # q 与 -q 表示同一旋转，逐帧取与前一帧同号的一个，插值时不会绕远路
+        if total_frames > 1:
+            flips = np.einsum('jtk,jtk->jt', rotations[:, 1:], rotations[:, :-1]) < 0
+            signs = np.cumprod(np.where(flips, -1, 1), axis=1)
+            rotations[:, 1:] *= signs[:, :, None].astype(np.float32)
+
+        # 静止姿态的全局变换只有平移，绑定矩阵的逆为反向平移（列主序）
+        rest_world = (self.skeleton.rest_pose.astype(np.float64) - [0, self.ground, 0]) * self.scale
+        inverse_bind = np.tile(np.eye(4, dtype=np.float32), (joint_count, 1, 1))
+        inverse_bind[:, 3, :3] = -rest_world
+
+        # 缓冲区：绑定矩阵、时间、根节点平移、各关节旋转，依次连续存放
+        views = [('inverse_bind', joint_count * 64), ('time', total_frames * 4), ('root', total_frames * 12)]
+        views += [(f'rotation_{joint}', total_frames * 16) for joint in animated]
+        buffer_views, offset = [], 0
+        for _, length in views:
+            buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': length})
+            offset += length
+        buffer_length = offset
+
+        duration = (total_frames - 1) / self.frame_rate if total_frames else 0.0
+        accessors = [
+            {'bufferView': 0, 'componentType': 5126, 'count': joint_count, 'type': 'MAT4'},
+            {'bufferView': 1, 'componentType': 5126, 'count': total_frames, 'type': 'SCALAR',
+             'min': [0.0], 'max': [float(np.float32(duration))]},
+            {'bufferView': 2, 'componentType': 5126, 'count': total_frames, 'type': 'VEC3'}
+        ]
+        accessors += [{'bufferView': 3 + i, 'componentType': 5126, 'count': total_frames, 'type': 'VEC4'}
+                      for i in range(len(animated))]
+
+        nodes = []
+        for joint in range(joint_count):
+            node = {'name': self.skeleton.joint_names[joint]}
+            if self.skeleton.parents[joint] >= 0:
+                node['translation'] = (self.solver.offsets[joint] * self.scale).tolist()
+            else:
+                node['translation'] = rest_world[joint].tolist()
+            if self.solver.children[joint]:
+                node['children'] = self.solver.children[joint]
+            nodes.append(node)
+
+        samplers = [{'input': 1, 'output': 2, 'interpolation': 'LINEAR'}]
+        channels = [{'sampler': 0, 'target': {'node': 0, 'path': 'translation'}}]
+        for i, joint in enumerate(animated):
+            samplers.append({'input': 1, 'output': 3 + i, 'interpolation': 'LINEAR'})
+            channels.append({'sampler': i + 1, 'target': {'node': joint, 'path': 'rotation'}})
+
+        document = {
+            'asset': {'version': '2.0', 'generator': 'dance-rehearsal animation export'},
+            'scene': 0,
+            'scenes': [{'nodes': [0]}],
+            'nodes': nodes,
+            'skins': [{'joints': list(range(joint_count)), 'skeleton': 0, 'inverseBindMatrices': 0}],
+            'animations': [{'name': 'dance', 'samplers': samplers, 'channels': channels}],
+            'accessors': accessors,
+            'bufferViews': buffer_views,
+            'buffers': [{'byteLength': buffer_length}]
+        }
+        json_chunk = json.dumps(document, separators=(',', ':')).encode('utf-8')
+        json_chunk += b' ' * (-len(json_chunk) % 4)
+        total_length = 12 + 8 + len(json_chunk) + 8 + buffer_length
+
+        def chunks():
+            yield struct.pack('<4sII', b'glTF', 2, total_length)
+            yield struct.pack('<I4s', len(json_chunk), b'JSON') + json_chunk
+            yield struct.pack('<I4s', buffer_length, b'BIN\x00')
+            yield inverse_bind.tobytes()
+            chunk_frames = self.config['chunk_frames']
+            for start in range(0, total_frames, chunk_frames):
+                end = min(start + chunk_frames, total_frames)
+                yield (np.arange(start, end, dtype=np.float64) / self.frame_rate).astype(np.float32).tobytes()
+            for data in [root] + list(rotations):
+                for start in range(0, total_frames, chunk_frames):
+                    yield data[start:start + chunk_frames].tobytes()
+
+        return total_length, chunks()
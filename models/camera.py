@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""相机模块：透视投影、预设视角和多视角布局，整段序列批量投影"""
+
+import numpy as np
+
+from config import CAMERA_CONFIG
+
+
+class Camera:
+    """围绕目标点的透视相机
+
+    yaw 为水平转角（0 为正面，从观众方向看向舞者），pitch 为俯仰角，
+    orbit_seconds 不为空时相机按该周期绕目标旋转。
+    坐标系与现有画面一致：正面视角下世界 X 轴指向画面右侧。
+    """
+
+    def __init__(self, name='front', yaw=0.0, pitch=0.0, fov=None, orbit_seconds=None):
+        self.name = name
+        self.yaw = yaw
+        self.pitch = pitch
+        self.fov = fov or CAMERA_CONFIG['fov']
+        self.orbit_seconds = orbit_seconds
+
+        # 由 fit() 根据序列范围确定
+        self.target = np.zeros(3)
+        self.distance = 3.0
+
+    @classmethod
+    def from_preset(cls, name):
+        """按预设名称创建相机"""
+        preset = CAMERA_CONFIG['presets'].get(name)
+        if preset is None:
+            raise Exception(f"不支持的视角: {name}")
+        return cls(name=name, **preset)
+
+    def fit(self, points):
+        """让整段序列的包围球恰好落在视野内，points 为 (..., 3)"""
+        points = points.reshape(-1, 3)
+        low, high = points.min(axis=0), points.max(axis=0)
+        self.target = (low + high) / 2
+        radius = max(np.linalg.norm(points - self.target, axis=1).max(), 1e-3)
+        self.distance = radius / np.sin(np.radians(self.fov) / 2) * 1.1
+        return self
+
+    def view_projection(self, frame_indices, frame_rate, aspect):
+        """返回各帧的 4x4 视图投影矩阵 (T, 4, 4)；固定相机时为 (1, 4, 4)"""
+        if self.orbit_seconds:
+            yaw = np.radians(self.yaw) + 2 * np.pi * np.asarray(frame_indices) / (self.orbit_seconds * frame_rate)
+        else:
+            yaw = np.array([np.radians(self.yaw)])
+        pitch = np.radians(self.pitch)
+
+        # 相机位置：yaw=0 时位于目标的 -Z 方向（观众席）
+        offset = np.stack([
+            np.sin(yaw) * np.cos(pitch),
+            np.full_like(yaw, np.sin(pitch)),
+            -np.cos(yaw) * np.cos(pitch)
+        ], axis=-1)
+        forward = -offset
+        right = np.cross(np.array([0.0, 1.0, 0.0]), forward)
+        right /= np.linalg.norm(right, axis=-1, keepdims=True)
+        up = np.cross(forward, right)
+        eye = self.target + offset * self.distance
+
+        view = np.zeros((len(yaw), 4, 4))
+        view[:, 0, :3], view[:, 1, :3], view[:, 2, :3] = right, up, forward
+        view[:, 0, 3] = -np.einsum('ti,ti->t', right, eye)
+        view[:, 1, 3] = -np.einsum('ti,ti->t', up, eye)
+        view[:, 2, 3] = -np.einsum('ti,ti->t', forward, eye)
+        view[:, 3, 3] = 1
+
+        # 透视投影：输出 (x, y, 深度, w)，除以 w 后得到 [-1, 1] 的规范化坐标
+        focal = 1 / np.tan(np.radians(self.fov) / 2)
+        projection = np.array([
+            [focal / aspect, 0, 0, 0],
+            [0, focal, 0, 0],
+            [0, 0, 1, 0],
+            [0, 0, 1, 0]
+        ])
+        return projection @ view
+
+    def layout_key(self):
+        """影响画面的相机参数（用于分段缓存键）"""
+        return (self.name, self.yaw, self.pitch, self.fov, self.orbit_seconds,
+                tuple(np.round(self.target, 6).tolist()), round(float(self.distance), 6))
+
+
+def layout_viewports(view_count, left, top, width, height, gap=8):
+    """把区域划分为 1～4 个视口，返回 [(x, y, w, h), ...]"""
+    if view_count == 1:
+        return [(left, top, width, height)]
+    if view_count == 2:
+        half = (width - gap) // 2
+        return [(left, top, half, height), (left + half + gap, top, half, height)]
+
+    half_w = (width - gap) // 2
+    half_h = (height - gap) // 2
+    cells = [(left, top), (left + half_w + gap, top),
+             (left, top + half_h + gap), (left + half_w + gap, top + half_h + gap)]
+    return [(x, y, half_w, half_h) for x, y in cells[:view_count]]
+
+
+def project_views(points, cameras, viewports, frame_rate, chunk_frames=None):
+    """把 (T, K, 3) 的点一次批量投影到所有视角的视口
+
+    所有视角和帧的矩阵堆叠为 (V, T, 4, 4)，与齐次坐标做一次矩阵乘法；
+    帧数很多时按 chunk_frames 分块以限制内存。
+    返回 (像素坐标 (V, T, K, 2) int32, 可见 (V, T, K) bool, 深度 (V, T, K) float32)。
+    """
+    chunk_frames = chunk_frames or CAMERA_CONFIG['chunk_frames']
+    total_frames, point_count = points.shape[:2]
+    view_count = len(cameras)
+
+    pixels = np.empty((view_count, total_frames, point_count, 2), dtype=np.int32)
+    visible = np.empty((view_count, total_frames, point_count), dtype=bool)
+    depth = np.empty((view_count, total_frames, point_count), dtype=np.float32)
+
+    viewports = np.asarray(viewports, dtype=np.float64)
+    vx, vy, vw, vh = [viewports[:, i, None, None] for i in range(4)]
+
+    for start in range(0, total_frames, chunk_frames):
+        end = min(start + chunk_frames, total_frames)
+        frame_indices = np.arange(start, end)
+        matrices = np.stack([
+            np.broadcast_to(camera.view_projection(frame_indices, frame_rate, w / h), (end - start, 4, 4))
+            for camera, (_, _, w, h) in zip(cameras, viewports)
+        ]).astype(np.float32)
+
+        homogeneous = np.concatenate(
+            [points[start:end], np.ones((end - start, point_count, 1))], axis=-1
+        ).astype(np.float32)
+
+        # (V, T, 4, 4) x (T, 4, K) -> (V, T, 4, K)
+        clip = matrices @ homogeneous.transpose(0, 2, 1)[None]
+        w = clip[:, :, 3]
+        in_front = w > 1e-3
+        w = np.where(in_front, w, 1)
+        ndc_x = clip[:, :, 0] / w
+        ndc_y = clip[:, :, 1] / w
+
+        px = vx + (ndc_x + 1) / 2 * vw
+        py = vy + (1 - ndc_y) / 2 * vh
+        pixels[:, start:end, :, 0] = np.clip(px, -1e6, 1e6)
+        pixels[:, start:end, :, 1] = np.clip(py, -1e6, 1e6)
+        visible[:, start:end] = in_front & (px >= vx) & (px < vx + vw) & (py >= vy) & (py < vy + vh)
+        depth[:, start:end] = clip[:, :, 2]
+
+    return pixels, visible, depth
@@ -1,41 +1,34 @@
 import numpy as np
 import random
-from scipy.interpolate import interp1d
 import json
 from pathlib import Path
-from config import DANCE_STYLES, DANCE_CONFIG
+from config import DANCE_STYLES, DANCE_CONFIG, MOTION_MATCHING_CONFIG, SEGMENT_CONFIG
+from models.motion_matching import MotionMatcher
+from models.skeleton import get_skeleton, SEQUENCE_DTYPE
+from utils.profiling import timed
 
 
 class DanceGenerator:
     def __init__(self):
         self.frame_rate = DANCE_CONFIG['frame_rate']
-        self.joint_count = DANCE_CONFIG['joint_count']
-
-        # 定义关节层级关系
-        self.joint_hierarchy = {
-            'root': 0,
-            'hip': 0,
-            'spine': 1,
-            'chest': 2,
-            'neck': 3,
-            'head': 4,
-            'left_shoulder': 5,
-            'left_elbow': 6,
-            'left_wrist': 7,
-            'right_shoulder': 8,
-            'right_elbow': 9,
-            'right_wrist': 10,
-            'left_hip': 11,
-            'left_knee': 12,
-            'left_ankle': 13,
-            'right_hip': 14,
-            'right_knee': 15,
-            'right_ankle': 16
-        }
+        # 骨架定义（关节名称、层级和静止姿态），动作库按 dance17 骨架的关节序号编写
+        self.skeleton = get_skeleton()
+        self.joint_count = self.skeleton.joint_count
 
         # 舞蹈动作库
         self.dance_moves = self._load_dance_moves()
 
+        # 预计算的动作片段及其匹配索引，按 (风格, 每拍帧数) 缓存
+        self.transition_frames = MOTION_MATCHING_CONFIG['transition_frames']
+        self._matcher_cache = {}
+
+    def warm_up(self, tempo=100):
+        """预热：为各风格预计算常见节奏下的动作库索引"""
+        with timed('warm_up.generator'):
+            frames_per_beat = max(1, int((60 / tempo) * self.frame_rate))
+            for dance_style, style_moves in self.dance_moves.items():
+                self._get_move_matcher(style_moves, frames_per_beat, dance_style)
+
     def _load_dance_moves(self):
         """加载预定义的舞蹈动作"""
         moves = {
@@ -76,15 +69,17 @@ class DanceGenerator:
             style_moves = self.dance_moves["赛乃姆"]  # 默认
 
         # 生成动作序列
-        generated_frames = self._generate_by_style(
-            style_moves, tempo, beats, total_frames, dance_style
-        )
+        with timed('generate_by_style'):
+            generated_frames = self._generate_by_style(
+                style_moves, tempo, beats, total_frames, dance_style
+            )
 
         # 合并序列
         dance_sequence = np.vstack([dance_sequence, generated_frames])
 
         # 应用平滑
-        dance_sequence = self._smooth_sequence(dance_sequence)
+        with timed('smooth_sequence'):
+            dance_sequence = self._smooth_sequence(dance_sequence)
 
         # 确保序列长度正确
         if len(dance_sequence) > total_frames:
@@ -96,86 +91,158 @@ class DanceGenerator:
 
         return dance_sequence
 
-    def _initialize_pose(self):
-        """初始化T-pose"""
-        # 简单的T-pose
-        pose = np.zeros((1, self.joint_count, 3))
-
-        # 设置关节位置
-        # 身体中心
-        pose[0, 0] = [0, 0, 0]  # 根节点
-
-        # 脊柱
-        pose[0, 1] = [0, 0.1, 0]  # 髋部
-        pose[0, 2] = [0, 0.2, 0]  # 胸部
-        pose[0, 3] = [0, 0.25, 0]  # 颈部
-        pose[0, 4] = [0, 0.3, 0]  # 头部
-
-        # 左臂
-        pose[0, 5] = [-0.1, 0.2, 0]  # 左肩
-        pose[0, 6] = [-0.2, 0.2, 0]  # 左肘
-        pose[0, 7] = [-0.3, 0.2, 0]  # 左腕
-
-        # 右臂
-        pose[0, 8] = [0.1, 0.2, 0]  # 右肩
-        pose[0, 9] = [0.2, 0.2, 0]  # 右肘
-        pose[0, 10] = [0.3, 0.2, 0]  # 右腕
-
-        # 左腿
-        pose[0, 11] = [-0.05, 0.1, 0]  # 左髋
-        pose[0, 12] = [-0.05, 0, 0]  # 左膝
-        pose[0, 13] = [-0.05, -0.1, 0]  # 左踝
-
-        # 右腿
-        pose[0, 14] = [0.05, 0.1, 0]  # 右髋
-        pose[0, 15] = [0.05, 0, 0]  # 右膝
-        pose[0, 16] = [0.05, -0.1, 0]  # 右踝
-
-        return pose
-
-    def _generate_by_style(self, style_moves, tempo, beats, total_frames, dance_style):
-        """根据风格生成动作序列"""
-        frames_per_beat = int((60 / tempo) * self.frame_rate)
-
-        # 根据舞蹈风格调整参数
-        if dance_style == "赛乃姆":
-            amplitude = 0.5
-            speed = 0.8
-        elif dance_style == "萨玛舞":
-            amplitude = 0.3
-            speed = 0.5
-        elif dance_style == "刀郎舞":
-            amplitude = 0.7
-            speed = 1.2
+    def regenerate_range(self, dance_sequence, music_features, dance_style, start_frame, end_frame,
+                         keywords="", blend_frames=None):
+        """只重新生成 [start_frame, end_frame) 范围内的动作，两端与原序列平滑衔接
+
+        范围外的帧原样保留（逐字节相同），返回新的序列。
+        """
+        blend_frames = SEGMENT_CONFIG['blend_frames'] if blend_frames is None else blend_frames
+        total_frames = len(dance_sequence)
+        start_frame = max(0, int(start_frame))
+        end_frame = min(total_frames, int(end_frame))
+        if end_frame <= start_frame:
+            raise Exception("重新生成的范围无效")
+
+        tempo = music_features.get('tempo', 100)
+        beats = music_features.get('beats', [])
+        style_moves = self.dance_moves.get(dance_style, self.dance_moves["赛乃姆"])
+
+        # 起点：从范围前一帧的姿态和速度继续生成
+        if start_frame > 0:
+            start_pose = dance_sequence[start_frame - 1]
+            start_velocity = start_pose - dance_sequence[start_frame - 2] if start_frame > 1 \
+                else np.zeros_like(start_pose)
         else:
-            amplitude = 0.5
-            speed = 1.0
+            start_pose, start_velocity = None, None
+
+        length = end_frame - start_frame
+        with timed('generate_by_style'):
+            generated = self._generate_by_style(style_moves, tempo, beats, length, dance_style,
+                                                start_pose=start_pose, start_velocity=start_velocity)
+        with timed('smooth_sequence'):
+            generated = self._smooth_sequence(generated)
+        if len(generated) < length:
+            generated = np.pad(generated, ((0, length - len(generated)), (0, 0), (0, 0)), mode='edge')
+        generated = generated[:length]
+
+        # 平滑会让开头偏离衔接姿态，把起点处与原序列交叉淡入
+        result = dance_sequence.copy()
+        original = dance_sequence[start_frame:end_frame]
+        n = min(blend_frames, length // 2)
+        if n > 0:
+            t = (np.arange(n) + 1) / (n + 1)
+            fade_in = t * t * (3 - 2 * t)
+            if start_frame > 0:
+                generated[:n] = original[:n] + fade_in[:, None, None] * (generated[:n] - original[:n])
+            # 终点：最后 n 帧淡出回原序列，保证与范围后的帧连续
+            if end_frame < total_frames:
+                fade_out = fade_in[::-1]
+                generated[-n:] = original[-n:] + fade_out[:, None, None] * (generated[-n:] - original[-n:])
+
+        result[start_frame:end_frame] = generated
+        return result
+
+    def rest_pose(self):
+        """静止姿态 (J, 3)，Y轴向上，脚踝在地面上"""
+        return self._initialize_pose()[0]
+
+    def _initialize_pose(self):
+        """初始化T-pose (1, J, 3)"""
+        return self.skeleton.rest_pose[None].copy()
+
+    def _generate_by_style(self, style_moves, tempo, beats, total_frames, dance_style,
+                           start_pose=None, start_velocity=None):
+        """根据风格生成动作序列，可指定衔接的起始姿态和速度"""
+        frames_per_beat = max(1, int((60 / tempo) * self.frame_rate))
+        matcher = self._get_move_matcher(style_moves, frames_per_beat, dance_style)
+        move_names = list(style_moves.keys())
 
         generated_frames = []
+        frame_count = 0
+
+        # 从初始姿态（或指定姿态）开始衔接
+        prev_pose = self._initialize_pose()[0] if start_pose is None else start_pose
+        prev_velocity = np.zeros_like(prev_pose) if start_velocity is None else start_velocity
 
         # 生成基本动作
-        for i in range(total_frames // 10):  # 每10帧一个动作单元
-            # 根据节奏选择动作
-            if i % frames_per_beat == 0:
-                # 在重拍上做更大幅度的动作
-                move_func = random.choice(list(style_moves.values()))
-                move_frames = move_func(
-                    duration=frames_per_beat * 2,
-                    amplitude=amplitude * 1.5,
-                    speed=speed
-                )
-            else:
-                # 弱拍上的过渡动作
-                move_func = random.choice(list(style_moves.values()))
-                move_frames = move_func(
-                    duration=frames_per_beat,
-                    amplitude=amplitude * 0.7,
-                    speed=speed * 0.8
-                )
-
-            generated_frames.extend(move_frames)
-
-        return np.array(generated_frames)
+        for i in range(max(1, total_frames // 10)):  # 每10帧一个动作单元
+            # 在重拍上做更大幅度的动作，弱拍上做过渡动作
+            accent = 'strong' if i % frames_per_beat == 0 else 'weak'
+            key = (random.choice(move_names), accent)
+
+            # 从动作库中找到与当前姿态最接近的入口帧
+            clip = matcher.clips[key]
+            duration = len(clip) // 2
+            entry, _ = matcher.query(key, prev_pose, prev_velocity)
+            move_frames = clip[entry:entry + duration].copy()
+            self._blend_transition(move_frames, prev_pose, prev_velocity)
+
+            generated_frames.append(move_frames)
+            frame_count += len(move_frames)
+
+            prev_pose = move_frames[-1]
+            prev_velocity = move_frames[-1] - move_frames[-2] if len(move_frames) > 1 \
+                else np.zeros_like(prev_pose)
+
+            # 后续帧会被截断，无需继续生成
+            if frame_count >= total_frames:
+                break
+
+        if not generated_frames:
+            return np.zeros((0, self.joint_count, 3), dtype=SEQUENCE_DTYPE)
+        return np.concatenate(generated_frames)
+
+    def _get_style_params(self, dance_style):
+        """根据舞蹈风格返回 (幅度, 速度)"""
+        if dance_style == "赛乃姆":
+            return 0.5, 0.8
+        elif dance_style == "萨玛舞":
+            return 0.3, 0.5
+        elif dance_style == "刀郎舞":
+            return 0.7, 1.2
+        return 0.5, 1.0
+
+    def _get_move_matcher(self, style_moves, frames_per_beat, dance_style):
+        """获取（必要时预计算）当前风格和节奏下的动作库匹配索引"""
+        cache_key = (dance_style, frames_per_beat)
+        if cache_key in self._matcher_cache:
+            return self._matcher_cache[cache_key]
+
+        amplitude, speed = self._get_style_params(dance_style)
+        variants = {
+            'strong': (frames_per_beat * 2, amplitude * 1.5, speed),
+            'weak': (frames_per_beat, amplitude * 0.7, speed * 0.8)
+        }
+
+        # 每个片段生成两倍时长，前半段的每一帧都可作为入口
+        clips = {}
+        entry_frames = {}
+        for name, move_func in style_moves.items():
+            for accent, (duration, move_amplitude, move_speed) in variants.items():
+                clips[(name, accent)] = np.array(move_func(
+                    duration=duration * 2,
+                    amplitude=move_amplitude,
+                    speed=move_speed
+                ))
+                entry_frames[(name, accent)] = duration
+
+        matcher = MotionMatcher()
+        matcher.build(clips, entry_frames)
+        self._matcher_cache[cache_key] = matcher
+        return matcher
+
+    def _blend_transition(self, move_frames, prev_pose, prev_velocity):
+        """把入口处的姿态偏差在若干帧内衰减到零，消除动作衔接处的跳变"""
+        n = min(self.transition_frames, len(move_frames))
+        if n == 0:
+            return move_frames
+
+        offset = (prev_pose + prev_velocity) - move_frames[0]
+        t = np.arange(n) / n
+        weights = 1 - t * t * (3 - 2 * t)  # smoothstep衰减
+        move_frames[:n] += weights[:, None, None] * offset
+        return move_frames
 
     def _create_neck_movement(self, duration=30, amplitude=1.0, speed=1.0):
         """创建颈部移动动作"""
@@ -419,21 +486,19 @@ class DanceGenerator:
         return frames
 
     def _smooth_sequence(self, sequence, window_size=5):
-        """平滑动作序列"""
+        """平滑动作序列：以每帧为中心的滑动平均，两端窗口截断
+
+        用前缀和一次计算全部帧、关节和坐标的窗口均值。
+        """
         if len(sequence) < window_size:
             return sequence
 
-        smoothed = np.zeros_like(sequence)
-
-        for i in range(len(sequence)):
-            start = max(0, i - window_size // 2)
-            end = min(len(sequence), i + window_size // 2 + 1)
-
-            # 对每个关节的每个坐标进行平均
-            for joint in range(sequence.shape[1]):
-                for coord in range(3):
-                    smoothed[i, joint, coord] = np.mean(
-                        sequence[start:end, joint, coord]
-                    )
+        total_frames = len(sequence)
+        prefix = np.zeros((total_frames + 1,) + sequence.shape[1:], dtype=np.float64)
+        np.cumsum(sequence, axis=0, out=prefix[1:])
 
-        return smoothed
\ No newline at end of file
+        frames = np.arange(total_frames)
+        start = np.maximum(0, frames - window_size // 2)
+        end = np.minimum(total_frames, frames + window_size // 2 + 1)
+        smoothed = (prefix[end] - prefix[start]) / (end - start)[:, None, None]
+        return smoothed.astype(sequence.dtype)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""群舞队形模块：由单人舞蹈序列一次性批量生成 (N, T, J, 3) 的多人序列"""
+
+import numpy as np
+
+from config import DANCE_CONFIG, FORMATION_CONFIG
+from models.skeleton import get_skeleton
+
+
+class FormationGenerator:
+    def __init__(self, skeleton=None, frame_rate=None):
+        self.skeleton = skeleton or get_skeleton()
+        self.frame_rate = frame_rate or DANCE_CONFIG['frame_rate']
+        self.spacing = FORMATION_CONFIG['spacing']
+        self.row_depth = FORMATION_CONFIG['row_depth']
+        self.canon_delay_beats = FORMATION_CONFIG['canon_delay_beats']
+
+        # 镜像时左右关节互换
+        self.mirror_permutation = self.skeleton.mirror_permutation()
+
+    def generate(self, dance_sequence, dancer_count, mode='unison', layout='line', tempo=100):
+        """生成群舞序列
+
+        所有舞者由同一个单人序列通过一次批量索引得到：
+        时间偏移（卡农）、左右镜像和场地位置都以数组形式同时作用于全部舞者。
+        返回 (formation_sequence, floor_positions)
+        """
+        if mode not in FORMATION_CONFIG['modes']:
+            raise Exception(f"不支持的队形模式: {mode}")
+        if not 1 <= dancer_count <= FORMATION_CONFIG['max_dancers']:
+            raise Exception(f"舞者人数需在1到{FORMATION_CONFIG['max_dancers']}之间")
+
+        dance_sequence = self.skeleton.conform(dance_sequence)
+        total_frames, joint_count = dance_sequence.shape[:2]
+
+        positions = self.floor_positions(dancer_count, layout)
+        delays = self.time_offsets(dancer_count, mode, tempo)
+        mirrored = self.mirror_mask(positions, mode)
+
+        # (N, T) 时间索引与 (N, J) 关节索引，一次 gather 得到 (N, T, J, 3)
+        time_index = np.clip(np.arange(total_frames)[None, :] - delays[:, None], 0, total_frames - 1)
+        joint_index = np.where(mirrored[:, None],
+                               self.mirror_permutation[None, :],
+                               np.arange(joint_count)[None, :])
+        formation = dance_sequence[time_index[:, :, None], joint_index[:, None, :]]
+
+        # 镜像舞者X轴取反，再平移到各自的场地位置
+        axis_sign = np.ones((dancer_count, 3), dtype=formation.dtype)
+        axis_sign[mirrored, 0] = -1
+        formation *= axis_sign[:, None, None, :]
+        formation += positions[:, None, None, :].astype(formation.dtype)
+
+        return formation, positions
+
+    def floor_positions(self, dancer_count, layout='line'):
+        """计算每位舞者在场地上的位置 (N, 3)，X为左右，Z为前后（正值为后排）"""
+        if layout not in FORMATION_CONFIG['layouts']:
+            raise Exception(f"不支持的队形: {layout}")
+
+        index = np.arange(dancer_count)
+        x = np.zeros(dancer_count)
+        z = np.zeros(dancer_count)
+
+        if layout == 'line':
+            x = (index - (dancer_count - 1) / 2) * self.spacing
+
+        elif layout == 'v':
+            # 领舞在前排中间，其余舞者向两侧后方展开
+            rank = (index + 1) // 2
+            side = np.where(index % 2 == 1, -1, 1)
+            x = side * rank * self.spacing
+            z = rank * self.row_depth
+
+        elif layout == 'circle':
+            radius = max(self.spacing, self.spacing * dancer_count / (2 * np.pi))
+            angle = 2 * np.pi * index / dancer_count
+            x = np.sin(angle) * radius
+            z = -np.cos(angle) * radius + radius if dancer_count > 1 else z
+
+        elif layout == 'grid':
+            # 前后两排以上时交错排列，避免遮挡
+            columns = int(np.ceil(np.sqrt(dancer_count * 2)))
+            row = index // columns
+            column = index % columns
+            row_size = np.minimum(columns, dancer_count - row * columns)
+            stagger = np.where(row % 2 == 1, 0.5, 0.0)
+            x = (column - (row_size - 1) / 2 + stagger) * self.spacing
+            z = row * self.row_depth
+
+        return np.stack([x, np.zeros(dancer_count), z], axis=1)
+
+    def time_offsets(self, dancer_count, mode='unison', tempo=100):
+        """计算每位舞者的时间延迟（帧）"""
+        if mode != 'canon':
+            return np.zeros(dancer_count, dtype=int)
+
+        frames_per_beat = max(1, int((60 / tempo) * self.frame_rate))
+        return np.arange(dancer_count) * frames_per_beat * self.canon_delay_beats
+
+    def mirror_mask(self, positions, mode='unison'):
+        """镜像模式下舞台左半边的舞者做镜像动作"""
+        if mode != 'mirror':
+            return np.zeros(len(positions), dtype=bool)
+        return positions[:, 0] < -1e-6
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""动作质量分析：对 (T, J, 3) 序列一次性向量化计算节拍对齐、关节运动学统计、滑步、穿地和骨骼长度
+
+结果写入生成报告，用于批量自动筛查生成结果。长度、高度和速度以静止姿态的身高为单位，
+不同体型的骨架可以使用同一组阈值。
+"""
+
+import numpy as np
+
+from config import MOTION_ANALYTICS_CONFIG
+
+
+class MotionAnalyzer:
+    def __init__(self, bones, rest_pose, frame_rate, joint_names, foot_joints=(13, 16), config=None):
+        """bones: (父关节, 子关节) 列表；rest_pose: 静止姿态 (J, 3)，Y轴向上，最低的关节在地面上"""
+        self.config = dict(MOTION_ANALYTICS_CONFIG, **(config or {}))
+        self.frame_rate = frame_rate
+        self.joint_names = list(joint_names)
+        self.joint_count = len(self.joint_names)
+        self.bones = np.asarray(bones, dtype=np.int64).reshape(-1, 2)
+        self.foot_joints = list(foot_joints)
+
+        rest_pose = np.asarray(rest_pose, dtype=np.float64)[:self.joint_count]
+        self.ground = float(rest_pose[:, 1].min())
+        self.height = float(rest_pose[:, 1].max() - self.ground) or 1.0
+        self.rest_lengths = np.linalg.norm(rest_pose[self.bones[:, 0]] - rest_pose[self.bones[:, 1]], axis=1)
+
+    def analyze(self, sequence, beats=None):
+        """分析序列（多余的关节忽略），beats 为音乐拍点时间（秒）"""
+        sequence = np.asarray(sequence, dtype=np.float64)[:, :self.joint_count]
+
+        # 逐阶差分得到速度、加速度和加加速度 (T-k, J, 3)
+        velocity = np.diff(sequence, axis=0) * self.frame_rate
+        acceleration = np.diff(velocity, axis=0) * self.frame_rate
+        jerk = np.diff(acceleration, axis=0) * self.frame_rate
+        speed = np.linalg.norm(velocity, axis=2) / self.height
+
+        return {
+            'frame_count': len(sequence),
+            'beat_alignment': self._beat_alignment(speed, beats),
+            'kinematics': self._kinematics(speed, acceleration, jerk),
+            'foot_skating': self._foot_skating(sequence, velocity),
+            'ground_penetration': self._ground_penetration(sequence),
+            'bone_length': self._bone_length(sequence)
+        }
+
+    def _beat_alignment(self, speed, beats):
+        """动作节拍（平均关节速度的局部极小值，即动作的停顿点）与音乐拍点的对齐得分
+
+        得分为每个音乐拍点到最近动作节拍的距离 d 的 exp(-d² / 2σ²) 的平均值，1 表示完全对齐。
+        """
+        duration = (len(speed) + 1) / self.frame_rate
+        beats = np.asarray(beats if beats is not None else [], dtype=np.float64)
+        beats = beats[(beats >= 0) & (beats <= duration)]
+
+        window = self.config['speed_smoothing']
+        mean_speed = speed.mean(axis=1)
+        if len(mean_speed) >= window:
+            mean_speed = np.convolve(mean_speed, np.ones(window) / window, mode='same')
+        middle = mean_speed[1:-1]
+        minima = np.flatnonzero((middle < mean_speed[:-2]) & (middle <= mean_speed[2:])) + 1
+        # 第 k 个速度值位于第 k 和 k+1 帧之间
+        motion_beats = (minima + 0.5) / self.frame_rate
+
+        result = {'music_beats': len(beats), 'motion_beats': len(motion_beats), 'score': None,
+                  'mean_offset': None}
+        if not len(beats) or not len(motion_beats):
+            return result
+
+        right = np.clip(np.searchsorted(motion_beats, beats), 0, len(motion_beats) - 1)
+        left = np.clip(right - 1, 0, len(motion_beats) - 1)
+        offsets = np.where(np.abs(motion_beats[left] - beats) < np.abs(motion_beats[right] - beats),
+                           motion_beats[left] - beats, motion_beats[right] - beats)
+
+        sigma = self.config['beat_sigma']
+        result['score'] = round(float(np.mean(np.exp(-offsets ** 2 / (2 * sigma ** 2)))), 4)
+        result['mean_offset'] = round(float(np.mean(np.abs(offsets))), 4)
+        return result
+
+    def _kinematics(self, speed, acceleration, jerk):
+        """各关节速度、加速度、加加速度的平均值、95分位数和最大值（身高/秒ᵏ）"""
+        magnitudes = {
+            'velocity': speed,
+            'acceleration': np.linalg.norm(acceleration, axis=2) / self.height,
+            'jerk': np.linalg.norm(jerk, axis=2) / self.height
+        }
+
+        stats = {}
+        for name, values in magnitudes.items():
+            if not len(values):
+                stats[name] = None
+                continue
+            mean = values.mean(axis=0)
+            p95, peak = np.percentile(values, [95, 100], axis=0)
+            stats[name] = {
+                'mean': round(float(mean.mean()), 4),
+                'max': round(float(peak.max()), 4),
+                'joints': {
+                    joint: {'mean': round(float(m), 4), 'p95': round(float(p), 4), 'max': round(float(x), 4)}
+                    for joint, m, p, x in zip(self.joint_names, mean, p95, peak)
+                }
+            }
+        return stats
+
+    def _foot_skating(self, sequence, velocity):
+        """着地的脚在水平方向滑动的帧"""
+        feet = self.foot_joints
+        contact = (sequence[:, feet, 1] - self.ground) < self.config['contact_height'] * self.height
+        # 前后两帧都着地才计入
+        planted = contact[:-1] & contact[1:]
+        horizontal = np.linalg.norm(velocity[:, feet][:, :, [0, 2]], axis=2) / self.height
+        skating = planted & (horizontal > self.config['skate_speed'])
+
+        return {
+            'contact_frames': int(contact.any(axis=1).sum()),
+            'skating_frames': int(skating.any(axis=1).sum()),
+            'skating_ratio': round(float(skating.any(axis=1).sum() / max(1, planted.any(axis=1).sum())), 4),
+            'max_speed': round(float(np.max(horizontal, initial=0.0, where=planted)), 4),
+            'distance': round(float(horizontal[skating].sum() / self.frame_rate), 4),
+            'feet': {self.joint_names[joint]: int(skating[:, i].sum()) for i, joint in enumerate(feet)}
+        }
+
+    def _ground_penetration(self, sequence):
+        """任一关节低于地面的帧"""
+        depth = (self.ground - sequence[:, :, 1]) / self.height
+        penetrating = depth > self.config['penetration_tolerance']
+        frames = penetrating.any(axis=1)
+        return {
+            'frames': int(frames.sum()),
+            'ratio': round(float(frames.mean()), 4) if len(frames) else 0.0,
+            'max_depth': round(float(max(depth.max(initial=0.0), 0.0)), 4),
+            'joints': {self.joint_names[j]: int(n) for j, n in enumerate(penetrating.sum(axis=0)) if n}
+        }
+
+    def _bone_length(self, sequence):
+        """骨骼长度相对静止姿态的偏差超过容差的次数"""
+        lengths = np.linalg.norm(sequence[:, self.bones[:, 0]] - sequence[:, self.bones[:, 1]], axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            errors = np.where(self.rest_lengths > 0, lengths / self.rest_lengths - 1, 0.0)
+        errors = np.abs(errors)
+        violations = errors > self.config['bone_tolerance']
+
+        bones = {}
+        for (parent, child), n, worst in zip(self.bones, violations.sum(axis=0), errors.max(axis=0, initial=0.0)):
+            bones[f"{self.joint_names[parent]}-{self.joint_names[child]}"] = {
+                'violations': int(n), 'max_error': round(float(worst), 4)
+            }
+        return {
+            'violations': int(violations.sum()),
+            'violation_frames': int(violations.any(axis=1).sum()),
+            'max_error': round(float(errors.max(initial=0.0)), 4),
+            'bones': bones
+        }
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""动作匹配模块：用KD树为动作库的每一帧建立姿态+速度索引，用于动作衔接"""
+
+import numpy as np
+
+from config import MOTION_MATCHING_CONFIG
+
+
+class MotionMatcher:
+    def __init__(self, joint_indices=None, velocity_weight=None, leaf_size=None):
+        self.joint_indices = joint_indices
+        self.velocity_weight = velocity_weight if velocity_weight is not None \
+            else MOTION_MATCHING_CONFIG['velocity_weight']
+        self.leaf_size = leaf_size if leaf_size is not None \
+            else MOTION_MATCHING_CONFIG['leaf_size']
+
+        # 每个动作片段一棵KD树
+        self.clips = {}
+        self.trees = {}
+
+    def build(self, clips, entry_frames=None):
+        """为动作库建立索引
+
+        clips: {动作键: (F, J, 3) 数组}
+        entry_frames: {动作键: 可作为入口的帧数}，默认整个片段都可作为入口
+        """
+        from sklearn.neighbors import KDTree
+
+        self.clips = {}
+        self.trees = {}
+        for key, clip in clips.items():
+            # 片段保持原数据类型（生成的帧直接取自片段），特征按 float64 计算
+            clip = np.asarray(clip)
+            n_entries = len(clip)
+            if entry_frames and key in entry_frames:
+                n_entries = max(1, min(entry_frames[key], len(clip)))
+
+            features = self._clip_features(clip.astype(np.float64, copy=False))[:n_entries]
+            self.clips[key] = clip
+            self.trees[key] = KDTree(features, leaf_size=self.leaf_size)
+        return self
+
+    def query(self, key, pose, velocity):
+        """查询动作 key 中与当前姿态和速度最接近的入口帧
+
+        返回 (入口帧索引, 特征距离)
+        """
+        feature = self._feature(pose, velocity)
+        dist, idx = self.trees[key].query(feature[None, :], k=1)
+        return int(idx[0, 0]), float(dist[0, 0])
+
+    def _select_joints(self, poses):
+        """只保留参与匹配的关节"""
+        if self.joint_indices is None:
+            return poses
+        return poses[..., self.joint_indices, :]
+
+    def _clip_features(self, clip):
+        """计算片段每一帧的特征向量（姿态 + 加权速度）"""
+        poses = self._select_joints(clip)
+        velocity = np.empty_like(poses)
+        velocity[1:] = poses[1:] - poses[:-1]
+        velocity[0] = velocity[1] if len(poses) > 1 else 0
+
+        n_frames = len(poses)
+        return np.hstack([
+            poses.reshape(n_frames, -1),
+            velocity.reshape(n_frames, -1) * self.velocity_weight
+        ])
+
+    def _feature(self, pose, velocity):
+        """计算单帧查询特征"""
+        pose = self._select_joints(np.asarray(pose, dtype=np.float64))
+        velocity = self._select_joints(np.asarray(velocity, dtype=np.float64))
+        return np.concatenate([pose.ravel(), velocity.ravel() * self.velocity_weight])
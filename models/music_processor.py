@@ -1,137 +1,401 @@
-import librosa
-import librosa.display
+import io
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import signal
-import soundfile as sf
-import json
 from pathlib import Path
-import tempfile
+
+from config import WARMUP_CONFIG, VISUALIZATION_CONFIG, PEAKS_CONFIG, ANALYSIS_PROFILES, ANALYSIS_FEATURES
+from utils.profiling import timed, count
+from utils.cache import file_content_hash, atomic_write_bytes
+from utils.peaks import build_pyramid, write_peaks, read_peaks
+
+# librosa、matplotlib 等重型依赖在首次使用时才导入，避免拖慢应用启动
+
+
+def waveform_envelope(y, columns):
+    """把信号按列降采样为 (最小值, 最大值) 包络，绘制波形时每个像素列只需两个点"""
+    columns = max(1, min(int(columns), len(y)))
+    starts = np.linspace(0, len(y), columns + 1).astype(np.int64)[:-1]
+    return np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+def _reduce_columns(values, columns):
+    """按时间（列）分组取平均，把 (行, 帧) 的特征图降到最多 columns 列"""
+    columns = max(1, min(int(columns), values.shape[1]))
+    starts = np.linspace(0, values.shape[1], columns + 1).astype(np.int64)
+    return np.add.reduceat(values, starts[:-1], axis=1) / np.diff(starts)
 
 
 class MusicProcessor:
-    def __init__(self, sample_rate=22050, n_fft=2048, hop_length=512, n_mels=128):
+    def __init__(self, sample_rate=22050, n_fft=2048, hop_length=512, n_mels=128, feature_cache=None,
+                 peaks_dir=None, pcm_cache=None, features=None, profile='custom'):
         self.sample_rate = sample_rate
         self.n_fft = n_fft
         self.hop_length = hop_length
         self.n_mels = n_mels
 
+        # 要计算的可选特征（见 config.ANALYSIS_FEATURES），None 表示全部；档位名称区分缓存
+        self.features = set(ANALYSIS_FEATURES if features is None else features)
+        self.profile = profile
+
+        # 可选的特征缓存（utils.cache.FeatureCache），按文件内容哈希命中
+        self.feature_cache = feature_cache
+
+        # 可选的波形峰值目录，设置后首次解码音乐时生成峰值金字塔文件
+        self.peaks_dir = Path(peaks_dir) if peaks_dir else None
+
+        # 可选的解码音频缓存（utils.pcm_cache.PcmCache），命中时跳过解码和重采样
+        self.pcm_cache = pcm_cache
+
+    @classmethod
+    def from_profile(cls, profile, **kwargs):
+        """按 config.ANALYSIS_PROFILES 中的档位创建处理器"""
+        if profile not in ANALYSIS_PROFILES:
+            raise Exception(f"未知的分析档位: {profile}")
+        return cls(profile=profile, **ANALYSIS_PROFILES[profile], **kwargs)
+
+    def warm_up(self, duration=None):
+        """预热：导入 librosa 并在一小段合成信号上运行各特征，触发 numba 编译"""
+        import librosa
+
+        duration = duration or WARMUP_CONFIG['signal_duration']
+        with timed('warm_up.music'):
+            t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+            y = (0.3 * np.sin(2 * np.pi * 440 * t) * (np.mod(t, 0.5) < 0.05)).astype(np.float32)
+            sr = self.sample_rate
+            stft = self._stft_params()
+
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr, **stft)
+            librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+            librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+            librosa.beat.plp(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length,
+                             win_length=min(384, len(onset_env)))
+            librosa.feature.melspectrogram(y=y, sr=sr, n_mels=self.n_mels, **stft)
+            librosa.feature.chroma_stft(y=y, sr=sr, **stft)
+            librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, n_mels=self.n_mels, **stft)
+            librosa.feature.rms(y=y, frame_length=self.n_fft, hop_length=self.hop_length)
+            librosa.feature.spectral_centroid(y=y, sr=sr, **stft)
+            librosa.feature.spectral_bandwidth(y=y, sr=sr, **stft)
+            librosa.feature.zero_crossing_rate(y, frame_length=self.n_fft, hop_length=self.hop_length)
+            librosa.resample(y[:sr // 4], orig_sr=sr, target_sr=sr // 2)
+
+    def _stft_params(self):
+        return {'n_fft': self.n_fft, 'hop_length': self.hop_length}
+
+    def _frames_to_time(self, frames, sr):
+        import librosa
+
+        return librosa.frames_to_time(frames, sr=sr, hop_length=self.hop_length)
+
+    def _cache_key(self, filepath, kind):
+        """缓存键：结果类型 + 文件内容哈希 + 档位 + 分析参数"""
+        return (f"{kind}_{file_content_hash(filepath)}_{self.profile}_"
+                f"{self.sample_rate}_{self.n_fft}_{self.hop_length}_{self.n_mels}")
+
+    def _cache_get(self, filepath, kind):
+        """读取缓存，返回 (缓存键, 缓存值)"""
+        if self.feature_cache is None or not Path(filepath).is_file():
+            return None, None
+        cache_key = self._cache_key(filepath, kind)
+        cached = self.feature_cache.get(cache_key)
+        count('feature_cache_hits' if cached is not None else 'feature_cache_misses')
+        return cache_key, cached
+
     def load_music(self, filepath):
-        """加载音乐文件"""
+        """加载音乐文件（单声道 float32，按 self.sample_rate 重采样）
+
+        配置了解码音频缓存时，同一首歌只解码一次，之后返回只读的内存映射。
+        """
+        import librosa
+
+        pcm_key = None
+        if self.pcm_cache is not None and Path(filepath).is_file():
+            pcm_key = f"{file_content_hash(filepath)}_{self.sample_rate}"
+            y = self.pcm_cache.get(pcm_key)
+            if y is not None:
+                # 峰值文件可能被单独清理，从缓存的信号补建
+                self._ensure_peaks(filepath, y, self.sample_rate)
+                return y, self.sample_rate
+
         try:
-            y, sr = librosa.load(filepath, sr=self.sample_rate)
-            return y, sr
+            with timed('load_music'):
+                y, sr = librosa.load(filepath, sr=self.sample_rate)
+            count('audio_seconds_decoded', len(y) / sr)
         except Exception as e:
             raise Exception(f"无法加载音乐文件: {str(e)}")
 
+        # 借解码好的信号顺便生成波形峰值，之后前端绘制波形不需要再解码
+        self._ensure_peaks(filepath, y, sr)
+
+        if pcm_key:
+            try:
+                self.pcm_cache.put(pcm_key, y)
+            except OSError as e:
+                print(f"解码音频缓存写入失败: {str(e)}")
+        return y, sr
+
+    def _ensure_peaks(self, filepath, y, sr):
+        """峰值文件不存在时由已解码的信号生成"""
+        if self.peaks_dir is None or not Path(filepath).is_file():
+            return
+        peaks_path = self.peaks_path(filepath)
+        if not peaks_path.exists():
+            with timed('build_peaks'):
+                pyramid = build_pyramid(y, PEAKS_CONFIG['samples_per_peak'], PEAKS_CONFIG['levels'])
+                write_peaks(peaks_path, pyramid, sr, PEAKS_CONFIG['samples_per_peak'], len(y))
+
+    def peaks_path(self, filepath):
+        """波形峰值文件路径：按音频内容哈希和采样率命名"""
+        return self.peaks_dir / f"{file_content_hash(filepath)}_{self.sample_rate}.peaks"
+
+    def peaks(self, filepath):
+        """读取波形峰值金字塔，尚未生成时解码一次音乐生成"""
+        if self.peaks_dir is None:
+            raise Exception("未配置波形峰值目录")
+        peaks_path = self.peaks_path(filepath)
+        if not peaks_path.exists():
+            self.load_music(filepath)
+        return read_peaks(peaks_path)
+
+    def markers(self, filepath):
+        """完整的拍点和起音时间（秒），优先读取特征缓存（上传分析时已写入）"""
+        import librosa
+
+        cache_key, cached = self._cache_get(filepath, 'markers')
+        if cached is not None:
+            return cached
+
+        y, sr = self.load_music(filepath)
+        with timed('feature.onset_strength'):
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr, **self._stft_params())
+        with timed('feature.beat_track'):
+            _, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+        with timed('feature.onset_detect'):
+            onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+
+        markers = self._markers(beat_frames, onset_frames, sr)
+        if cache_key:
+            self.feature_cache.put(cache_key, markers)
+        return markers
+
+    def _markers(self, beat_frames, onset_frames, sr):
+        return {
+            'beats': np.round(self._frames_to_time(beat_frames, sr), 3).tolist(),
+            'onsets': np.round(self._frames_to_time(onset_frames, sr), 3).tolist()
+        }
+
     def analyze_music(self, filepath):
-        """分析音乐文件"""
+        """分析音乐文件，计算哪些特征由档位决定"""
+        import librosa
+
+        cache_key, cached = self._cache_get(filepath, 'analysis')
+        if cached is not None:
+            return cached
+
         try:
             y, sr = self.load_music(filepath)
             duration = librosa.get_duration(y=y, sr=sr)
+            stft = self._stft_params()
 
-            # 提取节奏特征
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-            beats = librosa.frames_to_time(beat_frames, sr=sr)
+            # 提取节奏特征（起音强度供拍点、节拍脉冲和起音检测共用）
+            with timed('feature.onset_strength'):
+                onset_env = librosa.onset.onset_strength(y=y, sr=sr, **stft)
+            with timed('feature.beat_track'):
+                tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr,
+                                                             hop_length=self.hop_length)
+            beats = self._frames_to_time(beat_frames, sr)
 
-            # 提取频谱特征
-            mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=self.n_mels)
-            mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+            shape = {}
+            if 'spectrogram' in self.features:
+                # 提取频谱特征
+                with timed('feature.melspectrogram'):
+                    mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=self.n_mels, **stft)
+                    mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
 
-            # 提取色度特征
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+                # 提取色度特征
+                with timed('feature.chroma_stft'):
+                    chroma = librosa.feature.chroma_stft(y=y, sr=sr, **stft)
+                shape['mel_spec'] = mel_spec.shape
+                shape['chroma'] = chroma.shape
+
+                # 降采样后的频谱图和色度图放入特征缓存，生成可视化图片时不再重新计算
+                if cache_key:
+                    self.feature_cache.put(self._cache_key(filepath, 'spectrogram'),
+                                           self._spectrogram_summary(mel_spec_db, chroma, duration))
 
             # 提取MFCC特征
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+            if 'mfcc' in self.features:
+                with timed('feature.mfcc'):
+                    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, n_mels=self.n_mels, **stft)
+                shape['mfcc'] = mfcc.shape
 
             # 估计拍号
-            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-            pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr)
+            if 'pulse' in self.features:
+                with timed('feature.plp'):
+                    librosa.beat.plp(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+
+            # 完整的拍点和起音时间放入特征缓存，供前端时间轴使用
+            if cache_key and 'onsets' in self.features:
+                with timed('feature.onset_detect'):
+                    onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr,
+                                                              hop_length=self.hop_length)
+                self.feature_cache.put(self._cache_key(filepath, 'markers'),
+                                       self._markers(beat_frames, onset_frames, sr))
 
-            return {
+            music_info = {
                 'duration': duration,
                 'tempo': float(tempo),
                 'beat_count': len(beats),
                 'beats': beats.tolist()[:20],  # 只返回前20个拍子
                 'sample_rate': sr,
-                'shape': {
-                    'mel_spec': mel_spec.shape,
-                    'chroma': chroma.shape,
-                    'mfcc': mfcc.shape
-                }
+                'profile': self.profile,
+                'shape': shape
             }
+            if cache_key:
+                self.feature_cache.put(cache_key, music_info)
+            return music_info
         except Exception as e:
             raise Exception(f"音乐分析失败: {str(e)}")
 
     def extract_features(self, filepath):
-        """提取音乐特征用于舞蹈生成"""
+        """提取音乐特征用于舞蹈生成，档位未包含的特征不出现在结果中"""
+        import librosa
+
+        cache_key, cached = self._cache_get(filepath, 'features')
+        if cached is not None:
+            return cached
+
         y, sr = self.load_music(filepath)
+        stft = self._stft_params()
 
         # 基本特征
         duration = librosa.get_duration(y=y, sr=sr)
-        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
+        with timed('feature.onset_strength'):
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr, **stft)
+        with timed('feature.beat_track'):
+            tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr,
+                                                         hop_length=self.hop_length)
+
+        features = {
+            'tempo': float(tempo),
+            'duration': float(duration),
+            'beats': self._frames_to_time(beat_frames, sr).tolist()
+        }
 
         # 能量特征
-        rms = librosa.feature.rms(y=y)[0]
-        energy_mean = np.mean(rms)
-        energy_std = np.std(rms)
+        if 'energy' in self.features:
+            with timed('feature.rms'):
+                rms = librosa.feature.rms(y=y, frame_length=self.n_fft, hop_length=self.hop_length)[0]
+            features['energy_mean'] = float(np.mean(rms))
+            features['energy_std'] = float(np.std(rms))
 
         # 频谱特征
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
+        if 'spectral' in self.features:
+            with timed('feature.spectral_centroid'):
+                spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, **stft)[0]
+            with timed('feature.spectral_bandwidth'):
+                spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr, **stft)[0]
+            features['spectral_centroid_mean'] = float(np.mean(spectral_centroid))
+            features['spectral_bandwidth_mean'] = float(np.mean(spectral_bandwidth))
 
         # 零交叉率
-        zcr = librosa.feature.zero_crossing_rate(y)[0]
+        if 'zcr' in self.features:
+            with timed('feature.zero_crossing_rate'):
+                zcr = librosa.feature.zero_crossing_rate(y, frame_length=self.n_fft, hop_length=self.hop_length)[0]
+            features['zcr_mean'] = float(np.mean(zcr))
 
         # 节奏密度
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
-        rhythm_density = len(onset_frames) / duration
+        if 'onsets' in self.features:
+            with timed('feature.onset_detect'):
+                onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=self.hop_length)
+            features['rhythm_density'] = float(len(onset_frames) / duration)
+
+        if cache_key:
+            self.feature_cache.put(cache_key, features)
+        return features
+
+    def spectrogram(self, filepath):
+        """降采样的梅尔频谱图(dB)和色度图，优先读取特征缓存（上传分析时已写入）"""
+        import librosa
+
+        cache_key, cached = self._cache_get(filepath, 'spectrogram')
+        if cached is not None:
+            return cached
+
+        y, sr = self.load_music(filepath)
+        stft = self._stft_params()
+        with timed('feature.melspectrogram'):
+            mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=self.n_mels, **stft)
+            mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+        with timed('feature.chroma_stft'):
+            chroma = librosa.feature.chroma_stft(y=y, sr=sr, **stft)
 
+        summary = self._spectrogram_summary(mel_spec_db, chroma, len(y) / sr)
+        if cache_key:
+            self.feature_cache.put(cache_key, summary)
+        return summary
+
+    @staticmethod
+    def _spectrogram_summary(mel_spec_db, chroma, duration):
+        columns = VISUALIZATION_CONFIG['spectrogram_columns']
         return {
-            'tempo': float(tempo),
             'duration': float(duration),
-            'energy_mean': float(energy_mean),
-            'energy_std': float(energy_std),
-            'spectral_centroid_mean': float(np.mean(spectral_centroid)),
-            'spectral_bandwidth_mean': float(np.mean(spectral_bandwidth)),
-            'zcr_mean': float(np.mean(zcr)),
-            'rhythm_density': float(rhythm_density),
-            'beats': librosa.frames_to_time(beat_frames, sr=sr).tolist()
+            'mel_spec_db': np.round(_reduce_columns(mel_spec_db, columns)).astype(int).tolist(),
+            'chroma': np.round(_reduce_columns(chroma, columns), 3).tolist()
         }
 
+    def visualization_path(self, filepath, output_dir):
+        """音乐可视化图片路径：按音频内容哈希和分析参数命名，同一首歌只生成一次"""
+        return Path(output_dir) / f"music_analysis_{file_content_hash(filepath)}_{self.profile}_{self.n_mels}.png"
+
     def visualize_music(self, filepath, output_dir):
-        """生成音乐可视化图表"""
-        y, sr = self.load_music(filepath)
+        """生成音乐可视化图表，已存在时直接返回"""
+        from matplotlib.figure import Figure
 
-        fig, axes = plt.subplots(3, 1, figsize=(12, 10))
+        output_path = self.visualization_path(filepath, output_dir)
+        if output_path.exists():
+            return str(output_path)
 
-        # 波形图
-        time = np.linspace(0, len(y) / sr, len(y))
-        axes[0].plot(time, y)
+        width = VISUALIZATION_CONFIG['figure_width']
+        dpi = VISUALIZATION_CONFIG['dpi']
+        spectrogram = self.spectrogram(filepath)
+        duration = spectrogram['duration']
+
+        # 使用 Figure 而不是 pyplot，可以在后台线程中安全绘制
+        fig = Figure(figsize=(width, 10))
+        axes = fig.subplots(3, 1)
+
+        # 波形图：按像素列降采样为最小/最大值包络，点数与图片宽度成正比而不是与采样数成正比
+        y, sr = self.load_music(filepath)
+        with timed('visualize.waveform'):
+            low, high = waveform_envelope(y, width * dpi)
+            time = np.linspace(0, len(y) / sr, len(low))
+            axes[0].fill_between(time, low, high, linewidth=0.5)
+        axes[0].set_xlim(0, duration)
         axes[0].set_title('Waveform')
         axes[0].set_xlabel('Time (s)')
         axes[0].set_ylabel('Amplitude')
 
         # 频谱图
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=self.n_mels)
-        mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
-        img = librosa.display.specshow(mel_spec_db, sr=sr, hop_length=self.hop_length,
-                                       x_axis='time', y_axis='mel', ax=axes[1])
+        img = axes[1].imshow(np.asarray(spectrogram['mel_spec_db']), aspect='auto', origin='lower',
+                             extent=[0, duration, 0, self.n_mels], cmap='magma')
         axes[1].set_title('Mel Spectrogram')
+        axes[1].set_xlabel('Time (s)')
+        axes[1].set_ylabel('Mel')
         fig.colorbar(img, ax=axes[1], format='%+2.0f dB')
 
         # 色度图
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        librosa.display.specshow(chroma, sr=sr, hop_length=self.hop_length,
-                                 x_axis='time', y_axis='chroma', ax=axes[2])
+        axes[2].imshow(np.asarray(spectrogram['chroma']), aspect='auto', origin='lower',
+                       extent=[0, duration, -0.5, 11.5], cmap='magma')
+        axes[2].set_yticks(range(12))
+        axes[2].set_yticklabels(['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'])
         axes[2].set_title('Chroma Features')
+        axes[2].set_xlabel('Time (s)')
 
-        plt.tight_layout()
+        fig.tight_layout()
 
-        # 保存图像
-        output_path = Path(output_dir) / f"music_analysis_{Path(filepath).stem}.png"
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        # 先写临时文件再重命名，避免并发请求读到写了一半的图片
+        with timed('visualize.save'):
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+            atomic_write_bytes(output_path, buffer.getvalue())
 
-        return str(output_path)
\ No newline at end of file
+        return str(output_path)
@@ -0,0 +1,735 @@
+# -*- coding: utf-8 -*-
+"""处理流水线：进程级处理器单例、可在后台进程中运行的分析/生成任务"""
+
+import json
+import multiprocessing
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from config import MUSIC_DIR, OUTPUT_DIR, STREAM_DIR, SEGMENT_DIR, IMAGE_DIR, PEAKS_DIR, ALLOWED_EXTENSIONS, \
+    SERVER_CONFIG, WARMUP_CONFIG, DANCE_CONFIG, FEATURE_CACHE_CONFIG, SEGMENT_CONFIG, ANALYSIS_PROFILES, ANALYSIS_ENDPOINT_PROFILES, \
+    VISUALIZATION_CONFIG, FARM_CONFIG, CACHE_DIR
+from models.music_processor import MusicProcessor
+from models.animation_export import AnimationExporter
+from models.dance_generator import DanceGenerator
+from models.formation import FormationGenerator
+from models.motion_analytics import MotionAnalyzer
+from models.practice import practice_audio, retime_sequence
+from models.rehearsal import RehearsalScorer
+from models.skeleton import get_skeleton
+from models.visualization import DanceVisualizer
+from utils.cache import FeatureCache, atomic_write_bytes, file_content_hash, evict_lru, touch
+from utils.hls import HlsPlaylist
+from utils.pcm_cache import PcmCache
+from utils.sequence_store import save_sequence, load_sequence, sequence_data_path
+from utils.profiling import trace_request, merge_trace, timed, count, profile_request
+from utils.work_queue import WorkQueue
+
+_lock = threading.Lock()
+_instances = {}
+_executor = None
+_prewarm_lock_file = None
+
+# 后台生成中的图片：路径 -> 错误信息（None 表示正在生成）
+_image_lock = threading.Lock()
+_image_jobs = {}
+
+_JOB_ID = re.compile(r'^[0-9a-f]{12}$')
+_SEGMENT_NAME = re.compile(r'^seg_[0-9a-f]{40}_[0-9a-z]+\.ts$')
+
+
+def _get_instance(name, factory):
+    """按名称获取（必要时创建）进程内唯一的实例"""
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def get_music_processor(profile='balanced'):
+    """指定分析档位的音乐处理器，各档位共用同一个特征缓存和解码音频缓存"""
+    feature_cache = _get_instance('feature_cache', FeatureCache)
+    pcm_cache = _get_instance('pcm_cache', PcmCache)
+    return _get_instance(f'music_processor.{profile}',
+                         lambda: MusicProcessor.from_profile(profile, feature_cache=feature_cache,
+                                                             peaks_dir=PEAKS_DIR, pcm_cache=pcm_cache))
+
+
+def get_dance_generator():
+    return _get_instance('dance_generator', DanceGenerator)
+
+
+def get_formation_generator():
+    return _get_instance('formation_generator', FormationGenerator)
+
+
+def get_dance_visualizer():
+    return _get_instance('dance_visualizer', DanceVisualizer)
+
+
+def get_motion_analyzer():
+    skeleton = get_skeleton()
+    return _get_instance('motion_analyzer',
+                         lambda: MotionAnalyzer(skeleton.bones, skeleton.rest_pose, DANCE_CONFIG['frame_rate'],
+                                                skeleton.joint_names,
+                                                foot_joints=(skeleton.index('left_ankle'),
+                                                             skeleton.index('right_ankle'))))
+
+
+def load_dance_sequence(sequence_id):
+    """读取已保存的序列和元数据，序列转换为骨架的关节数和数据类型；不存在时抛出 KeyError"""
+    dance_sequence, meta = load_sequence(sequence_id)
+    return get_skeleton(meta.get('skeleton')).conform(dance_sequence), meta
+
+
+def warm_up():
+    """预热：导入重型依赖，并在合成信号上触发 librosa 的 numba 编译"""
+    try:
+        get_music_processor(ANALYSIS_ENDPOINT_PROFILES['generation']).warm_up()
+        get_dance_generator().warm_up()
+        get_dance_visualizer().warm_up()
+        print("✓ 预热完成")
+    except Exception as e:
+        print(f"预热失败: {str(e)}")
+
+
+def prewarm_feature_cache(limit=None):
+    """把最近使用的歌曲的特征载入缓存（磁盘已有则直接读取，否则计算一次）"""
+    limit = FEATURE_CACHE_CONFIG['prewarm_songs'] if limit is None else limit
+    music_files = [f for f in MUSIC_DIR.iterdir()
+                   if f.is_file() and f.suffix.lower()[1:] in ALLOWED_EXTENSIONS]
+    music_files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
+
+    processor = get_music_processor(ANALYSIS_ENDPOINT_PROFILES['generation'])
+    for music_file in music_files[:limit]:
+        try:
+            processor.extract_features(str(music_file))
+        except Exception as e:
+            print(f"预加载特征失败 {music_file.name}: {str(e)}")
+
+
+def _claim_prewarm():
+    """同一台主机上只让一个服务进程预加载特征缓存（磁盘缓存由各进程共享）
+
+    持有 CACHE_DIR/prewarm.lock 的文件锁直到进程退出，其他工作进程拿不到锁时跳过。
+    """
+    global _prewarm_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        # Windows 下使用 waitress，只有一个服务进程
+        return True
+
+    lock_file = open(CACHE_DIR / 'prewarm.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _prewarm_lock_file = lock_file
+    return True
+
+
+def _warm_up_worker(local):
+    if local:
+        warm_up()
+    if _claim_prewarm():
+        try:
+            # 有后台进程池时交给进程池计算，不占用服务进程
+            execute(prewarm_feature_cache)
+        except Exception as e:
+            print(f"预加载特征缓存失败: {str(e)}")
+
+
+def start_warm_up(local=True):
+    """在后台线程中预热并预加载特征缓存，不阻塞服务启动
+
+    local 为 False 时本进程不预热（任务在后台进程池中执行，池中的进程启动时各自预热）。
+    """
+    if not WARMUP_CONFIG['enabled']:
+        return None
+    thread = threading.Thread(target=_warm_up_worker, args=(local,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_worker(job_workers=None):
+    """WSGI工作进程启动时调用：创建本进程的处理器单例，并准备后台任务进程池
+
+    预热在后台任务进程池的各进程中进行；特征缓存每台主机只预加载一次。
+    """
+    global _executor
+
+    for profile in ANALYSIS_PROFILES:
+        get_music_processor(profile)
+    get_dance_generator()
+    get_formation_generator()
+    get_dance_visualizer()
+
+    job_workers = SERVER_CONFIG['job_workers'] if job_workers is None else job_workers
+    if job_workers > 0 and _executor is None:
+        # spawn 方式启动，避免在多线程进程中 fork
+        _executor = ProcessPoolExecutor(
+            max_workers=job_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_up
+        )
+
+    start_warm_up(local=_executor is None)
+
+
+def _run_traced(func, args):
+    """在后台进程中执行任务，并带回阶段耗时"""
+    with trace_request() as trace:
+        result = func(*args)
+    return result, trace.to_dict()
+
+
+def execute(func, *args):
+    """执行CPU密集任务：配置了后台进程池时交给进程池，否则在当前线程执行"""
+    if _executor is None:
+        return func(*args)
+
+    result, trace = _executor.submit(_run_traced, func, args).result()
+    merge_trace(trace)
+    return result
+
+
+def analyze_music(music_path, profile=None):
+    """分析音乐（上传时的预览信息），默认使用上传接口的档位
+
+    同时确保时间轴接口的波形峰值和拍点/起音标记已生成（档位相同时只是读取缓存），
+    之后 /api/peaks 不再解码音乐。
+    """
+    with timed('request.upload_music'):
+        music_info = get_music_processor(profile or ANALYSIS_ENDPOINT_PROFILES['upload']).analyze_music(music_path)
+        music_timeline(music_path)
+        return music_info
+
+
+def music_timeline(music_path):
+    """波形峰值金字塔和拍点/起音标记（上传分析时已生成，通常只需读取文件）
+
+    返回 (峰值文件路径, 峰值, 标记)
+    """
+    processor = get_music_processor(ANALYSIS_ENDPOINT_PROFILES['timeline'])
+    peaks = processor.peaks(music_path)
+    return processor.peaks_path(music_path), peaks, processor.markers(music_path)
+
+
+def export_animation(sequence_id, fmt):
+    """把已保存的序列导出为 BVH 或 GLB，返回 (总字节数，未知时为 None, 内容迭代器)
+
+    序列不存在时抛出 KeyError。BVH 边求解边输出；GLB 的总长度需要先确定，旋转在返回前求解。
+    """
+    dance_sequence, meta = load_dance_sequence(sequence_id)
+    exporter = AnimationExporter(get_skeleton(meta.get('skeleton')), DANCE_CONFIG['frame_rate'])
+    if fmt == 'glb':
+        with timed('export.glb'):
+            return exporter.glb(dance_sequence)
+    return None, exporter.bvh(dance_sequence)
+
+
+def render_music_visualization(music_path):
+    """生成音乐分析图（波形、梅尔频谱图、色度图）"""
+    return get_music_processor(ANALYSIS_ENDPOINT_PROFILES['visualization']).visualize_music(music_path, IMAGE_DIR)
+
+
+def render_dance_analysis(sequence_id, output_path):
+    """生成舞蹈分析图（关节轨迹、速度、动作幅度）"""
+    dance_sequence, _ = load_dance_sequence(sequence_id)
+    return get_dance_visualizer().create_dance_analysis_image(dance_sequence, output_path)
+
+
+def music_visualization(music_path):
+    """音乐分析图，返回 (路径, 状态, 错误信息)；图片不存在时在后台生成"""
+    processor = get_music_processor(ANALYSIS_ENDPOINT_PROFILES['visualization'])
+    output_path = processor.visualization_path(music_path, IMAGE_DIR)
+    state, error = _image_in_background(output_path, render_music_visualization, music_path)
+    return output_path, state, error
+
+
+def dance_analysis_image(sequence_id):
+    """舞蹈分析图，返回 (路径, 状态, 错误信息)；序列不存在时抛出 KeyError"""
+    output_path = IMAGE_DIR / f"dance_analysis_{file_content_hash(sequence_data_path(sequence_id))}.png"
+    state, error = _image_in_background(output_path, render_dance_analysis, sequence_id, str(output_path))
+    return output_path, state, error
+
+
+def _image_in_background(output_path, func, *args):
+    """图片已存在时返回 ('ready', None)，否则在后台生成并返回 ('pending', None)
+
+    同一图片同时只生成一次；上一次生成失败时返回一次 ('failed', 错误信息)，下次请求重新生成。
+    """
+    if output_path.exists():
+        touch(output_path)
+        return 'ready', None
+
+    key = str(output_path)
+    with _image_lock:
+        if key in _image_jobs:
+            error = _image_jobs[key]
+            if error is None:
+                return 'pending', None
+            del _image_jobs[key]
+            return 'failed', error
+        _image_jobs[key] = None
+
+    def worker():
+        error = None
+        try:
+            execute(func, *args)
+            count('images_rendered')
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"图片生成失败: {error}")
+        with _image_lock:
+            if error is None:
+                _image_jobs.pop(key, None)
+            else:
+                _image_jobs[key] = error
+
+    threading.Thread(target=worker, name='image', daemon=True).start()
+    return 'pending', None
+
+
+def run_generation(params):
+    """执行分析、生成和渲染，返回 (report, 视频文件名)
+
+    params: music_file, dance_style, keywords, formation, views（相机视角列表）,
+    practice_speed（练习速度，默认1.0）, profile（可选的剖析引擎）
+    """
+    profile_engine = params.get('profile')
+    if not profile_engine:
+        return _generate(params)
+
+    with profile_request(OUTPUT_DIR, f"profile_{uuid.uuid4().hex[:8]}", profile_engine) as profile:
+        report, output_filename = _generate(params)
+    report['output_files']['profile'] = profile['filename']
+    return report, output_filename
+
+
+def save_report(report):
+    """把生成报告保存到输出目录，返回文件名"""
+    report_filename = f"report_{uuid.uuid4().hex[:8]}.json"
+    with open(OUTPUT_DIR / report_filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report_filename
+
+
+def start_stream(params, on_done=None):
+    """在后台线程中生成舞蹈，分段渲染好即写入 HLS 播放列表，立即返回任务ID
+
+    任务状态和播放列表都保存在磁盘上，任意工作进程都可以响应查询。
+    on_done 在任务结束（无论成功与否）后调用，用于释放准入资源。
+    """
+    job_id = uuid.uuid4().hex[:12]
+    (STREAM_DIR / job_id).mkdir(parents=True, exist_ok=True)
+    _write_stream_status(job_id, {'state': 'running'})
+
+    def worker():
+        try:
+            with trace_request() as trace:
+                report, output_filename = execute(run_stream, job_id, params)
+            count('dances_generated')
+            report['profiling'] = trace.to_dict()
+            save_report(report)
+            _write_stream_status(job_id, {
+                'state': 'done',
+                'video_url': f'/api/download/{output_filename}',
+                'report': report
+            })
+        except Exception as e:
+            count('generation_failures')
+            print(f"生成失败: {str(e)}")
+            _write_stream_status(job_id, {'state': 'failed', 'error': str(e)})
+        finally:
+            if on_done is not None:
+                on_done()
+
+    threading.Thread(target=worker, name=f'stream-{job_id}', daemon=True).start()
+    return job_id
+
+
+def run_stream(job_id, params):
+    """生成舞蹈，并把每个渲染好的分段加入该任务的 HLS 播放列表"""
+    playlist = HlsPlaylist(
+        STREAM_DIR / job_id / 'playlist.m3u8',
+        SEGMENT_DIR,
+        _practice_music(str(MUSIC_DIR / params['music_file']), params.get('practice_speed') or 1.0),
+        SEGMENT_CONFIG['segment_seconds']
+    )
+    report, output_filename = _generate(params, on_segment=playlist.add_segment)
+    playlist.finish()
+    return report, output_filename
+
+
+def stream_status(job_id):
+    """读取流式生成任务的状态，不存在时抛出 KeyError"""
+    if not _JOB_ID.match(job_id or ''):
+        raise KeyError(job_id)
+    status_path = STREAM_DIR / job_id / 'status.json'
+    if not status_path.exists():
+        raise KeyError(job_id)
+    with open(status_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def stream_file(job_id, name):
+    """流式任务的播放列表或TS分段路径，不存在时抛出 KeyError"""
+    if not _JOB_ID.match(job_id or ''):
+        raise KeyError(job_id)
+    if name == 'playlist.m3u8':
+        path = STREAM_DIR / job_id / name
+    elif _SEGMENT_NAME.match(name):
+        path = SEGMENT_DIR / name
+    else:
+        raise KeyError(name)
+    if not path.exists():
+        raise KeyError(name)
+    return path
+
+
+def _write_stream_status(job_id, status):
+    atomic_write_bytes(STREAM_DIR / job_id / 'status.json',
+                       json.dumps(dict(status, job_id=job_id), ensure_ascii=False).encode('utf-8'))
+
+
+def evict_render_cache():
+    """删除过期的流式任务目录，并按大小淘汰分段缓存和图片缓存
+
+    仍保留的播放列表和未完成的分布式渲染任务引用的分段不会被淘汰。
+    """
+    keep = set()
+    expire_before = time.time() - SEGMENT_CONFIG['stream_retention_hours'] * 3600
+    for job_dir in STREAM_DIR.iterdir():
+        if not job_dir.is_dir():
+            continue
+        try:
+            updated = max(path.stat().st_mtime for path in job_dir.iterdir())
+        except (OSError, ValueError):
+            updated = 0
+        if updated < expire_before:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            count('streams_expired')
+            continue
+        try:
+            with open(job_dir / 'playlist.m3u8', 'r', encoding='utf-8') as f:
+                names = [line.strip()[len('segments/'):] for line in f if line.startswith('segments/')]
+        except OSError:
+            names = []
+        for name in names:
+            # TS 分段由同名的视频分段和音频哈希组成：seg_<哈希>_<音频>.ts
+            keep.add(name)
+            keep.add(name.rsplit('_', 1)[0] + '.mp4')
+
+    if FARM_CONFIG['queue_path'].exists():
+        queue = WorkQueue(FARM_CONFIG['queue_path'])
+        try:
+            for result in queue.running_results():
+                keep.update(result.get('segments', []))
+        finally:
+            queue.close()
+
+    evict_lru(SEGMENT_DIR, SEGMENT_CONFIG['max_bytes'], ('*.mp4', '*.ts'), keep=keep,
+              min_age=SEGMENT_CONFIG['min_age_seconds'], counter='segment_evictions')
+    evict_lru(IMAGE_DIR, VISUALIZATION_CONFIG['max_bytes'], ('*.png',), counter='image_evictions')
+
+
+def _generate(params, on_segment=None):
+    music_processor = get_music_processor(ANALYSIS_ENDPOINT_PROFILES['generation'])
+    dance_generator = get_dance_generator()
+    dance_visualizer = get_dance_visualizer()
+
+    music_path = str(MUSIC_DIR / params['music_file'])
+    dance_style = params['dance_style']
+    formation = params.get('formation')
+    practice_speed = params.get('practice_speed') or 1.0
+
+    with timed('request.generate_dance'):
+        # 步骤1: 分析音乐
+        print("分析音乐中...")
+        music_features = music_processor.extract_features(music_path)
+
+        # 步骤2: 生成舞蹈序列
+        print("生成舞蹈序列中...")
+        dance_sequence = dance_generator.generate(
+            music_features=music_features,
+            dance_style=dance_style,
+            keywords=params.get('keywords', '')
+        )
+
+        # 步骤3: 生成视频
+        print("生成视频中...")
+        output_filename = f"dance_{uuid.uuid4().hex[:8]}.mp4"
+        output_path = str(OUTPUT_DIR / output_filename)
+
+        if formation:
+            # 群舞：由单人序列批量生成全部舞者并在同一画面中渲染
+            formation_sequence, floor_positions = get_formation_generator().generate(
+                dance_sequence,
+                dancer_count=formation.get('dancers', 6),
+                mode=formation.get('mode', 'unison'),
+                layout=formation.get('layout', 'line'),
+                tempo=music_features.get('tempo', 100)
+            )
+            render_sequence = retime_sequence(formation_sequence, practice_speed, axis=1)
+        else:
+            render_sequence = retime_sequence(dance_sequence, practice_speed)
+
+        # 分段编码，供之后的局部重新生成复用；练习速度下使用变速后的音乐。
+        # 取景参数随序列保存，局部重新生成时沿用，未修改的分段画面不变
+        framing = dance_visualizer.framing(render_sequence, params.get('views'))
+        segment_stats = dance_visualizer.create_segmented_video(
+            render_sequence, _practice_music(music_path, practice_speed), output_path, dance_style,
+            on_segment=on_segment, views=params.get('views'), framing=framing
+        )
+        evict_render_cache()
+
+        # 保存序列，供局部重新生成使用
+        sequence_id = save_sequence(dance_sequence, {
+            'music_file': params['music_file'],
+            'dance_style': dance_style,
+            'keywords': params.get('keywords', ''),
+            'formation': formation,
+            'views': params.get('views'),
+            'framing': framing,
+            'practice_speed': practice_speed,
+            'analysis_profile': music_processor.profile,
+            'skeleton': get_skeleton().name,
+            'music_features': {
+                'tempo': music_features.get('tempo', 100),
+                'duration': music_features.get('duration', 0),
+                'beats': music_features.get('beats', [])
+            },
+            'video': output_filename,
+            'parent': None
+        })
+
+        # 步骤4: 生成分析报告（动作质量指标按原速的单人序列计算）
+        with timed('motion_analytics'):
+            motion_analytics = get_motion_analyzer().analyze(dance_sequence, music_features.get('beats'))
+        report = {
+            'generation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'music_file': params['music_file'],
+            'dance_style': dance_style,
+            'views': params.get('views'),
+            'practice_speed': practice_speed,
+            'music_features': {
+                'tempo': music_features.get('tempo', 0),
+                'duration': music_features.get('duration', 0),
+                'beat_count': len(music_features.get('beats', [])),
+                'analysis_profile': music_processor.profile
+            },
+            'dance_info': {
+                'frame_count': len(dance_sequence),
+                'joint_count': dance_sequence.shape[1] if len(dance_sequence.shape) > 1 else 0
+            },
+            'motion_analytics': motion_analytics,
+            'sequence_id': sequence_id,
+            'segments': segment_stats,
+            'output_files': {
+                'video': output_filename
+            }
+        }
+        if formation:
+            report['formation'] = {
+                'dancer_count': int(formation_sequence.shape[0]),
+                'mode': formation.get('mode', 'unison'),
+                'layout': formation.get('layout', 'line'),
+                'floor_positions': floor_positions[:, [0, 2]].round(3).tolist()
+            }
+
+    return report, output_filename
+
+
+def resolve_time_range(sequence_meta, params):
+    """把请求中的时间或小节范围换算为 (开始秒, 结束秒)"""
+    if params.get('start_bar') is None:
+        return float(params['start_time']), float(params['end_time'])
+
+    features = sequence_meta['music_features']
+    beats_per_bar = SEGMENT_CONFIG['beats_per_bar']
+    start_time = _beat_time(features, (int(params['start_bar']) - 1) * beats_per_bar)
+    end_time = _beat_time(features, int(params['end_bar']) * beats_per_bar)
+    return start_time, min(end_time, features.get('duration') or end_time)
+
+
+def bar_start_times(music_features):
+    """各小节的起始时间（秒），覆盖整首音乐"""
+    duration = music_features.get('duration') or 0
+    beats_per_bar = SEGMENT_CONFIG['beats_per_bar']
+    times = []
+    while True:
+        bar_time = _beat_time(music_features, len(times) * beats_per_bar)
+        if times and bar_time >= duration:
+            return times
+        times.append(bar_time)
+
+
+def _beat_time(music_features, index):
+    """第 index 拍的时间，按拍点换算，拍点之外按速度外推"""
+    beats = music_features.get('beats') or []
+    seconds_per_beat = 60.0 / (music_features.get('tempo') or 100)
+    if index < len(beats):
+        return beats[index]
+    if not beats:
+        return index * seconds_per_beat
+    return beats[-1] + (index - len(beats) + 1) * seconds_per_beat
+
+
+def run_scoring(params):
+    """把录制的关键点与已保存的舞蹈序列对齐并评分
+
+    params: sequence_id, keypoints（(T, J, 2|3) 数组）, fps（录制帧率，默认与生成序列相同）
+    """
+    dance_sequence, meta = load_dance_sequence(params['sequence_id'])
+    skeleton = get_skeleton()
+
+    with timed('request.score_rehearsal'):
+        scorer = RehearsalScorer(skeleton.joint_count, DANCE_CONFIG['frame_rate'],
+                                 root_joint=skeleton.index('root'), neck_joint=skeleton.index('neck'),
+                                 head_joint=skeleton.index('head'),
+                                 foot_joints=(skeleton.index('left_ankle'), skeleton.index('right_ankle')))
+        result = scorer.score(dance_sequence, params['keypoints'], params.get('fps'),
+                              bar_times=bar_start_times(meta['music_features']))
+
+    names = skeleton.joint_names
+    result['joint_errors'] = dict(zip(names, result['joint_errors']))
+    result['joint_names'] = names
+    result['sequence_id'] = params['sequence_id']
+    return result
+
+
+def estimate_scoring_cells(meta, recorded_frames, fps=None):
+    """排练评分时 DTW 计算的格数（准入控制的成本估算），不读取序列数据"""
+    reference_frames = (meta.get('dance_info') or {}).get('frame_count') or 0
+    scorer = RehearsalScorer(get_skeleton().joint_count, DANCE_CONFIG['frame_rate'])
+    return scorer.dtw_cells(recorded_frames, reference_frames, fps)
+
+
+def _render(sequence_meta, dance_sequence, music_path, output_path):
+    """按序列元数据渲染视频（单人或群舞、练习速度），返回分段统计
+
+    沿用元数据中保存的取景参数（旧序列没有时按整段序列计算）。
+    """
+    render_sequence, render_music = prepare_render(sequence_meta, dance_sequence, music_path)
+    segment_stats = get_dance_visualizer().create_segmented_video(
+        render_sequence, render_music, output_path, sequence_meta['dance_style'],
+        views=sequence_meta.get('views'), framing=sequence_meta.get('framing')
+    )
+    evict_render_cache()
+    return segment_stats
+
+
+def prepare_render(sequence_meta, dance_sequence, music_path):
+    """按序列元数据得到实际渲染的序列（群舞展开、按练习速度重新采样）和对应的音乐，
+    返回 (渲染序列, 音乐路径)"""
+    formation = sequence_meta.get('formation')
+    practice_speed = sequence_meta.get('practice_speed') or 1.0
+    if formation:
+        dance_sequence, _ = get_formation_generator().generate(
+            dance_sequence,
+            dancer_count=formation.get('dancers', 6),
+            mode=formation.get('mode', 'unison'),
+            layout=formation.get('layout', 'line'),
+            tempo=sequence_meta['music_features'].get('tempo', 100)
+        )
+        dance_sequence = retime_sequence(dance_sequence, practice_speed, axis=1)
+    else:
+        dance_sequence = retime_sequence(dance_sequence, practice_speed)
+    return dance_sequence, _practice_music(music_path, practice_speed)
+
+
+def _practice_music(music_path, practice_speed):
+    """练习速度下的音乐：变速后的缓存文件，原速时为原文件"""
+    if abs(practice_speed - 1.0) < 1e-6:
+        return music_path
+    return practice_audio(music_path, practice_speed)
+
+
+def run_practice(params):
+    """按练习速度重新渲染已保存的序列（不重新生成动作），返回 (report, 视频文件名)
+
+    params: sequence_id, practice_speed
+    变速后的音乐按 (歌曲, 速度) 缓存，同一速度再次渲染时只需编码视频。
+    """
+    dance_sequence, meta = load_dance_sequence(params['sequence_id'])
+    practice_speed = params['practice_speed']
+
+    with timed('request.render_practice'):
+        output_filename = f"dance_{uuid.uuid4().hex[:8]}.mp4"
+        segment_stats = _render(dict(meta, practice_speed=practice_speed), dance_sequence,
+                                str(MUSIC_DIR / meta['music_file']), str(OUTPUT_DIR / output_filename))
+
+    report = {
+        'generation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'music_file': meta['music_file'],
+        'dance_style': meta['dance_style'],
+        'sequence_id': params['sequence_id'],
+        'practice_speed': practice_speed,
+        'segments': segment_stats,
+        'output_files': {
+            'video': output_filename
+        }
+    }
+    return report, output_filename
+
+
+def run_splice(params):
+    """只重新生成已有序列的某个时间范围，并只重新渲染受影响的视频分段
+
+    params: sequence_id, start_time, end_time（秒）或 start_bar, end_bar（小节，从1开始，含两端）。
+    结果保存为新的序列，原序列保持不变；返回 (report, 视频文件名)。
+    """
+    dance_sequence, meta = load_dance_sequence(params['sequence_id'])
+    start_time, end_time = resolve_time_range(meta, params)
+    frame_rate = get_dance_generator().frame_rate
+    start_frame = int(round(start_time * frame_rate))
+    end_frame = int(round(end_time * frame_rate))
+
+    with timed('request.regenerate_segment'):
+        new_sequence = get_dance_generator().regenerate_range(
+            dance_sequence, meta['music_features'], meta['dance_style'],
+            start_frame, end_frame, keywords=meta.get('keywords', '')
+        )
+
+        output_filename = f"dance_{uuid.uuid4().hex[:8]}.mp4"
+        music_path = str(MUSIC_DIR / meta['music_file'])
+        segment_stats = _render(meta, new_sequence, music_path, str(OUTPUT_DIR / output_filename))
+
+        sequence_id = save_sequence(new_sequence, dict(
+            meta, skeleton=get_skeleton().name, video=output_filename, parent=params['sequence_id']
+        ))
+
+        with timed('motion_analytics'):
+            motion_analytics = get_motion_analyzer().analyze(new_sequence, meta['music_features'].get('beats'))
+
+    report = {
+        'generation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'music_file': meta['music_file'],
+        'dance_style': meta['dance_style'],
+        'sequence_id': sequence_id,
+        'parent_sequence_id': params['sequence_id'],
+        'regenerated_range': {
+            'start_frame': start_frame,
+            'end_frame': min(end_frame, len(new_sequence)),
+            'start_time': round(start_time, 3),
+            'end_time': round(end_time, 3)
+        },
+        'motion_analytics': motion_analytics,
+        'segments': segment_stats,
+        'output_files': {
+            'video': output_filename
+        }
+    }
+    return report, output_filename
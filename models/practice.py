@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""练习速度：变速不变调的音乐（按 (歌曲, 速度) 缓存）和按时间重新采样的动作序列"""
+
+import numpy as np
+
+from config import PRACTICE_CONFIG
+from utils.audio_assets import audio_track
+
+
+def quantize_speed(speed):
+    """练习速度取整到 PRACTICE_CONFIG['speed_step'] 的倍数，限制每首歌缓存的变速音轨数量"""
+    step = PRACTICE_CONFIG['speed_step']
+    return round(round(float(speed) / step) * step, 3)
+
+
+def practice_audio(music_path, speed):
+    """变速后的音乐文件路径，同一首歌的同一速度只变速一次
+
+    变速结果直接保存为音轨缓存（data/cache/audio）中的 AAC 音轨，合成视频和 HLS 分段时
+    复制音频流，不再重新编码。
+    """
+    return audio_track(music_path, speed)
+
+
+def retime_sequence(sequence, speed, axis=0):
+    """按练习速度重新采样动作序列（speed < 1 时变慢、帧数增加），相邻两帧线性插值
+
+    axis 为时间轴：单人序列 (T, J, 3) 为 0，群舞序列 (D, T, J, 3) 为 1。
+    """
+    frame_count = sequence.shape[axis]
+    if abs(speed - 1.0) < 1e-6 or frame_count < 2:
+        return sequence
+
+    # 新序列第 k 帧对应原序列的 k × speed 帧
+    source = np.minimum(np.arange(int(round(frame_count / speed))) * speed, frame_count - 1)
+    low = np.floor(source).astype(np.int64)
+    high = np.minimum(low + 1, frame_count - 1)
+    weight = (source - low).reshape((-1,) + (1,) * (sequence.ndim - axis - 1))
+
+    low_frames = np.take(sequence, low, axis=axis)
+    high_frames = np.take(sequence, high, axis=axis)
+    return (low_frames + (high_frames - low_frames) * weight).astype(sequence.dtype)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""帧栅格化：预渲染字形贴图，只重置上一帧画过的区域"""
+
+import numpy as np
+
+
+class GlyphAtlas:
+    """字符的 alpha 贴图，首次用到时用 cv2.putText 渲染一次，之后用 NumPy 切片合成"""
+
+    def __init__(self, font_scale, thickness=1):
+        import cv2
+
+        self.font_face = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self._glyphs = {}
+
+    def _glyph(self, char):
+        """返回 (alpha, 左上角相对基线原点的偏移 dx, dy, 前进宽度)"""
+        glyph = self._glyphs.get(char)
+        if glyph is not None:
+            return glyph
+
+        import cv2
+
+        (width, height), baseline = cv2.getTextSize(char, self.font_face, self.font_scale, self.thickness)
+        # 单字符的宽度包含笔画外扩，连续排版时的前进宽度按两个字符的宽度差计算
+        advance = cv2.getTextSize(char * 2, self.font_face, self.font_scale, self.thickness)[0][0] - width
+        pad = self.thickness + 1
+        canvas = np.zeros((height + baseline + pad * 2, width + pad * 2), dtype=np.uint8)
+        cv2.putText(canvas, char, (pad, pad + height), self.font_face, self.font_scale,
+                    255, self.thickness, cv2.LINE_AA)
+
+        # 裁掉空白边缘，合成时只处理有笔画的像素
+        ys, xs = np.nonzero(canvas)
+        if len(ys) == 0:
+            glyph = (None, 0, 0, advance)
+        else:
+            y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+            alpha = (canvas[y0:y1, x0:x1].astype(np.float32) / 255)[:, :, None]
+            glyph = (alpha, x0 - pad, y0 - pad - height, advance)
+
+        self._glyphs[char] = glyph
+        return glyph
+
+    def draw(self, frame, text, org, color):
+        """在 org（基线左端，与 cv2.putText 相同）处绘制文字，返回覆盖的区域 (x0, y0, x1, y1)"""
+        height, width = frame.shape[:2]
+        color = np.asarray(color, dtype=np.float32)
+        x, y = org
+        bbox = [width, height, 0, 0]
+
+        for char in text:
+            alpha, dx, dy, advance = self._glyph(char)
+            if alpha is not None:
+                x0, y0 = x + dx, y + dy
+                x1, y1 = x0 + alpha.shape[1], y0 + alpha.shape[0]
+                # 裁剪到画布内
+                cx0, cy0, cx1, cy1 = max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+                if cx0 < cx1 and cy0 < cy1:
+                    a = alpha[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+                    region = frame[cy0:cy1, cx0:cx1]
+                    region[:] = region * (1 - a) + color * a
+                    bbox = [min(bbox[0], cx0), min(bbox[1], cy0), max(bbox[2], cx1), max(bbox[3], cy1)]
+            x += advance
+
+        return tuple(bbox) if bbox[0] < bbox[2] else None
+
+
+class FrameRasterizer:
+    """在缓存的背景上逐帧绘制
+
+    背景（渐变、标题等静态内容）只生成一次；每帧开始时只把上一帧画过的区域
+    从背景恢复，因此每帧的开销与骨骼和进度信息的面积成正比，而不是整个画布。
+    begin() 返回的画布在下一次 begin() 之前有效，调用方需在此之前写出或复制。
+    """
+
+    def __init__(self, background):
+        self.background = background
+        self.frame = background.copy()
+        self.height, self.width = background.shape[:2]
+        self._dirty = []
+
+    def begin(self):
+        """开始新的一帧：恢复上一帧的脏区域"""
+        for x0, y0, x1, y1 in self._dirty:
+            self.frame[y0:y1, x0:x1] = self.background[y0:y1, x0:x1]
+        self._dirty = []
+        return self.frame
+
+    def mark(self, bbox):
+        """记录本帧画过的区域（自动裁剪到画布内）"""
+        if bbox is None:
+            return
+        x0, y0, x1, y1 = bbox
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(x1), self.width), min(int(y1), self.height)
+        if x0 < x1 and y0 < y1:
+            self._dirty.append((x0, y0, x1, y1))
+
+    def fill_rect(self, x0, y0, x1, y1, color):
+        """填充矩形并记录为脏区域"""
+        self.frame[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)] = color
+        self.mark((x0, y0, x1, y1))
+
+    def draw_text(self, atlas, text, org, color):
+        """用字形贴图绘制文字并记录为脏区域"""
+        self.mark(atlas.draw(self.frame, text, org, color))
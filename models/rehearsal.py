@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""排练评分：把录制的舞者关键点与生成的舞蹈序列做DTW对齐，给出各关节、各小节的误差"""
+
+import io
+import json
+import math
+import warnings
+
+import numpy as np
+
+from config import REHEARSAL_CONFIG
+
+
+def parse_keypoints(data, filename):
+    """解析上传的关键点文件（.npy 或 .json），返回 (关键点, fps 或 None)"""
+    if filename.lower().endswith('.npy'):
+        return _check_keypoints(np.load(io.BytesIO(data), allow_pickle=False)), None
+    return keypoints_from_json(json.loads(data.decode('utf-8')))
+
+
+def keypoints_from_json(content):
+    """JSON 格式的关键点：(T, J, 2|3) 的嵌套列表（null 表示未检测到的关节），
+    或 {"keypoints": [...], "fps": 30}。返回 (关键点, fps 或 None)"""
+    fps = None
+    if isinstance(content, dict):
+        fps = content.get('fps')
+        content = content.get('keypoints')
+    return _check_keypoints(np.array(content, dtype=np.float64)), fps
+
+
+def _check_keypoints(keypoints):
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    if keypoints.ndim != 3 or keypoints.shape[2] not in (2, 3) or len(keypoints) < 2:
+        raise ValueError(f"关键点形状应为 (帧数, 关节数, 2或3)，实际为 {keypoints.shape}")
+    return keypoints
+
+
+class RehearsalScorer:
+    def __init__(self, joint_count, frame_rate, root_joint=0, neck_joint=3, head_joint=4,
+                 foot_joints=(13, 16), band_seconds=None, tolerance=None):
+        self.joint_count = joint_count
+        self.frame_rate = frame_rate
+        self.root_joint = root_joint
+        self.neck_joint = neck_joint
+        self.head_joint = head_joint
+        self.foot_joints = list(foot_joints)
+        self.band_seconds = band_seconds if band_seconds is not None else REHEARSAL_CONFIG['band_seconds']
+        self.tolerance = tolerance if tolerance is not None else REHEARSAL_CONFIG['error_tolerance']
+
+    def score(self, reference, recorded, recorded_fps=None, bar_times=None):
+        """对齐并评分
+
+        reference: 生成的序列 (M, J', 3)，只取前 joint_count 个关节
+        recorded: 录制的关键点 (N, joint_count, 2|3)，缺失的关节为 NaN
+        bar_times: 小节起始时间（秒），用于按小节汇总
+        """
+        if recorded.shape[1] != self.joint_count:
+            raise ValueError(f"关键点应为 {self.joint_count} 个关节，实际为 {recorded.shape[1]}")
+
+        dims = recorded.shape[2]
+        reference = self._normalize(reference[:, :self.joint_count, :dims])
+        recorded = self._normalize(self._resample(recorded, recorded_fps or self.frame_rate))
+
+        path = dtw_path(recorded, reference, self._band_frames())
+
+        # 全部缺失的关节/帧求平均时得到 NaN（输出为 null），不需要警告
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return self._summarize(recorded, reference, path, bar_times)
+
+    def dtw_cells(self, recorded_frames, reference_frames, recorded_fps=None):
+        """评分时 DTW 计算的格数：录制帧数（按参考帧率重采样后）× 窗口宽度，用于估算请求成本"""
+        fps = recorded_fps or self.frame_rate
+        frames = recorded_frames
+        if recorded_frames > 1 and abs(fps - self.frame_rate) >= 1e-6:
+            frames = int((recorded_frames - 1) / fps * self.frame_rate) + 1
+        _, width = dtw_band(frames, reference_frames, self._band_frames())
+        return frames * width
+
+    def _band_frames(self):
+        return max(1, int(self.band_seconds * self.frame_rate))
+
+    def _summarize(self, recorded, reference, path, bar_times):
+        # 每个参考帧的关节误差：对齐到该帧的所有录制帧取平均
+        recorded_idx, reference_idx = path[:, 0], path[:, 1]
+        errors = np.linalg.norm(recorded[recorded_idx] - reference[reference_idx], axis=2)
+        valid = ~np.isnan(errors)
+        counts = np.zeros((len(reference), self.joint_count))
+        sums = np.zeros((len(reference), self.joint_count))
+        np.add.at(counts, reference_idx, valid)
+        np.add.at(sums, reference_idx, np.where(valid, errors, 0))
+        with np.errstate(invalid='ignore'):
+            joint_errors = sums / counts  # (M, J)，从未检测到的关节为 NaN
+
+        # 时间偏差：录制帧相对于参考帧的提前(负)或落后(正)，按参考帧平均
+        lag = np.bincount(reference_idx, weights=recorded_idx - reference_idx, minlength=len(reference)) \
+            / np.bincount(reference_idx, minlength=len(reference))
+        frame_errors = np.nanmean(joint_errors, axis=1)
+
+        mean_error = float(np.nanmean(frame_errors))
+        return {
+            'score': round(max(0.0, 100.0 * (1 - mean_error / self.tolerance)), 1),
+            'mean_error': round(mean_error, 4),
+            'joint_errors': _rounded(np.nanmean(joint_errors, axis=0)),
+            'frame_errors': _rounded(frame_errors),
+            'bars': self._bars(joint_errors, lag, bar_times),
+            'recorded_frames': len(recorded),
+            'reference_frames': len(reference),
+            'path_length': len(path)
+        }
+
+    def _resample(self, recorded, fps):
+        """按时间线性插值到参考序列的帧率"""
+        if abs(fps - self.frame_rate) < 1e-6:
+            return recorded
+        duration = (len(recorded) - 1) / fps
+        source_t = np.arange(len(recorded)) / fps
+        target_t = np.arange(int(duration * self.frame_rate) + 1) / self.frame_rate
+
+        # 沿时间轴插值：把 (N, J, D) 展平为 N 行，对每一列分别插值
+        flat = recorded.reshape(len(recorded), -1)
+        index = np.interp(target_t, source_t, np.arange(len(recorded)))
+        low = np.floor(index).astype(int)
+        high = np.minimum(low + 1, len(recorded) - 1)
+        weight = (index - low)[:, None]
+        resampled = flat[low] * (1 - weight) + flat[high] * weight
+        return resampled.reshape((len(target_t),) + recorded.shape[1:])
+
+    def _normalize(self, sequence):
+        """去掉整体位移和体型差异：每帧以根节点为原点，按躯干长度缩放，统一为Y轴向上"""
+        sequence = sequence - sequence[:, self.root_joint:self.root_joint + 1]
+        torso = np.nanmedian(np.linalg.norm(sequence[:, self.neck_joint], axis=1))
+        if not np.isfinite(torso) or torso <= 0:
+            raise ValueError("无法确定躯干长度，请检查关键点")
+        sequence = sequence / torso
+
+        # 图像坐标系（Y轴向下）的关键点：头部在脚的下方时翻转Y轴
+        head_y = np.nanmedian(sequence[:, self.head_joint, 1])
+        foot_y = np.nanmedian(sequence[:, self.foot_joints, 1])
+        if head_y < foot_y:
+            sequence = sequence * np.array([1, -1, 1][:sequence.shape[2]])
+        return sequence
+
+    def _bars(self, joint_errors, lag, bar_times):
+        """按小节汇总关节误差和时间偏差"""
+        if not bar_times:
+            return []
+        reference_frames = len(joint_errors)
+        edges = np.clip(np.round(np.asarray(bar_times) * self.frame_rate).astype(int), 0, reference_frames)
+        edges = np.append(edges, reference_frames)
+
+        # 第一小节之前的弱起部分记为第 0 小节
+        bars = []
+        for bar, (start, end) in enumerate(zip(np.append(0, edges[:-1]), edges)):
+            if end <= start:
+                continue
+            errors = joint_errors[start:end]
+            bars.append({
+                'bar': bar,
+                'start_time': round(start / self.frame_rate, 3),
+                'end_time': round(end / self.frame_rate, 3),
+                'error': _rounded(np.nanmean(errors)),
+                'joint_errors': _rounded(np.nanmean(errors, axis=0)),
+                'timing_offset': round(float(np.mean(lag[start:end])) / self.frame_rate, 3)
+            })
+        return bars
+
+
+def dtw_band(n, m, band):
+    """实际使用的窗口半宽和宽度：相邻两行的窗口须有重叠，M/N 超过窗口宽度时放宽到 ⌈M/N⌉"""
+    band = max(band, math.ceil(math.ceil((m - 1) / max(n - 1, 1)) / 2))
+    return band, min(2 * band + 1, m)
+
+
+def dtw_path(query, reference, band):
+    """Sakoe-Chiba 窗口内的DTW，返回对齐路径 (L, 2)：每行为 (query 帧, reference 帧)
+
+    第 i 行只计算以 i·(M/N) 为中心、宽 2·band+1 的列，累计代价和回溯方向都只保存窗口内的部分，
+    内存为 O(N·band)。行内的水平转移用前缀最小值一次求出，每行只需几次向量运算。
+    帧间距离为各关节的平均欧氏距离，缺失（NaN）的关节不计入。
+    相邻两行的窗口须有重叠，M/N 超过窗口宽度（录制帧数远少于参考帧数）时自动放宽到 ⌈M/N⌉。
+    """
+    n, m = len(query), len(reference)
+    band, width = dtw_band(n, m, band)
+    centers = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(int)
+    lows = np.clip(centers - band, 0, m - width)
+    columns = np.arange(width)
+
+    # 回溯方向：0 对角，1 上方（query 前进），2 左方（reference 前进）
+    moves = np.zeros((n, width), dtype=np.int8)
+
+    # 距离按 float32 计算；缺失的关节置零并记录有效标记
+    valid = ~np.isnan(query).any(axis=2)
+    query = np.ascontiguousarray(np.nan_to_num(query).transpose(2, 0, 1), dtype=np.float32)
+    reference = np.ascontiguousarray(reference.transpose(2, 0, 1), dtype=np.float32)
+
+    inf_pad = np.full(width + 1, np.inf)
+    previous = None
+
+    chunk = REHEARSAL_CONFIG['chunk_rows']
+    for chunk_start in range(0, n, chunk):
+        chunk_rows = np.arange(chunk_start, min(chunk_start + chunk, n))
+        costs = _band_costs(query, valid, reference, chunk_rows, lows[chunk_rows][:, None] + columns)
+
+        for row, cost in zip(chunk_rows, costs):
+            if previous is None:
+                current = np.cumsum(cost)
+                moves[row] = 2
+                moves[row, 0] = 0
+            else:
+                # 上一行在本行列坐标下的值：diag 对应列 j-1，up 对应列 j
+                shift = lows[row] - lows[row - 1]
+                padded = np.concatenate(([np.inf], previous, inf_pad))
+                diag = padded[shift:shift + width]
+                up = padded[shift + 1:shift + 1 + width]
+                entry = np.minimum(diag, up)
+
+                # D[j] = min(entry[j], D[j-1]) + cost[j]
+                #      = C[j] + min_{k<=j}(entry[k] - C[k-1])，C 为 cost 的前缀和
+                cumulative = np.cumsum(cost)
+                candidates = entry - (cumulative - cost)
+                best = np.minimum.accumulate(candidates)
+                current = cumulative + best
+
+                # 前缀最小值的来源列 k：k == j 时从上一行进入，否则从左边
+                source = np.maximum.accumulate(np.where(candidates <= best, columns, 0))
+                moves[row] = np.where(source < columns, 2, np.where(diag <= up, 0, 1))
+            previous = current
+
+    # 从终点回溯
+    path = []
+    i, j = n - 1, m - 1
+    while i > 0 or j > 0:
+        path.append((i, j))
+        move = moves[i, j - lows[i]]
+        if move == 0:
+            i, j = i - 1, j - 1
+        elif move == 1:
+            i -= 1
+        else:
+            j -= 1
+    path.append((0, 0))
+    return np.array(path[::-1])
+
+
+def _band_costs(query, valid, reference, rows, columns):
+    """窗口内的帧间距离 (行数, 窗口宽)
+
+    坐标按 (维度, 帧, 关节) 排列并逐维累加，避免生成 (行, 窗口, 关节, 坐标) 的大数组。
+    """
+    squared = np.zeros(columns.shape + valid.shape[1:], dtype=np.float32)
+    for dim in range(len(query)):
+        delta = query[dim][rows][:, None, :] - reference[dim][columns]
+        squared += delta * delta
+    distance = np.sqrt(squared, out=squared)
+    distance *= valid[rows][:, None, :]
+    return distance.sum(axis=2) / np.maximum(valid[rows].sum(axis=1), 1)[:, None]
+
+
+def _rounded(values, digits=4):
+    """NaN 转为 None 以便输出JSON"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        return None if np.isnan(values) else round(float(values), digits)
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""渲染后端：在 BGR uint8 画布上批量绘制骨骼的线段和关节圆点
+
+后端在 config.py 的 RENDER_CONFIG['backend'] 中选择（RENDER_BACKENDS），目前只有 OpenCV。
+NumPy 后端比 OpenCV 慢 7～8 倍，不可在配置中选择，只作为不依赖 OpenCV 的参考实现（REFERENCE_BACKENDS），
+由 tests/test_render_backends.py 和 python -m benchmarks.compare_backends 用来核对画面。
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from config import RENDER_CONFIG
+
+# cv2.LINE_AA 的实心边缘比名义半径外扩约 0.7 像素，覆盖率 = clip(半径 + 1.2 - 距离)，
+# NumPy 后端按同样的几何绘制，使两个后端的画面一致
+_AA_EDGE = 1.2
+
+
+class RenderBackend(ABC):
+    """渲染后端接口"""
+
+    name = None
+
+    @abstractmethod
+    def draw_segments(self, frame, segments, color, thickness):
+        """绘制同色的抗锯齿线段，segments 为 (M, 2, 2) 的整数像素坐标"""
+
+    @abstractmethod
+    def draw_disks(self, frame, centers, radius, colors):
+        """按顺序绘制抗锯齿实心圆，centers 为 (K, 2)，colors 为 K 个 BGR 颜色"""
+
+
+class OpenCVBackend(RenderBackend):
+    """OpenCV 绘制函数（默认）"""
+
+    name = 'opencv'
+
+    def draw_segments(self, frame, segments, color, thickness):
+        import cv2
+        cv2.polylines(frame, list(segments), False, color, thickness, cv2.LINE_AA)
+
+    def draw_disks(self, frame, centers, radius, colors):
+        import cv2
+        for (x, y), color in zip(centers.tolist(), colors):
+            cv2.circle(frame, (x, y), radius, color, -1, cv2.LINE_AA)
+
+
+class NumpyBackend(RenderBackend):
+    """纯 NumPy 的覆盖率光栅化（参考实现，不用于实际渲染）
+
+    同色线段一次批量采样出线段附近的像素，按到线段的距离计算覆盖率，
+    同一像素取最大覆盖率后混合一次；圆点使用按半径缓存的覆盖率贴图，用切片合成。
+    画面与 OpenCV 后端一致（差异像素不超过 0.5%），但每帧耗时是 OpenCV 的 7～8 倍。
+    """
+
+    name = 'numpy'
+
+    def __init__(self):
+        self._disk_sprites = {}
+
+    def draw_segments(self, frame, segments, color, thickness):
+        if len(segments) == 0:
+            return
+        height, width = frame.shape[:2]
+        segments = segments.astype(np.float32)
+        # 与 OpenCV 一致：实心部分的半宽为 (thickness + 1) // 2
+        half = (thickness + 1) // 2
+
+        # 沿每条线段按半像素步长采样，并在法线方向展开到线宽加抗锯齿边缘，
+        # 得到线段附近的候选像素；计算量与线段长度成正比，而不是包围盒面积
+        start, delta = segments[:, 0], segments[:, 1] - segments[:, 0]
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        steps = (np.ceil(length * 2) + 1).astype(np.int64)
+        owner = np.repeat(np.arange(len(segments)), steps)
+        t = (np.arange(owner.size) - np.repeat(np.cumsum(steps) - steps, steps)) / np.maximum(steps[owner] - 1, 1)
+        normal = np.stack([-delta[:, 1], delta[:, 0]], axis=1) / np.maximum(length, 1e-6)[:, None]
+        offsets = np.arange(-(half + 2), half + 2.5, 0.5, dtype=np.float32)
+
+        samples = start[owner] + t[:, None].astype(np.float32) * delta[owner]
+        candidates = samples[:, None, :] + offsets[None, :, None] * normal[owner][:, None, :]
+        pixel = np.rint(candidates).astype(np.int64).reshape(-1, 2)
+        owner = np.repeat(owner, len(offsets))
+
+        inside = (pixel[:, 0] >= 0) & (pixel[:, 0] < width) & (pixel[:, 1] >= 0) & (pixel[:, 1] < height)
+        pixel, owner = pixel[inside], owner[inside]
+        if len(pixel) == 0:
+            return
+
+        # 每个候选像素到其所属线段的距离
+        a, d = start[owner], delta[owner]
+        length_sq = np.maximum((d * d).sum(axis=1), 1e-6)
+        t = np.clip(((pixel - a) * d).sum(axis=1) / length_sq, 0, 1)
+        distance = np.hypot(*(pixel - a - t[:, None] * d).T)
+        coverage = np.clip(half + _AA_EDGE - distance, 0, 1)
+
+        # 同一像素取所有线段中的最大覆盖率，只混合一次
+        index, inverse = np.unique(pixel[:, 1] * width + pixel[:, 0], return_inverse=True)
+        pixel_coverage = np.zeros(len(index), dtype=np.float32)
+        np.maximum.at(pixel_coverage, inverse, coverage)
+        keep = pixel_coverage > 0
+        index, pixel_coverage = index[keep], pixel_coverage[keep]
+
+        flat = frame.reshape(-1, 3)
+        region = flat[index].astype(np.float32)
+        alpha = pixel_coverage[:, None]
+        flat[index] = region + alpha * (np.asarray(color, dtype=np.float32) - region) + 0.5
+
+    def draw_disks(self, frame, centers, radius, colors):
+        sprite = self._disk_sprite(radius)
+        size = sprite.shape[0]
+        reach = size // 2
+        height, width = frame.shape[:2]
+
+        for (x, y), color in zip(centers.tolist(), colors):
+            x0, y0 = x - reach, y - reach
+            cx0, cy0 = max(x0, 0), max(y0, 0)
+            cx1, cy1 = min(x0 + size, width), min(y0 + size, height)
+            if cx0 < cx1 and cy0 < cy1:
+                self._blend(frame, cx0, cy0, sprite[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0], color)
+
+    def _disk_sprite(self, radius):
+        """半径为 radius 的圆的覆盖率贴图（以中心像素为原点）"""
+        sprite = self._disk_sprites.get(radius)
+        if sprite is None:
+            reach = radius + 2
+            offsets = np.arange(-reach, reach + 1, dtype=np.float32)
+            distance = np.hypot(offsets[None, :], offsets[:, None])
+            sprite = np.clip(radius + _AA_EDGE - distance, 0, 1)
+            self._disk_sprites[radius] = sprite
+        return sprite
+
+    @staticmethod
+    def _blend(frame, x0, y0, coverage, color):
+        region = frame[y0:y0 + coverage.shape[0], x0:x0 + coverage.shape[1]]
+        alpha = coverage[:, :, None]
+        region[:] = region + alpha * (np.asarray(color, dtype=np.float32) - region) + 0.5
+
+
+# 可在 RENDER_CONFIG['backend'] 中选择的后端
+RENDER_BACKENDS = {
+    'opencv': OpenCVBackend
+}
+
+# 只用于核对画面的参考实现
+REFERENCE_BACKENDS = {
+    'numpy': NumpyBackend
+}
+
+
+def get_render_backend(name=None):
+    """按名称创建渲染后端，默认使用配置中的后端；也可直接传入后端实例（测试中传入参考实现）"""
+    if isinstance(name, RenderBackend):
+        return name
+    name = name or RENDER_CONFIG['backend']
+    backend_class = RENDER_BACKENDS.get(name)
+    if backend_class is None:
+        raise Exception(f"不支持的渲染后端: {name}")
+    return backend_class()
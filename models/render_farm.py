@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""分布式分块渲染：协调者把已保存的序列按时间切块发布到任务队列，工作进程按租约领取并渲染
+
+分块由整数个视频分段组成，分段按内容哈希命名并写入共享的分段目录，与在线渲染的分段缓存相同。
+全部分块完成后，协调者按顺序无重编码地拼接分段并合入缓存的音轨。
+"""
+
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+
+from config import MUSIC_DIR, OUTPUT_DIR, SEGMENT_DIR, FARM_CONFIG
+from models import pipeline
+from models.practice import quantize_speed
+from utils.profiling import timed, count
+from utils.sequence_store import load_meta
+from utils.work_queue import WorkQueue
+
+
+# 本进程最近准备的渲染序列：(sequence_id, 练习速度) -> (渲染序列, 音乐路径, 元数据)
+_prepared = {}
+
+
+class LeaseLost(Exception):
+    """租约已过期并被其他工作进程领取"""
+
+
+def _render_job(job):
+    """按任务参数准备渲染序列和音乐，同一进程中连续处理同一任务的分块时只准备一次"""
+    key = (job['sequence_id'], job['practice_speed'])
+    if key not in _prepared:
+        dance_sequence, meta = pipeline.load_dance_sequence(job['sequence_id'])
+        meta = dict(meta, practice_speed=job['practice_speed'])
+        render_sequence, render_music = pipeline.prepare_render(meta, dance_sequence,
+                                                                str(MUSIC_DIR / meta['music_file']))
+        _prepared.clear()
+        _prepared[key] = (render_sequence, render_music, meta)
+    return _prepared[key]
+
+
+def submit_render(sequence_id, practice_speed=None, chunk_seconds=None, queue=None):
+    """把已保存的序列切块发布到队列，返回 job_id；序列不存在时抛出 KeyError"""
+    queue = queue or WorkQueue()
+    chunk_seconds = chunk_seconds or FARM_CONFIG['chunk_seconds']
+
+    meta = load_meta(sequence_id)
+    job = {
+        'sequence_id': sequence_id,
+        'practice_speed': quantize_speed(practice_speed or meta.get('practice_speed') or 1.0),
+        'output': f"dance_{uuid.uuid4().hex[:8]}.mp4"
+    }
+
+    # 渲染序列的帧数（练习速度下帧数会变化），同时预先生成变速后的音乐
+    render_sequence, _, _ = _render_job(job)
+    total_frames = render_sequence.shape[1] if render_sequence.ndim == 4 else len(render_sequence)
+    job['total_frames'] = total_frames
+
+    # 分块边界对齐到分段边界，各分块渲染的分段与一次性渲染的完全相同
+    segment_frames = pipeline.get_dance_visualizer().segment_frames()
+    chunk_frames = max(1, int(round(chunk_seconds * pipeline.get_dance_visualizer().frame_rate / segment_frames))) \
+        * segment_frames
+    chunks = [{'start_frame': start, 'end_frame': min(start + chunk_frames, total_frames)}
+              for start in range(0, total_frames, chunk_frames)]
+
+    job_id = uuid.uuid4().hex[:12]
+    queue.submit(job_id, job, chunks)
+    print(f"已发布渲染任务 {job_id}: {total_frames} 帧, {len(chunks)} 块")
+    return job_id
+
+
+class FarmWorker:
+    """工作进程：循环领取分块、渲染分段并提交结果"""
+
+    def __init__(self, queue=None, worker_id=None, lease_seconds=None):
+        self.queue = queue or WorkQueue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds or FARM_CONFIG['lease_seconds']
+
+    def run(self, idle_exit=None):
+        """处理分块直到队列空闲超过 idle_exit 秒（None 表示一直运行），返回处理的分块数"""
+        processed = 0
+        idle_since = time.time()
+        while True:
+            task = self.queue.claim(self.worker_id, self.lease_seconds)
+            if task is None:
+                if idle_exit is not None and time.time() - idle_since >= idle_exit:
+                    return processed
+                time.sleep(FARM_CONFIG['poll_interval'])
+                continue
+
+            self.process(task)
+            processed += 1
+            idle_since = time.time()
+
+    def process(self, task):
+        """渲染一个分块；失败时放回队列（或在尝试次数用完后使任务失败）"""
+        job, chunk = task['job'], task['payload']
+        job_id, chunk_index = task['job_id'], task['chunk_index']
+
+        def renew(*_):
+            # 每完成一个分段续约一次
+            if not self.queue.renew(job_id, chunk_index, self.worker_id, self.lease_seconds):
+                raise LeaseLost(f"{job_id}/{chunk_index}")
+
+        try:
+            with timed('farm.render_chunk'):
+                render_sequence, _, meta = _render_job(job)
+                segment_paths, rendered = pipeline.get_dance_visualizer().render_segments(
+                    render_sequence, meta['dance_style'], views=meta.get('views'),
+                    frame_range=(chunk['start_frame'], chunk['end_frame']), on_segment=renew,
+                    framing=meta.get('framing')
+                )
+        except LeaseLost:
+            print(f"租约已失效，放弃分块 {job_id}/{chunk_index}")
+            return
+        except Exception as e:
+            print(f"分块渲染失败 {job_id}/{chunk_index}: {str(e)}")
+            self.queue.fail(job_id, chunk_index, self.worker_id, str(e) or type(e).__name__)
+            return
+
+        # 分段路径只记录文件名，各主机挂载共享目录的位置可以不同
+        accepted = self.queue.complete(job_id, chunk_index, self.worker_id, {
+            'segments': [path.name for path in segment_paths],
+            'rendered': rendered
+        })
+        count('farm_chunks_completed' if accepted else 'farm_chunks_discarded')
+
+
+def wait_for_job(job_id, queue=None, timeout=None):
+    """等待全部分块完成或任务失败，返回任务状态"""
+    queue = queue or WorkQueue()
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        status = queue.status(job_id)
+        if status['state'] != 'running' or status['chunks'].get('done', 0) == status['chunk_count']:
+            return status
+        if deadline is not None and time.time() >= deadline:
+            raise TimeoutError(f"渲染任务 {job_id} 等待超时")
+        time.sleep(FARM_CONFIG['poll_interval'])
+
+
+def finalize_job(job_id, queue=None):
+    """全部分块完成后拼接分段并合入音轨，保存报告；返回报告"""
+    queue = queue or WorkQueue()
+    status = queue.status(job_id)
+    if status['state'] == 'failed':
+        raise Exception(f"渲染任务失败: {status['error']}")
+    if status['chunks'].get('done', 0) != status['chunk_count']:
+        raise Exception(f"渲染任务尚未完成: {status['chunks']}")
+
+    job = status['payload']
+    _, render_music, meta = _render_job(job)
+    results = queue.results(job_id)
+    segment_paths = [SEGMENT_DIR / name for _, _, result in results for name in result['segments']]
+
+    output_path = str(OUTPUT_DIR / job['output'])
+    with timed('farm.concat'):
+        pipeline.get_dance_visualizer().concat_segments(segment_paths, render_music, output_path,
+                                                        job['total_frames'])
+
+    rendered = sum(result['rendered'] for _, _, result in results)
+    report = {
+        'generation_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'music_file': meta['music_file'],
+        'dance_style': meta['dance_style'],
+        'sequence_id': job['sequence_id'],
+        'practice_speed': job['practice_speed'],
+        'farm': {
+            'job_id': job_id,
+            'chunks': len(results),
+            'workers': sorted({worker for worker, _, _ in results}),
+            'retried_chunks': sum(1 for _, attempts, _ in results if attempts > 1)
+        },
+        'segments': {
+            'segments': len(segment_paths),
+            'rendered': rendered,
+            'reused': len(segment_paths) - rendered
+        },
+        'output_files': {
+            'video': job['output']
+        }
+    }
+    report['output_files']['report'] = pipeline.save_report(report)
+    queue.finish(job_id, 'done', result=report)
+    pipeline.evict_render_cache()
+    return report
+
+
+def _worker_main(queue_path, worker_id, idle_exit):
+    """本机工作进程的入口（spawn 方式启动）"""
+    FarmWorker(WorkQueue(queue_path), worker_id=worker_id).run(idle_exit=idle_exit)
+
+
+def run_workers(job_id, workers, queue_path=None, target=None, timeout=None):
+    """在本机启动多个工作进程并等待任务结束，返回任务状态
+
+    工作进程意外退出（被杀死、崩溃）时，它持有的分块立即放回队列并启动新的进程接替，
+    不必等租约过期；重启次数超过 工作进程数 × max_attempts 时任务失败。
+    队列空闲后工作进程自行退出，任务未结束而工作进程全部退出时同样重新启动。
+    """
+    queue_path = str(queue_path or FARM_CONFIG['queue_path'])
+    queue = WorkQueue(queue_path)
+    target = target or _worker_main
+    idle_exit = 2 * FARM_CONFIG['poll_interval']
+    max_restarts = workers * FARM_CONFIG['max_attempts']
+    deadline = None if timeout is None else time.time() + timeout
+
+    # spawn 方式启动，与服务端的后台任务进程池一致
+    context = multiprocessing.get_context('spawn')
+    started = 0
+    crashes = 0
+
+    def start():
+        nonlocal started
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:local-{started}"
+        started += 1
+        process = context.Process(target=target, args=(queue_path, worker_id, idle_exit),
+                                  name=f'farm-worker-{worker_id}')
+        process.start()
+        return worker_id, process
+
+    processes = [start() for _ in range(workers)]
+    try:
+        while True:
+            status = queue.status(job_id)
+            if status['state'] != 'running' or status['chunks'].get('done', 0) == status['chunk_count']:
+                return status
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(f"渲染任务 {job_id} 等待超时")
+
+            for i, (worker_id, process) in enumerate(processes):
+                if process.is_alive() or process.exitcode == 0:
+                    continue
+                released = queue.release(worker_id)
+                print(f"工作进程 {worker_id} 意外退出（exitcode={process.exitcode}），放回 {released} 个分块")
+                crashes += 1
+                if crashes > max_restarts:
+                    queue.finish(job_id, 'failed', error=f"工作进程 {crashes} 次意外退出")
+                    return queue.status(job_id)
+                processes[i] = start()
+
+            if not any(process.is_alive() for _, process in processes):
+                processes = [start() for _ in range(workers)]
+            time.sleep(FARM_CONFIG['poll_interval'])
+    finally:
+        for _, process in processes:
+            process.join(timeout=idle_exit + FARM_CONFIG['poll_interval'])
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def run_local(sequence_id, workers, practice_speed=None, chunk_seconds=None, queue_path=None):
+    """在本机启动多个工作进程完成一个渲染任务，返回报告"""
+    queue_path = str(queue_path or FARM_CONFIG['queue_path'])
+    queue = WorkQueue(queue_path)
+    job_id = submit_render(sequence_id, practice_speed, chunk_seconds, queue)
+
+    status = run_workers(job_id, workers, queue_path)
+    if status['state'] == 'failed':
+        raise Exception(f"渲染任务失败: {status['error']}")
+    return finalize_job(job_id, queue)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""骨架定义：关节名称、父关节、静止姿态和颜色，生成、渲染、队形和动作分析共用同一份定义
+
+序列的形状为 (T, J, 3)，J 为骨架的关节数，数据类型为 SEQUENCE_DTYPE。
+其他骨架布局（如 COCO、SMPL）按相同的字段在 SKELETONS 中注册即可。
+"""
+
+import numpy as np
+
+from config import DANCE_CONFIG
+
+SEQUENCE_DTYPE = np.dtype(DANCE_CONFIG['dtype'])
+
+
+class Skeleton:
+    def __init__(self, name, joints, limb_colors):
+        """joints: (名称, 父关节名称, 静止姿态坐标, 关节颜色, 肢体) 列表，父关节须在子关节之前
+
+        静止姿态 Y 轴向上；骨骼颜色取子关节所属肢体的颜色（BGR）。
+        """
+        self.name = name
+        self.joint_names = [joint[0] for joint in joints]
+        self.joint_count = len(self.joint_names)
+        self.joint_index = {joint_name: i for i, joint_name in enumerate(self.joint_names)}
+
+        self.parents = np.array([self.joint_index[parent] if parent else -1 for _, parent, _, _, _ in joints])
+        if np.any(self.parents >= np.arange(self.joint_count)):
+            raise Exception(f"骨架 {name} 的父关节必须排在子关节之前")
+
+        self.rest_pose = np.array([joint[2] for joint in joints], dtype=SEQUENCE_DTYPE)
+        self.joint_colors = [tuple(joint[3]) for joint in joints]
+        self.limbs = [joint[4] for joint in joints]
+
+        # (父关节, 子关节) 按子关节序号排列
+        self.bones = [(int(parent), child) for child, parent in enumerate(self.parents) if parent >= 0]
+        self.bone_colors = [tuple(limb_colors[self.limbs[child]]) for _, child in self.bones]
+
+    def index(self, name):
+        """关节序号，名称不存在时抛出 KeyError"""
+        return self.joint_index[name]
+
+    def mirror_permutation(self):
+        """左右镜像时互换 left_*/right_* 关节的索引"""
+        permutation = np.arange(self.joint_count)
+        for name, index in self.joint_index.items():
+            if name.startswith('left_'):
+                partner = self.joint_index.get('right_' + name[len('left_'):])
+                if partner is not None:
+                    permutation[index] = partner
+                    permutation[partner] = index
+        return permutation
+
+    def conform(self, sequence):
+        """把 (..., J', 3) 序列转换为本骨架的关节数和数据类型
+
+        旧版本保存的序列带有多余的全零关节，直接截掉。
+        """
+        sequence = np.asarray(sequence)
+        if sequence.shape[-2] < self.joint_count:
+            raise ValueError(f"序列只有 {sequence.shape[-2]} 个关节，骨架 {self.name} 需要 {self.joint_count} 个")
+        return sequence[..., :self.joint_count, :].astype(SEQUENCE_DTYPE, copy=False)
+
+
+SKELETONS = {
+    # 17个关节的舞蹈骨架，舞蹈动作库按此布局编写
+    'dance17': Skeleton('dance17', [
+        ('root', None, (0, 0, 0), (255, 0, 0), 'spine'),  # 红色
+        ('spine', 'root', (0, 0.1, 0), (255, 128, 0), 'spine'),  # 橙色
+        ('chest', 'spine', (0, 0.2, 0), (255, 255, 0), 'spine'),  # 黄色
+        ('neck', 'chest', (0, 0.25, 0), (0, 255, 0), 'spine'),  # 绿色
+        ('head', 'neck', (0, 0.3, 0), (0, 255, 255), 'spine'),  # 青色
+
+        ('left_shoulder', 'chest', (-0.1, 0.2, 0), (0, 128, 255), 'left_arm'),  # 浅蓝
+        ('left_elbow', 'left_shoulder', (-0.2, 0.2, 0), (0, 0, 255), 'left_arm'),  # 蓝色
+        ('left_wrist', 'left_elbow', (-0.3, 0.2, 0), (128, 0, 255), 'left_arm'),  # 紫色
+
+        ('right_shoulder', 'chest', (0.1, 0.2, 0), (255, 0, 255), 'right_arm'),  # 粉色
+        ('right_elbow', 'right_shoulder', (0.2, 0.2, 0), (255, 0, 128), 'right_arm'),  # 玫瑰色
+        ('right_wrist', 'right_elbow', (0.3, 0.2, 0), (128, 128, 128), 'right_arm'),  # 灰色
+
+        ('left_hip', 'spine', (-0.05, 0.1, 0), (0, 255, 128), 'left_leg'),  # 春绿色
+        ('left_knee', 'left_hip', (-0.05, 0, 0), (128, 255, 0), 'left_leg'),  # 黄绿色
+        ('left_ankle', 'left_knee', (-0.05, -0.1, 0), (255, 128, 128), 'left_leg'),  # 浅红
+
+        ('right_hip', 'spine', (0.05, 0.1, 0), (128, 0, 128), 'right_leg'),  # 深紫
+        ('right_knee', 'right_hip', (0.05, 0, 0), (0, 128, 128), 'right_leg'),  # 橄榄色
+        ('right_ankle', 'right_knee', (0.05, -0.1, 0), (128, 128, 0), 'right_leg'),  # 土黄色
+    ], limb_colors={
+        'spine': (0, 128, 255),  # 橙色
+        'left_arm': (255, 0, 0),  # 蓝色
+        'right_arm': (0, 0, 255),  # 红色
+        'left_leg': (0, 255, 0),  # 绿色
+        'right_leg': (255, 0, 255)  # 紫色
+    })
+}
+
+
+def get_skeleton(name=None):
+    """按名称获取骨架，默认为 DANCE_CONFIG['skeleton']"""
+    name = name or DANCE_CONFIG['skeleton']
+    if name not in SKELETONS:
+        raise Exception(f"不支持的骨架: {name}")
+    return SKELETONS[name]
@@ -2,139 +2,410 @@
 # -*- coding: utf-8 -*-
 """舞蹈可视化模块"""
 
+import hashlib
+import io
+import os
+import shutil
+import threading
 import numpy as np
-import cv2
-from moviepy.editor import VideoClip, AudioFileClip, CompositeVideoClip
-from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 from pathlib import Path
-from config import DANCE_STYLES
+from config import DANCE_STYLES, SEGMENT_DIR, SEGMENT_CONFIG, RENDER_CONFIG
+from models.camera import Camera, layout_viewports, project_views
+from models.rasterizer import GlyphAtlas, FrameRasterizer
+from models.render_backends import get_render_backend
+from models.skeleton import get_skeleton
+from utils.cache import atomic_write_bytes, touch
+from utils.audio_assets import audio_track
+from utils.ffmpeg_utils import VideoEncoder, concat_videos, mux_audio
+from utils.profiling import timed, timed_iter, count
+
+# OpenCV、matplotlib 在首次渲染时才导入，避免拖慢应用启动
 
 
 class DanceVisualizer:
-    def __init__(self, frame_rate=30, width=800, height=600):
+    # 画面绘制方式变化时递增，使已缓存的分段失效
+    SEGMENT_VERSION = 5
+
+    def __init__(self, frame_rate=30, width=800, height=600, backend=None, skeleton=None):
         self.frame_rate = frame_rate
         self.width = width
         self.height = height
 
-        # 定义关节连接关系
-        self.bone_connections = [
-            (0, 1),  # 根节点 -> 髋部
-            (1, 2),  # 髋部 -> 胸部
-            (2, 3),  # 胸部 -> 颈部
-            (3, 4),  # 颈部 -> 头部
-
-            (2, 5),  # 胸部 -> 左肩
-            (5, 6),  # 左肩 -> 左肘
-            (6, 7),  # 左肘 -> 左腕
-
-            (2, 8),  # 胸部 -> 右肩
-            (8, 9),  # 右肩 -> 右肘
-            (9, 10),  # 右肘 -> 右腕
-
-            (1, 11),  # 髋部 -> 左髋
-            (11, 12),  # 左髋 -> 左膝
-            (12, 13),  # 左膝 -> 左踝
-
-            (1, 14),  # 髋部 -> 右髋
-            (14, 15),  # 右髋 -> 右膝
-            (15, 16),  # 右膝 -> 右踝
-        ]
-
-        # 关节颜色
-        self.joint_colors = [
-            (255, 0, 0),  # 红色 - 根节点
-            (255, 128, 0),  # 橙色 - 髋部
-            (255, 255, 0),  # 黄色 - 胸部
-            (0, 255, 0),  # 绿色 - 颈部
-            (0, 255, 255),  # 青色 - 头部
-
-            (0, 128, 255),  # 浅蓝 - 左肩
-            (0, 0, 255),  # 蓝色 - 左肘
-            (128, 0, 255),  # 紫色 - 左腕
-
-            (255, 0, 255),  # 粉色 - 右肩
-            (255, 0, 128),  # 玫瑰色 - 右肘
-            (128, 128, 128),  # 灰色 - 右腕
-
-            (0, 255, 128),  # 春绿色 - 左髋
-            (128, 255, 0),  # 黄绿色 - 左膝
-            (255, 128, 128),  # 浅红 - 左踝
-
-            (128, 0, 128),  # 深紫 - 右髋
-            (0, 128, 128),  # 橄榄色 - 右膝
-            (128, 128, 0),  # 土黄色 - 右踝
-        ]
-
-    def create_skeleton_video(self, dance_sequence, music_path, output_path, dance_style):
-        """创建骨骼动画视频"""
-        # 创建视频写入器
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        video_writer = cv2.VideoWriter(
-            output_path,
-            fourcc,
-            self.frame_rate,
-            (self.width, self.height)
-        )
+        # 骨骼线段和关节的绘制后端
+        self.backend = get_render_backend(backend)
+
+        # 群舞画面中前后排(Z)映射到纵向的比例
+        self.formation_depth_factor = 0.5
+
+        # 字形贴图（各线程共享）和每个线程自己的栅格化器（缓存背景、记录脏区域）
+        self._glyph_atlases = {}
+        self._local = threading.local()
+
+        # 骨架定义：骨骼连接、关节和骨骼颜色
+        self.skeleton = skeleton or get_skeleton()
+        self.bone_connections = self.skeleton.bones
+        self.joint_colors = self.skeleton.joint_colors
+
+        # 按颜色分组的骨骼连接，每组一次 cv2.polylines 调用
+        bone_groups = {}
+        for connection, color in zip(self.bone_connections, self.skeleton.bone_colors):
+            bone_groups.setdefault(color, []).append(connection)
+        self.bone_groups = [(color, np.array(connections)) for color, connections in bone_groups.items()]
+
+    def warm_up(self):
+        """预热：导入 OpenCV，并渲染一帧"""
+        with timed('warm_up.render'):
+            pose = self.skeleton.rest_pose[None]
+            render_frame, _ = self._skeleton_frame_renderer(pose, next(iter(DANCE_STYLES)))
+            render_frame(0)
+
+    def create_skeleton_video(self, dance_sequence, music_path, output_path, dance_style, views=None):
+        """创建骨骼动画视频，views 为相机预设名称列表时按透视相机渲染多视角画面"""
+        if views:
+            render_frame, _ = self._camera_frame_renderer(dance_sequence, dance_style, views)
+        else:
+            render_frame, _ = self._skeleton_frame_renderer(dance_sequence, dance_style)
+        frames = (render_frame(frame_idx) for frame_idx in range(len(dance_sequence)))
+        return self._write_video(frames, music_path, output_path)
+
+    def create_formation_video(self, formation_sequence, music_path, output_path, dance_style):
+        """创建群舞骨骼动画视频
+
+        formation_sequence 为 (N, T, J, 3)，每一帧在同一次渲染中绘制全部舞者。
+        """
+        render_frame, _ = self._formation_frame_renderer(formation_sequence, dance_style)
+        frames = (render_frame(frame_idx) for frame_idx in range(formation_sequence.shape[1]))
+        return self._write_video(frames, music_path, output_path)
+
+    def create_segmented_video(self, sequence, music_path, output_path, dance_style, segment_dir=None,
+                               on_segment=None, views=None, framing=None):
+        """按固定时长分段渲染视频，再无重编码地拼接并合入音频
+
+        sequence 为单人 (T, J, 3) 或群舞 (N, T, J, 3)。分段按其内容哈希命名，
+        内容未变化的分段直接复用已编码的文件，因此局部修改后只重新渲染受影响的分段。
+        每个分段就绪后调用 on_segment(segment_path, start_time, duration)，可用于边渲染边播放。
+        views 为相机预设名称列表时按透视相机渲染多视角画面。framing 为 framing() 返回的取景参数，
+        不指定时按整段序列计算。
+        返回分段统计 {'segments', 'rendered', 'reused'}。
+        """
+        segment_paths, rendered = self.render_segments(sequence, dance_style, segment_dir=segment_dir,
+                                                       on_segment=on_segment, views=views, framing=framing)
+        total_frames = sequence.shape[1] if sequence.ndim == 4 else len(sequence)
+        self.concat_segments(segment_paths, music_path, output_path, total_frames)
+
+        return {
+            'segments': len(segment_paths),
+            'rendered': rendered,
+            'reused': len(segment_paths) - rendered
+        }
+
+    def segment_frames(self):
+        """每个分段的帧数"""
+        return max(1, int(SEGMENT_CONFIG['segment_seconds'] * self.frame_rate))
+
+    def render_segments(self, sequence, dance_style, segment_dir=None, on_segment=None, views=None,
+                        frame_range=None, framing=None):
+        """渲染（或复用）分段，返回 (分段路径列表, 新渲染的分段数)
+
+        frame_range 为 (开始帧, 结束帧) 时只处理起始帧在该范围内的分段；
+        画面缩放等仍按整段序列计算（或使用 framing），所以分批渲染的分段与一次渲染的完全相同，可以直接拼接。
+        """
+        segment_dir = Path(segment_dir or SEGMENT_DIR)
+        segment_dir.mkdir(parents=True, exist_ok=True)
+
+        if sequence.ndim == 4:
+            total_frames = sequence.shape[1]
+            frame_data = lambda start, end: sequence[:, start:end]
+        else:
+            total_frames = len(sequence)
+            frame_data = lambda start, end: sequence[start:end]
+
+        framing = self._resolve_framing(sequence, views, framing)
+        if views:
+            render_frame, layout = self._camera_frame_renderer(sequence, dance_style, views, framing)
+        elif sequence.ndim == 4:
+            render_frame, layout = self._formation_frame_renderer(sequence, dance_style, framing)
+        else:
+            render_frame, layout = self._skeleton_frame_renderer(sequence, dance_style, framing=framing)
+
+        segment_frames = self.segment_frames()
+        first, last = frame_range or (0, total_frames)
+        segment_paths = []
+        rendered = 0
+        for start in range(0, total_frames, segment_frames):
+            if not first <= start < last:
+                continue
+            end = min(start + segment_frames, total_frames)
+            key = self._segment_key(frame_data(start, end), start, end, total_frames, dance_style, layout)
+            segment_path = segment_dir / f"seg_{key}.mp4"
+
+            if segment_path.exists():
+                touch(segment_path)
+                count('segments_reused')
+            else:
+                with timed('render_segment'):
+                    self._render_segment(render_frame, start, end, segment_path)
+                count('segments_rendered')
+                rendered += 1
+            segment_paths.append(segment_path)
+
+            if on_segment is not None:
+                on_segment(segment_path, start / self.frame_rate, (end - start) / self.frame_rate)
+
+        return segment_paths, rendered
+
+    def concat_segments(self, segment_paths, music_path, output_path, total_frames):
+        """无重编码地拼接分段并合入缓存的音轨"""
+        with timed('segment_concat'):
+            try:
+                # 音轨每首歌只编码一次，拼接时直接复制
+                with timed('audio_mux'):
+                    track_path = audio_track(music_path)
+                concat_videos(segment_paths, output_path, audio_path=track_path,
+                              duration=total_frames / self.frame_rate, copy_audio=True)
+            except Exception as e:
+                # 与 _add_audio_to_video 一致：音频合成失败时仍输出无声视频
+                print(f"添加音频失败: {str(e)}")
+                concat_videos(segment_paths, output_path)
+        return output_path
+
+    def _render_segment(self, render_frame, start, end, segment_path):
+        """渲染 [start, end) 帧并编码为独立的分段文件"""
+        # 先写临时文件再重命名，并发渲染同一分段时不会读到写了一半的文件
+        temp_path = segment_path.with_name(f".{segment_path.stem}.{os.getpid()}.{threading.get_ident()}.mp4")
+        with VideoEncoder(temp_path, self.width, self.height, self.frame_rate) as encoder:
+            for frame_idx in range(start, end):
+                frame = render_frame(frame_idx)
+                with timed('encode_frame'):
+                    encoder.write(frame)
+                count('frames_rendered')
+        os.replace(temp_path, segment_path)
+
+    def _segment_key(self, frame_data, start, end, total_frames, dance_style, layout):
+        """分段内容哈希：分段内的姿态数据和所有影响画面的参数"""
+        digest = hashlib.sha1()
+        digest.update(repr((self.SEGMENT_VERSION, self.backend.name, self.skeleton.name, dance_style, self.width, self.height,
+                            self.frame_rate, start, end, total_frames, layout, SEGMENT_CONFIG['codec'],
+                            SEGMENT_CONFIG['preset'], SEGMENT_CONFIG['crf'])).encode('utf-8'))
+        digest.update(np.ascontiguousarray(frame_data).tobytes())
+        return digest.hexdigest()
+
+    def framing(self, sequence, views=None, fit=None):
+        """整段画面的取景参数（缩放、偏移或相机位置），可以 JSON 保存
+
+        生成时保存在序列元数据中，局部重新生成和按练习速度渲染时沿用，
+        修改一段动作后其他分段的画面不变，可以继续复用。
+        """
+        if views:
+            formation = sequence if sequence.ndim == 4 else sequence[None]
+            points = formation.reshape(-1, 3)
+            cameras = [Camera.from_preset(name).fit(points) for name in views]
+            return {'kind': 'camera', 'views': list(views),
+                    'cameras': [{'target': camera.target.tolist(), 'distance': float(camera.distance)}
+                                for camera in cameras]}
+        if sequence.ndim == 4:
+            scale, offset_x, offset_y = self._calculate_formation_transform(self._formation_projection(sequence))
+            return {'kind': 'formation', 'scale': float(scale), 'offset_x': float(offset_x),
+                    'offset_y': float(offset_y)}
+
+        # 逐帧缩放(frame)只取决于当前帧，不需要保存
+        fit = fit or RENDER_CONFIG['camera_fit']
+        scale = None
+        if fit == 'global' and len(sequence):
+            scale = float(self._calculate_transform(sequence, fit)[0][0])
+        return {'kind': 'skeleton', 'fit': fit, 'scale': scale}
+
+    def _resolve_framing(self, sequence, views=None, framing=None):
+        """沿用与当前画面类型一致的取景参数，否则按整段序列重新计算"""
+        if framing:
+            if views and framing.get('kind') == 'camera' and framing.get('views') == list(views):
+                return framing
+            if not views and sequence.ndim == 4 and framing.get('kind') == 'formation':
+                return framing
+            if not views and sequence.ndim == 3 and framing.get('kind') == 'skeleton' \
+                    and framing.get('fit') == RENDER_CONFIG['camera_fit']:
+                return framing
+        return self.framing(sequence, views)
+
+    def _skeleton_frame_renderer(self, dance_sequence, dance_style, fit=None, framing=None):
+        """返回单人视频的逐帧渲染函数和影响整段画面的布局参数
+
+        整段序列在渲染前一次性投影为整数像素坐标，逐帧只做绘制调用。
+        """
+        fit = fit or RENDER_CONFIG['camera_fit']
+        total_frames = len(dance_sequence)
+        scale, offset_x, offset_y = self._calculate_transform(dance_sequence, fit)
+        if fit == 'global' and framing and framing.get('scale') is not None:
+            scale = np.full(total_frames, framing['scale'])
+        points, visible = self._project(dance_sequence[..., :2], scale, offset_x, offset_y)
+
+        def render_frame(frame_idx):
+            raster = self._begin_frame(dance_style, frame_idx, total_frames)
+            self._draw_skeleton(raster, points[frame_idx], visible[frame_idx])
+            return raster.frame
+
+        # 按帧缩放时每帧的变换只取决于该帧的姿态，不影响其他分段
+        layout = (fit, float(scale[0])) if fit == 'global' else (fit,)
+        return render_frame, layout
+
+    def _formation_projection(self, formation_sequence):
+        """把场地前后位置(Z)斜投影到画面纵向，返回 (N, T, J, 2)"""
+        projected = formation_sequence[..., :2].copy()
+        projected[..., 1] += formation_sequence[..., 2] * self.formation_depth_factor
+        return projected
+
+    def _formation_frame_renderer(self, formation_sequence, dance_style, framing=None):
+        """返回群舞的逐帧渲染函数和影响整段画面的布局参数"""
+        total_frames = formation_sequence.shape[1]
+        projected = self._formation_projection(formation_sequence)
+
+        # 全局统一的缩放，避免多人画面逐帧抖动
+        framing = framing or self.framing(formation_sequence)
+        scale, offset_x, offset_y = framing['scale'], framing['offset_x'], framing['offset_y']
+        points, visible = self._project(projected, scale, offset_x, offset_y)
+
+        # 后排舞者先画，前排覆盖在上面
+        draw_order = np.argsort(-formation_sequence[:, 0, 0, 2], kind='stable')
+        joint_radius = int(np.clip(scale * 0.02, 2, 8))
+
+        def render_frame(frame_idx):
+            raster = self._begin_frame(dance_style, frame_idx, total_frames)
+            for dancer_idx in draw_order:
+                self._draw_skeleton(raster, points[dancer_idx, frame_idx], visible[dancer_idx, frame_idx],
+                                    draw_labels=False, joint_radius=joint_radius)
+            return raster.frame
+
+        layout = (float(scale), float(offset_x), float(offset_y), tuple(draw_order.tolist()), joint_radius)
+        return render_frame, layout
+
+    def _camera_frame_renderer(self, sequence, dance_style, views, framing=None):
+        """返回透视相机多视角的逐帧渲染函数和布局参数
+
+        sequence 为单人 (T, J, 3) 或群舞 (N, T, J, 3)。全部视角、舞者和帧在渲染前
+        通过一次批量矩阵乘法投影到各自的视口。
+        """
+        formation = sequence if sequence.ndim == 4 else sequence[None]
+        dancer_count, total_frames, joint_count = formation.shape[:3]
+        points = formation.transpose(1, 0, 2, 3).reshape(total_frames, dancer_count * joint_count, 3)
+
+        # 视口位于标题和进度条之间；相机位置按整段序列确定（或沿用保存的取景参数）
+        framing = framing or self.framing(sequence, views)
+        cameras = []
+        for name, fitted in zip(views, framing['cameras']):
+            camera = Camera.from_preset(name)
+            camera.target = np.asarray(fitted['target'], dtype=np.float64)
+            camera.distance = fitted['distance']
+            cameras.append(camera)
+        viewports = layout_viewports(len(cameras), 10, 100, self.width - 20, self.height - 180)
+        pixels, visible, depth = project_views(points, cameras, viewports, self.frame_rate)
+
+        shape = (len(cameras), total_frames, dancer_count, joint_count)
+        pixels = pixels.reshape(shape + (2,))
+        visible = visible.reshape(shape)
+        # 每帧按舞者的平均深度由远到近绘制
+        draw_order = np.argsort(-depth.reshape(shape).mean(axis=-1), axis=-1, kind='stable')
+
+        view_w = min(w for _, _, w, _ in viewports)
+        view_h = min(h for _, _, _, h in viewports)
+        joint_radius = int(np.clip(min(view_w, view_h) * 0.02 / np.sqrt(dancer_count), 2, 8))
+        draw_labels = dancer_count == 1 and len(cameras) == 1
+        label_atlas = self._get_atlas(0.5)
+
+        def render_frame(frame_idx):
+            raster = self._begin_frame(dance_style, frame_idx, total_frames)
+            for view_idx, (x, y, w, h) in enumerate(viewports):
+                if len(viewports) > 1:
+                    raster.draw_text(label_atlas, cameras[view_idx].name.upper(), (x + 8, y + 18), (90, 90, 90))
+                for dancer_idx in draw_order[view_idx, frame_idx]:
+                    self._draw_skeleton(raster, pixels[view_idx, frame_idx, dancer_idx],
+                                        visible[view_idx, frame_idx, dancer_idx],
+                                        draw_labels=draw_labels, joint_radius=joint_radius)
+            return raster.frame
+
+        layout = ('camera', tuple(camera.layout_key() for camera in cameras), tuple(viewports), joint_radius)
+        return render_frame, layout
+
+    def _project(self, xy, scale, offset_x, offset_y):
+        """把 (..., J, 2) 的坐标一次性转换为整数像素坐标，返回 (坐标, 是否在画面内)
+
+        scale 可以是标量，也可以是与前导维度对应的逐帧数组。
+        """
+        scale = np.asarray(scale, dtype=np.float64)
+        if scale.ndim:
+            scale = scale.reshape(scale.shape + (1,) * (xy.ndim - 1 - scale.ndim))
+        points = np.empty(xy.shape, dtype=np.int32)
+        points[..., 0] = xy[..., 0] * scale + offset_x
+        points[..., 1] = -xy[..., 1] * scale + offset_y  # Y轴需要反转
+        visible = (points[..., 0] >= 0) & (points[..., 0] < self.width) & \
+                  (points[..., 1] >= 0) & (points[..., 1] < self.height)
+        return points, visible
+
+    def _write_video(self, frames, music_path, output_path):
+        """把帧序列编码为 H.264 视频并添加音频"""
+        silent_path = f"{os.path.splitext(output_path)[0]}_video.mp4"
+        frame_count = 0
 
         try:
-            # 创建每一帧
-            for frame_idx in range(len(dance_sequence)):
-                frame = self._create_frame(
-                    dance_sequence[frame_idx],
-                    frame_idx,
-                    len(dance_sequence),
-                    dance_style
-                )
-                video_writer.write(frame)
-
-            video_writer.release()
+            with VideoEncoder(silent_path, self.width, self.height, self.frame_rate) as encoder:
+                for frame in timed_iter(frames, 'render_frame'):
+                    with timed('encode_frame'):
+                        encoder.write(frame)
+                    count('frames_rendered')
+                    frame_count += 1
 
             # 添加音频
-            self._add_audio_to_video(output_path, music_path)
+            with timed('audio_mux'):
+                self._add_audio_to_video(silent_path, music_path, output_path, frame_count / self.frame_rate)
 
             return output_path
 
         except Exception as e:
             print(f"创建视频失败: {str(e)}")
-            if video_writer.isOpened():
-                video_writer.release()
             raise
 
-    def _create_frame(self, skeleton_pose, frame_idx, total_frames, dance_style):
-        """创建单帧图像"""
-        # 创建空白画布
-        frame = np.ones((self.height, self.width, 3), dtype=np.uint8) * 255
-
-        # 添加背景渐变
-        self._add_background_gradient(frame)
-
-        # 添加标题和信息
-        self._add_overlay_text(frame, dance_style, frame_idx, total_frames)
-
-        # 计算缩放和偏移，使骨骼适应画布
-        scale, offset_x, offset_y = self._calculate_transform(skeleton_pose)
-
-        # 绘制骨骼
-        frame = self._draw_skeleton(frame, skeleton_pose, scale, offset_x, offset_y)
-
+        finally:
+            if os.path.exists(silent_path):
+                os.remove(silent_path)
+
+    def _begin_frame(self, dance_style, frame_idx, total_frames):
+        """开始绘制一帧：恢复上一帧画过的区域并绘制进度信息，返回栅格化器"""
+        raster = self._get_rasterizer(dance_style)
+        raster.begin()
+        self._draw_progress(raster, frame_idx, total_frames)
+        return raster
+
+    def _get_rasterizer(self, dance_style):
+        """当前线程中该风格的栅格化器，背景只生成一次"""
+        rasterizers = getattr(self._local, 'rasterizers', None)
+        if rasterizers is None:
+            rasterizers = self._local.rasterizers = {}
+        raster = rasterizers.get(dance_style)
+        if raster is None:
+            raster = rasterizers[dance_style] = FrameRasterizer(self._create_background(dance_style))
+        return raster
+
+    def _get_atlas(self, font_scale, thickness=1):
+        atlas = self._glyph_atlases.get((font_scale, thickness))
+        if atlas is None:
+            atlas = self._glyph_atlases[(font_scale, thickness)] = GlyphAtlas(font_scale, thickness)
+        return atlas
+
+    def _create_background(self, dance_style):
+        """创建带渐变、标题和进度条底色的静态背景"""
+        # 从上到下的渐变
+        gradient = (255 - np.arange(self.height) / self.height * 100).astype(np.uint8)
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:, :, 0] = gradient[:, None]
+        frame[:, :, 1] = gradient[:, None]
+        frame[:, :, 2] = 255
+
+        self._add_static_overlay(frame, dance_style)
         return frame
 
-    def _add_background_gradient(self, frame):
-        """添加背景渐变"""
-        height, width = frame.shape[:2]
-
-        # 创建渐变
-        for y in range(height):
-            # 从上到下的渐变
-            gradient_value = int(255 - y / height * 100)
-            frame[y, :] = (gradient_value, gradient_value, 255)
-
-    def _add_overlay_text(self, frame, dance_style, frame_idx, total_frames):
-        """添加覆盖文本"""
+    def _add_static_overlay(self, frame, dance_style):
+        """添加不随帧变化的文字和进度条底色"""
+        import cv2
 
-        # 修改后：
         # 添加映射
         style_name_map = {
             "赛乃姆": "Sainaimu",
@@ -144,7 +415,6 @@ class DanceVisualizer:
         english_style = style_name_map.get(dance_style, dance_style)
         title = f"Dance - {english_style}"
 
-
         # 舞蹈风格英文描述
         style_desc_map = {
             "赛乃姆": "Uyghur traditional dance",
@@ -153,10 +423,6 @@ class DanceVisualizer:
         }
         subtitle = style_desc_map.get(dance_style, "")
 
-        # 进度信息
-        progress = (frame_idx + 1) / total_frames
-        time_str = f"{frame_idx // self.frame_rate:02d}:{frame_idx % self.frame_rate:02d}"
-
         # 绘制标题
         cv2.putText(frame, title, (20, 40),
                     cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2, cv2.LINE_AA)
@@ -165,48 +431,50 @@ class DanceVisualizer:
         cv2.putText(frame, subtitle, (20, 80),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (100, 100, 100), 1, cv2.LINE_AA)
 
-        # 绘制进度条
+        # 进度条背景
+        bar_x, bar_y, bar_width, bar_height = self._progress_bar_rect()
+        cv2.rectangle(frame, (bar_x, bar_y),
+                      (bar_x + bar_width, bar_y + bar_height),
+                      (200, 200, 200), -1)
+
+    def _progress_bar_rect(self):
         bar_width = 400
         bar_height = 20
         bar_x = (self.width - bar_width) // 2
         bar_y = self.height - 60
+        return bar_x, bar_y, bar_width, bar_height
 
-        # 进度条背景
-        cv2.rectangle(frame, (bar_x, bar_y),
-                      (bar_x + bar_width, bar_y + bar_height),
-                      (200, 200, 200), -1)
+    def _draw_progress(self, raster, frame_idx, total_frames):
+        """绘制进度条前景、进度文本和帧编号（字形贴图合成）"""
+        progress = (frame_idx + 1) / total_frames
+        time_str = f"{frame_idx // self.frame_rate:02d}:{frame_idx % self.frame_rate:02d}"
+        bar_x, bar_y, bar_width, bar_height = self._progress_bar_rect()
 
-        # 进度条前景
+        # 进度条前景（与 cv2.rectangle 填充一致，包含右下边界）
         progress_width = int(bar_width * progress)
-        cv2.rectangle(frame, (bar_x, bar_y),
-                      (bar_x + progress_width, bar_y + bar_height),
-                      (0, 128, 255), -1)
+        raster.fill_rect(bar_x, bar_y, bar_x + progress_width + 1, bar_y + bar_height + 1, (0, 128, 255))
 
         # 进度文本
         total_time_str = f"{total_frames // self.frame_rate:02d}:{total_frames % self.frame_rate:02d}"
         progress_text = f"{time_str} / {total_time_str}"
-        cv2.putText(frame, progress_text, (bar_x + bar_width + 10, bar_y + bar_height // 2 + 5),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+        raster.draw_text(self._get_atlas(0.6), progress_text,
+                         (bar_x + bar_width + 10, bar_y + bar_height // 2 + 5), (0, 0, 0))
 
         # 帧编号
         frame_text = f"Frame: {frame_idx}/{total_frames}"
-        cv2.putText(frame, frame_text, (self.width - 150, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (100, 100, 100), 1, cv2.LINE_AA)
-    def _calculate_transform(self, skeleton_pose):
-        """计算骨骼变换参数"""
-        # 获取所有关节的坐标
-        all_points = []
-        for joint in skeleton_pose:
-            all_points.extend([joint[0], joint[1]])  # X和Y坐标
-
-        # 计算边界
-        min_val = min(all_points)
-        max_val = max(all_points)
-
-        # 计算缩放比例
-        range_val = max_val - min_val
-        if range_val == 0:
-            range_val = 1
+        raster.draw_text(self._get_atlas(0.6), frame_text, (self.width - 150, 40), (100, 100, 100))
+
+    def _calculate_transform(self, dance_sequence, fit='frame'):
+        """计算骨骼变换参数，返回 (逐帧缩放 (T,), 偏移x, 偏移y)
+
+        X、Y 坐标合在一起取范围；fit 为 global 时整段使用同一缩放。
+        """
+        values = dance_sequence[..., :2].reshape(len(dance_sequence), -1)
+        if fit == 'global':
+            range_val = np.full(len(dance_sequence), values.max() - values.min() if values.size else 0)
+        else:
+            range_val = values.max(axis=1) - values.min(axis=1)
+        range_val = np.where(range_val == 0, 1, range_val)
 
         # 计算缩放和偏移
         scale = min(self.width, self.height) * 0.7 / range_val
@@ -215,112 +483,71 @@ class DanceVisualizer:
 
         return scale, offset_x, offset_y
 
-    def _draw_skeleton(self, frame, skeleton_pose, scale, offset_x, offset_y):
-        """绘制骨骼"""
-        # 首先绘制骨骼连接
-        for connection in self.bone_connections:
-            joint1_idx, joint2_idx = connection
-
-            # 获取关节位置
-            joint1 = skeleton_pose[joint1_idx]
-            joint2 = skeleton_pose[joint2_idx]
-
-            # 转换到图像坐标
-            x1 = int(joint1[0] * scale + offset_x)
-            y1 = int(-joint1[1] * scale + offset_y)  # Y轴需要反转
-            x2 = int(joint2[0] * scale + offset_x)
-            y2 = int(-joint2[1] * scale + offset_y)
-
-            # 绘制骨骼（线条）
-            if 0 <= x1 < self.width and 0 <= y1 < self.height and \
-                    0 <= x2 < self.width and 0 <= y2 < self.height:
-                # 使用渐变色
-                color = self._get_bone_color(connection)
-                cv2.line(frame, (x1, y1), (x2, y2), color, 3, cv2.LINE_AA)
-
-        # 然后绘制关节
-        for i, joint in enumerate(skeleton_pose):
-            x = int(joint[0] * scale + offset_x)
-            y = int(-joint[1] * scale + offset_y)  # Y轴需要反转
-
-            if 0 <= x < self.width and 0 <= y < self.height:
-                # 绘制关节点
-                color = self.joint_colors[i % len(self.joint_colors)]
-                cv2.circle(frame, (x, y), 8, color, -1, cv2.LINE_AA)
+    def _calculate_formation_transform(self, projected):
+        """计算群舞画面的统一缩放和偏移，projected 为 (N, T, J, 2)"""
+        min_xy = projected.reshape(-1, 2).min(axis=0)
+        max_xy = projected.reshape(-1, 2).max(axis=0)
+        range_xy = np.maximum(max_xy - min_xy, 1e-6)
+        center_x, center_y = (min_xy + max_xy) / 2
 
-                # 关节编号
-                cv2.putText(frame, str(i), (x + 10, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1, cv2.LINE_AA)
+        scale = min(self.width * 0.85 / range_xy[0], (self.height - 180) * 0.85 / range_xy[1])
+        offset_x = self.width / 2 - center_x * scale
+        offset_y = self.height / 2 + 20 + center_y * scale  # Y轴反转
 
-        return frame
+        return scale, offset_x, offset_y
 
-    def _get_bone_color(self, connection):
-        """获取骨骼颜色"""
-        # 根据连接类型返回不同颜色
-        joint1, joint2 = connection
+    def _draw_skeleton(self, raster, points, visible, draw_labels=True, joint_radius=8):
+        """用预先投影好的整数坐标 (J, 2) 绘制骨骼，并把覆盖的区域记录为脏区域"""
+        frame = raster.frame
+        if not visible.any():
+            return frame
 
-        # 脊柱
-        if joint1 <= 4 and joint2 <= 4:
-            return (0, 128, 255)  # 橙色
+        # 首先绘制骨骼连接：两端都在画面内的骨骼按颜色分组一次绘制
+        for color, connections in self.bone_groups:
+            shown = connections[visible[connections[:, 0]] & visible[connections[:, 1]]]
+            if len(shown):
+                self.backend.draw_segments(frame, points[shown], color, 3)
 
-        # 手臂
-        elif 5 <= joint1 <= 10 and 5 <= joint2 <= 10:
-            if joint1 <= 7:  # 左臂
-                return (255, 0, 0)  # 蓝色
-            else:  # 右臂
-                return (0, 0, 255)  # 红色
+        # 然后绘制关节
+        joint_indices = np.flatnonzero(visible)
+        self.backend.draw_disks(frame, points[joint_indices], joint_radius,
+                                [self.joint_colors[i] for i in joint_indices])
+
+        # 关节编号
+        if draw_labels:
+            label_atlas = self._get_atlas(0.4)
+            for i in joint_indices:
+                raster.draw_text(label_atlas, str(i), (int(points[i, 0]) + 10, int(points[i, 1]) - 10), (0, 0, 0))
+
+        # 线宽和关节半径向外扩展的像素
+        shown_points = points[visible]
+        margin = joint_radius + 3
+        min_x, min_y = shown_points.min(axis=0) - margin
+        max_x, max_y = shown_points.max(axis=0) + margin + 1
+        raster.mark((min_x, min_y, max_x, max_y))
 
-        # 腿
-        else:
-            if joint1 <= 13:  # 左腿
-                return (0, 255, 0)  # 绿色
-            else:  # 右腿
-                return (255, 0, 255)  # 紫色
+        return frame
 
-    def _add_audio_to_video(self, video_path, audio_path):
-        """添加音频到视频"""
+    def _add_audio_to_video(self, video_path, audio_path, output_path, duration=None):
+        """把缓存的 AAC 音轨无重编码地合入视频，音频截取到视频长度"""
         try:
-            from moviepy.editor import VideoFileClip, AudioFileClip
-
-            # 加载视频和音频
-            video = VideoFileClip(video_path)
-            audio = AudioFileClip(audio_path)
-
-            # 截取音频与视频等长
-            if audio.duration > video.duration:
-                audio = audio.subclip(0, video.duration)
-
-            # 合并音频视频
-            final_video = video.set_audio(audio)
-
-            # 输出临时文件
-            temp_path = video_path.replace('.mp4', '_temp.mp4')
-            final_video.write_videofile(
-                temp_path,
-                codec='libx264',
-                audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
-                remove_temp=True
-            )
-
-            # 替换原文件
-            import shutil
-            shutil.move(temp_path, video_path)
-
-            # 关闭剪辑
-            video.close()
-            audio.close()
-
+            mux_audio(video_path, audio_track(audio_path), output_path, duration)
         except Exception as e:
             print(f"添加音频失败: {str(e)}")
-            # 即使音频添加失败，也返回视频文件
+            # 即使音频添加失败，也输出无声视频
+            shutil.copyfile(video_path, output_path)
 
     def create_dance_analysis_image(self, dance_sequence, output_path):
         """创建舞蹈分析图像"""
-        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+        from matplotlib.figure import Figure
+
+        # 使用 Figure 而不是 pyplot，可以在后台线程中安全绘制
+        fig = Figure(figsize=(12, 10))
+        axes = fig.subplots(2, 2)
 
         # 提取关节轨迹
-        joints_to_plot = [0, 4, 7, 10, 13, 16]  # 根节点、头、双手、双脚
+        joints_to_plot = [self.skeleton.index(name) for name in
+                          ('root', 'head', 'left_wrist', 'right_wrist', 'left_ankle', 'right_ankle')]
         joint_names = ['Root', 'Head', 'Left Hand', 'Right Hand', 'Left Foot', 'Right Foot']
 
         # 1. X坐标轨迹
@@ -372,8 +599,9 @@ class DanceVisualizer:
         axes[1, 1].set_xticklabels(joint_names, rotation=45)
         axes[1, 1].grid(True, alpha=0.3, axis='y')
 
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        atomic_write_bytes(output_path, buffer.getvalue())
 
         return output_path
\ No newline at end of file
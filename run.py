@@ -5,6 +5,7 @@
 
 import sys
 import os
+import argparse
 from pathlib import Path
 
 # 添加项目根目录到Python路径
@@ -12,6 +13,8 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from app import app
+from config import SERVER_CONFIG, PROFILING_CONFIG
+from models import pipeline
 
 
 def check_dependencies():
@@ -62,14 +65,91 @@ def print_banner():
     print(banner)
 
 
+def run_development(host, port):
+    """Flask开发服务器（带调试器和自动重载）"""
+    # 开发模式下默认允许单请求性能剖析
+    if PROFILING_CONFIG['allow_request_profiling'] is None:
+        PROFILING_CONFIG['allow_request_profiling'] = True
+
+    # 调试模式下由重载器启动的子进程负责服务，只在子进程中后台预热
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        pipeline.start_warm_up()
+
+    app.run(
+        host=host,
+        port=port,
+        debug=True,
+        threaded=True
+    )
+
+
+def run_production(host, port):
+    """生产模式：多进程WSGI服务器，每个工作进程持有自己的处理器单例和后台任务进程池"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class GunicornApplication(BaseApplication):
+            def __init__(self, application, options):
+                self.application = application
+                self.options = options
+                super().__init__()
+
+            def load_config(self):
+                for key, value in self.options.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return self.application
+
+        options = {
+            'bind': f"{host}:{port}",
+            'workers': SERVER_CONFIG['workers'],
+            'threads': SERVER_CONFIG['threads'],
+            'worker_class': 'gthread',
+            'timeout': SERVER_CONFIG['timeout'],
+            'preload_app': False,
+            # fork 之后在每个工作进程中初始化单例、预热和后台进程池
+            'post_fork': lambda server, worker: pipeline.init_worker()
+        }
+        print(f"• 服务器: gunicorn ({SERVER_CONFIG['workers']} 个工作进程 × "
+              f"{SERVER_CONFIG['threads']} 线程, 每进程 {SERVER_CONFIG['job_workers']} 个任务进程)")
+        GunicornApplication(app, options).run()
+        return
+
+    try:
+        from waitress import serve
+    except ImportError:
+        print("错误: 生产模式需要安装 gunicorn (Linux/macOS) 或 waitress (Windows)")
+        print("pip install gunicorn waitress")
+        sys.exit(1)
+
+    # waitress 为单进程多线程，CPU密集任务全部交给后台任务进程池
+    job_workers = max(SERVER_CONFIG['job_workers'], SERVER_CONFIG['workers'])
+    print(f"• 服务器: waitress ({SERVER_CONFIG['threads']} 线程, {job_workers} 个任务进程)")
+    pipeline.init_worker(job_workers=job_workers)
+    serve(app, host=host, port=port, threads=SERVER_CONFIG['threads'],
+          channel_timeout=SERVER_CONFIG['timeout'])
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='音乐驱动舞蹈辅助排演系统')
+    parser.add_argument('--mode', choices=['development', 'production'],
+                        default=SERVER_CONFIG['mode'], help='运行模式（默认取 system_config.json）')
+    parser.add_argument('--host', default=SERVER_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    args = parser.parse_args()
+
     print_banner()
     check_dependencies()
 
     print("\n启动信息:")
+    print(f"• 运行模式: {args.mode}")
     print(f"• 项目根目录: {project_root}")
-    print(f"• Web界面: http://127.0.0.1:5000")
+    print(f"• Web界面: http://127.0.0.1:{args.port}")
     print(f"• 音乐文件目录: {project_root}/data/music")
     print(f"• 输出文件目录: {project_root}/data/outputs")
 
@@ -78,12 +158,10 @@ def main():
 
     # 启动Flask应用
     try:
-        app.run(
-            host='0.0.0.0',
-            port=5000,
-            debug=True,
-            threaded=True
-        )
+        if args.mode == 'production':
+            run_production(args.host, args.port)
+        else:
+            run_development(args.host, args.port)
     except KeyboardInterrupt:
         print("\n服务器已停止")
         sys.exit(0)
@@ -2,6 +2,7 @@
 let selectedMusic = null;
 let selectedStyle = null;
 let currentVideoUrl = null;
+let hlsPlayer = null;
 
 // DOM加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -339,6 +340,12 @@ async function generateDance() {
         options: options
     };
 
+    // 支持 HLS 时使用流式生成，第一个分段完成后即可预览
+    if (supportsStreaming()) {
+        await generateDanceStream(requestData);
+        return;
+    }
+
     try {
         const response = await fetch('/api/generate_dance', {
             method: 'POST',
@@ -381,6 +388,92 @@ async function generateDance() {
     }
 }
 
+// 浏览器是否能播放 HLS（hls.js 或原生支持）
+function supportsStreaming() {
+    if (window.Hls && Hls.isSupported()) return true;
+    return document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+}
+
+// 流式生成：轮询任务状态，播放列表出现第一个分段后开始播放
+async function generateDanceStream(requestData) {
+    const progressDetails = document.getElementById('progressDetails');
+
+    try {
+        const response = await fetch('/api/generate_stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(requestData)
+        });
+
+        const data = await response.json();
+        if (!data.success) {
+            progressDetails.innerHTML = `<p class="error">生成失败: ${data.error}</p>`;
+            showNotification(`生成失败: ${data.error}`, 'error');
+            return;
+        }
+
+        updateProgressStep(2, '正在生成舞蹈序列...');
+        let playing = false;
+
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            if (!playing) {
+                const playlist = await fetch(data.playlist_url);
+                if (playlist.ok && (await playlist.text()).includes('#EXTINF')) {
+                    updateProgressStep(3, '正在创建可视化视频，已可预览...');
+                    showStreamVideo(data.playlist_url);
+                    playing = true;
+                }
+            }
+
+            const status = await (await fetch(data.status_url)).json();
+            if (status.state === 'done') {
+                updateProgressStep(4, '生成完成！');
+                currentVideoUrl = status.video_url;
+                if (!playing) showPreviewVideo(status.video_url);
+                updateAnalysisData(status.report);
+                showNotification('舞蹈生成成功！', 'success');
+                loadResultsList();
+                return;
+            }
+            if (status.state === 'failed' || status.error) {
+                progressDetails.innerHTML = `<p class="error">生成失败: ${status.error}</p>`;
+                showNotification(`生成失败: ${status.error}`, 'error');
+                return;
+            }
+        }
+
+    } catch (error) {
+        progressDetails.innerHTML = `<p class="error">网络错误: ${error.message}</p>`;
+        showNotification('网络错误，请检查连接', 'error');
+    }
+}
+
+// 播放 HLS 流
+function showStreamVideo(playlistUrl) {
+    const previewSection = document.getElementById('previewSection');
+    const videoElement = document.getElementById('previewVideo');
+
+    if (hlsPlayer) {
+        hlsPlayer.destroy();
+        hlsPlayer = null;
+    }
+
+    previewSection.style.display = 'block';
+    if (window.Hls && Hls.isSupported()) {
+        hlsPlayer = new Hls();
+        hlsPlayer.loadSource(playlistUrl);
+        hlsPlayer.attachMedia(videoElement);
+    } else {
+        videoElement.src = playlistUrl;
+    }
+
+    previewSection.scrollIntoView({ behavior: 'smooth' });
+}
+
 // 更新进度步骤
 function updateProgressStep(stepNumber, message) {
     // 更新步骤状态
@@ -419,6 +512,13 @@ function showPreviewVideo(videoUrl) {
     const videoSource = document.getElementById('videoSource');
     const videoOverlay = document.getElementById('videoOverlay');
 
+    // 停止可能正在播放的 HLS 流
+    if (hlsPlayer) {
+        hlsPlayer.destroy();
+        hlsPlayer = null;
+    }
+    videoElement.removeAttribute('src');
+
     previewSection.style.display = 'block';
     videoSource.src = videoUrl;
     videoElement.load();
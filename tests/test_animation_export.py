@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""动画导出：BVH 按层级做正向运动学后应还原源序列的关节位置"""
+
+import random
+
+import numpy as np
+import pytest
+
+from models.animation_export import AnimationExporter, RotationSolver
+from models.dance_generator import DanceGenerator
+from models.skeleton import get_skeleton
+
+
+def axis_angle(axes, angles):
+    """轴角 -> 旋转矩阵 (..., 3, 3)"""
+    axes = axes / np.linalg.norm(axes, axis=-1, keepdims=True)
+    skew = np.zeros(axes.shape[:-1] + (3, 3))
+    skew[..., 0, 1], skew[..., 0, 2] = -axes[..., 2], axes[..., 1]
+    skew[..., 1, 0], skew[..., 1, 2] = axes[..., 2], -axes[..., 0]
+    skew[..., 2, 0], skew[..., 2, 1] = -axes[..., 1], axes[..., 0]
+    angles = angles[..., None, None]
+    return np.eye(3) + np.sin(angles) * skew + (1 - np.cos(angles)) * skew @ skew
+
+
+def forward(parents, offsets, local, root):
+    """正向运动学：局部旋转 (T, J, 3, 3) -> 关节位置 (T, J, 3)"""
+    positions = np.zeros(local.shape[:2] + (3,))
+    world = np.zeros_like(local)
+    for joint, parent in enumerate(parents):
+        if parent < 0:
+            world[:, joint] = local[:, joint]
+            positions[:, joint] = root
+        else:
+            world[:, joint] = world[:, parent] @ local[:, joint]
+            positions[:, joint] = positions[:, parent] + world[:, parent] @ offsets[joint]
+    return positions
+
+
+def parse_bvh(text):
+    """返回 (关节名称, 父关节, 偏移, 根节点位置 (T, 3), 局部旋转 (T, J, 3, 3))，通道顺序为 Z X Y"""
+    names, parents, offsets, stack = [], [], [], []
+    lines = text.split('\n')
+    motion = lines.index('MOTION')
+    end_site = False
+    for line in lines[1:motion]:
+        tokens = line.split()
+        if tokens[0] in ('ROOT', 'JOINT'):
+            parents.append(stack[-1] if stack else -1)
+            names.append(tokens[1])
+        elif tokens[0] == 'End':
+            end_site = True
+        elif tokens[0] == 'OFFSET' and not end_site:
+            offsets.append([float(value) for value in tokens[1:]])
+        elif tokens[0] == '{' and not end_site:
+            stack.append(len(names) - 1)
+        elif tokens[0] == '}':
+            if end_site:
+                end_site = False
+            else:
+                stack.pop()
+
+    values = np.loadtxt(lines[motion + 3:], ndmin=2)
+    angles = np.radians(values[:, 3:].reshape(len(values), len(names), 3))
+    unit = np.eye(3)
+    local = (axis_angle(unit[2], angles[..., 0]) @ axis_angle(unit[0], angles[..., 1])
+             @ axis_angle(unit[1], angles[..., 2]))
+    return names, parents, np.array(offsets), values[:, :3], local
+
+
+def export_positions(exporter, sequence):
+    """导出 BVH 后按文件中的层级重新计算关节位置，换算回源序列的坐标和关节顺序"""
+    names, parents, offsets, root, local = parse_bvh(''.join(exporter.bvh(sequence)))
+    positions = forward(parents, offsets, local, root)
+    unit = exporter.scale * exporter.config['bvh_units_per_meter']
+    order = [names.index(name) for name in exporter.skeleton.joint_names]
+    return positions[:, order] / unit + [0, exporter.ground, 0]
+
+
+def bone_angles(skeleton, positions, target):
+    """各骨骼方向的夹角（度），(T, 骨骼数)"""
+    bones = np.array(skeleton.bones)
+    a = positions[:, bones[:, 1]] - positions[:, bones[:, 0]]
+    b = target[:, bones[:, 1]] - target[:, bones[:, 0]]
+    cos = np.einsum('tbi,tbi->tb', a, b) / np.maximum(
+        np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1), 1e-12)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+@pytest.fixture
+def skeleton():
+    return get_skeleton()
+
+
+def test_bvh_round_trip_rigid(skeleton):
+    """骨骼长度与静止姿态一致的序列经 BVH 往返后位置不变"""
+    rng = np.random.default_rng(0)
+    frames = 200
+    offsets = RotationSolver(skeleton).offsets
+    local = axis_angle(rng.normal(size=(frames, skeleton.joint_count, 3)),
+                       rng.uniform(0, 2.5, size=(frames, skeleton.joint_count)))
+    sequence = forward(skeleton.parents, offsets, local, rng.normal(size=(frames, 3)) * 0.1)
+    sequence = sequence.astype(np.float32)
+
+    exporter = AnimationExporter(skeleton, 30, {'precision': 6})
+    positions = export_positions(exporter, sequence)
+    assert np.abs(positions - sequence).max() < 1e-4
+
+
+def test_multi_child_joints_fit_all_branches(skeleton):
+    """胸部的旋转兼顾全部子关节：只移动颈部时，肩部不会整体跟随颈部转动"""
+    rng = np.random.default_rng(1)
+    frames = 200
+    solver = RotationSolver(skeleton)
+    local = axis_angle(rng.normal(size=(frames, skeleton.joint_count, 3)),
+                       rng.uniform(0, 2.5, size=(frames, skeleton.joint_count)))
+    rigid = forward(skeleton.parents, solver.offsets, local, np.zeros(3))
+    sequence = rigid.copy()
+    neck, head = skeleton.index('neck'), skeleton.index('head')
+    sequence[:, [neck, head]] += rng.normal(size=(frames, 1, 3)) * 0.02
+
+    positions = forward(skeleton.parents, solver.offsets, solver.solve(sequence), np.zeros(3))
+    angles = bone_angles(skeleton, positions, sequence)
+    names = [skeleton.joint_names[child] for _, child in skeleton.bones]
+    moved = bone_angles(skeleton, rigid, sequence)[:, names.index('neck')]
+    shoulders = angles[:, [names.index('left_shoulder'), names.index('right_shoulder')]]
+    # 只对齐颈部时肩部的误差等于颈部转过的角度，最小二乘拟合后肩部基本不动，误差主要留在颈部
+    assert shoulders.mean() < 0.25 * moved.mean()
+    assert angles[:, names.index('neck')].mean() < moved.mean()
+    assert angles[:, [names.index('left_hip'), names.index('right_hip')]].max() < 1e-3
+
+
+def test_generated_sequence_bone_directions(skeleton):
+    """生成的序列骨骼长度不固定，但髋部等刚性分支的方向应基本还原"""
+    random.seed(1)
+    np.random.seed(1)
+    sequence = DanceGenerator().generate({'tempo': 110, 'duration': 10, 'beats': []}, '萨玛舞')
+    exporter = AnimationExporter(skeleton, 30, {'precision': 6})
+    angles = bone_angles(skeleton, export_positions(exporter, sequence), sequence.astype(np.float64))
+
+    names = [skeleton.joint_names[child] for _, child in skeleton.bones]
+    single_child = [i for i, (parent, _) in enumerate(skeleton.bones)
+                    if len(exporter.solver.children[parent]) == 1]
+    assert angles[:, single_child].max() < 0.1
+    assert angles[:, [names.index('left_hip'), names.index('right_hip')]].max() < 1.0
+    assert angles[:, [names.index('left_shoulder'), names.index('right_shoulder')]].mean() < 5.0
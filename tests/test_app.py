@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""接口参数校验：格式错误的请求返回 4xx 而不是 500"""
+
+import pytest
+
+from app import app, _parse_generation_request
+from config import PROFILING_CONFIG
+
+
+def parse(data):
+    with app.test_request_context('/api/generate_dance', method='POST', json=data):
+        return _parse_generation_request(data)
+
+
+@pytest.mark.parametrize('formation', [
+    [1, 2], 'line', 3, True,
+    {'dancers': True}, {'dancers': 0}, {'dancers': 2.5}, {'dancers': 99}, {'mode': 'waltz'}])
+def test_invalid_formation_rejected(formation):
+    params, error = parse({'music_file': 'a.wav', 'dance_style': '萨玛舞', 'formation': formation})
+    assert params is None and error[1] == 400
+
+
+@pytest.mark.parametrize('formation', [None, {}, {'dancers': 4, 'mode': 'canon', 'layout': 'v'}])
+def test_valid_formation_accepted(formation):
+    params, error = parse({'music_file': 'a.wav', 'dance_style': '萨玛舞', 'formation': formation})
+    assert error is None and params['formation'] == formation
+
+
+@pytest.mark.parametrize('allowed, expected', [(None, None), (False, None), (True, 'cprofile')])
+def test_request_profiling_disabled_unless_allowed(allowed, expected, monkeypatch):
+    """剖析文件会写入可下载的输出目录，默认（非开发模式）忽略 profile 参数"""
+    monkeypatch.setitem(PROFILING_CONFIG, 'allow_request_profiling', allowed)
+    params, _ = parse({'music_file': 'a.wav', 'dance_style': '萨玛舞', 'profile': 'cprofile'})
+    assert params['profile'] == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0.8, 0.8), (0.83, 0.85), ('0.77', 0.75), (1.52, 1.5), (0.49, 0.5),
+    (0.4, None), (1.6, None), ('fast', None), (float('nan'), None), (float('inf'), None)])
+def test_practice_speed_quantized(value, expected):
+    """练习速度取整到 0.05，每首歌缓存的变速音轨数量有限"""
+    params, error = parse({'music_file': 'a.wav', 'dance_style': '萨玛舞', 'practice_speed': value})
+    assert (params['practice_speed'] if error is None else None) == expected
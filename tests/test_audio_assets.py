@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""音轨缓存：每个 (歌曲, 速度) 只编码一次，缓存中的音轨不再重新编码"""
+
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from utils import audio_assets
+
+
+@pytest.fixture
+def song(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_assets, 'AUDIO_DIR', tmp_path / 'audio')
+    (tmp_path / 'audio').mkdir()
+    path = tmp_path / 'song.wav'
+    samples = (np.sin(np.arange(22050 * 2) * 0.05) * 8000).astype(np.int16)
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(22050)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def test_practice_track_is_encoded_once(song):
+    original = audio_assets.audio_track(song)
+    slowed = audio_assets.audio_track(song, 0.8)
+    assert original != slowed
+    assert sorted(path.name for path in audio_assets.AUDIO_DIR.iterdir()) == sorted(
+        [Path(original).name, Path(slowed).name])
+
+    # 渲染时把变速后的音轨再次交给 audio_track，应原样返回
+    assert audio_assets.audio_track(slowed) == slowed
+    assert audio_assets.audio_track(song, 0.8) == slowed
+    assert len(list(audio_assets.AUDIO_DIR.iterdir())) == 2
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""磁盘缓存的LRU淘汰：超过大小上限时删除最久未用的文件，保留仍被引用的分段"""
+
+import os
+import time
+
+from config import SEGMENT_CONFIG, VISUALIZATION_CONFIG
+from models import pipeline
+from utils.cache import evict_lru, touch
+from utils.work_queue import WorkQueue
+
+
+def write(path, size, age):
+    """写入 size 字节的文件，修改时间为 age 秒之前"""
+    path.write_bytes(b'\0' * size)
+    timestamp = time.time() - age
+    os.utime(path, (timestamp, timestamp))
+    return path
+
+
+def test_evict_lru_removes_least_recently_used(tmp_path):
+    old = write(tmp_path / 'old.bin', 100, 300)
+    used = write(tmp_path / 'used.bin', 100, 200)
+    new = write(tmp_path / 'new.bin', 100, 100)
+    touch(used)
+
+    assert evict_lru(tmp_path, 200) == 1
+    assert not old.exists() and used.exists() and new.exists()
+
+
+def test_evict_lru_keeps_protected_and_recent_files(tmp_path):
+    kept = write(tmp_path / 'kept.bin', 100, 300)
+    old = write(tmp_path / 'old.bin', 100, 200)
+    recent = write(tmp_path / 'recent.bin', 100, 10)
+    write(tmp_path / '.partial.tmp', 1000, 400)
+
+    evict_lru(tmp_path, 0, keep={'kept.bin'}, min_age=60)
+    assert kept.exists() and not old.exists() and recent.exists()
+    assert (tmp_path / '.partial.tmp').exists()
+
+
+def test_evict_render_cache_keeps_referenced_segments(tmp_path, monkeypatch):
+    segments, streams, images = tmp_path / 'segments', tmp_path / 'streams', tmp_path / 'images'
+    for directory in (segments, streams, images):
+        directory.mkdir()
+    queue_path = tmp_path / 'queue.db'
+    monkeypatch.setattr(pipeline, 'SEGMENT_DIR', segments)
+    monkeypatch.setattr(pipeline, 'STREAM_DIR', streams)
+    monkeypatch.setattr(pipeline, 'IMAGE_DIR', images)
+    monkeypatch.setitem(pipeline.FARM_CONFIG, 'queue_path', queue_path)
+    monkeypatch.setitem(SEGMENT_CONFIG, 'max_bytes', 0)
+    monkeypatch.setitem(SEGMENT_CONFIG, 'min_age_seconds', 0)
+    monkeypatch.setitem(VISUALIZATION_CONFIG, 'max_bytes', 0)
+
+    streamed, farmed, unused = ('seg_' + char * 40 for char in 'abc')
+    for name in (streamed + '.mp4', streamed + '_mute.ts', farmed + '.mp4', unused + '.mp4'):
+        write(segments / name, 100, 7200)
+    write(images / 'music.png', 100, 7200)
+
+    # 保留期内的播放列表引用的分段
+    live = streams / '0123456789ab'
+    live.mkdir()
+    (live / 'playlist.m3u8').write_text(f'#EXTM3U\n#EXTINF:2.000,\nsegments/{streamed}_mute.ts\n', encoding='utf-8')
+    expired = streams / 'ba9876543210'
+    expired.mkdir()
+    write(expired / 'status.json', 2, 48 * 3600)
+
+    # 未完成的分布式渲染任务已完成的分块
+    queue = WorkQueue(queue_path)
+    queue.submit('job', {}, [{'start_frame': 0}, {'start_frame': 60}])
+    queue.claim('w')
+    queue.complete('job', 0, 'w', {'segments': [farmed + '.mp4'], 'rendered': 1})
+
+    pipeline.evict_render_cache()
+    assert sorted(path.name for path in segments.iterdir()) == sorted([
+        streamed + '.mp4', streamed + '_mute.ts', farmed + '.mp4'])
+    assert not (images / 'music.png').exists()
+    assert live.exists() and not expired.exists()
+
+    queue.finish('job', 'done')
+    pipeline.evict_render_cache()
+    assert not (segments / (farmed + '.mp4')).exists()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""排练评分：带窗口的DTW与逐格计算的DTW结果一致"""
+
+import numpy as np
+import pytest
+
+from models.rehearsal import RehearsalScorer, dtw_band, dtw_path
+
+
+def frame_distances(query, reference):
+    """全部帧对的距离 (N, M)：各关节的平均欧氏距离，缺失的关节不计入"""
+    distance = np.linalg.norm(query[:, None] - reference[None], axis=3)
+    valid = ~np.isnan(distance)
+    return np.where(valid, distance, 0).sum(axis=2) / np.maximum(valid.sum(axis=2), 1)
+
+
+def brute_force_dtw(query, reference, band=None):
+    """逐格计算的DTW，返回 (最小累计代价, 对齐路径)
+
+    band 为 None 时不限制窗口，否则只允许每行以 i·(M/N) 为中心、宽 2·band+1 的列（靠近两端时整体平移）。
+    """
+    n, m = len(query), len(reference)
+    cost = frame_distances(query, reference)
+    if band is not None:
+        width = min(2 * band + 1, m)
+        centers = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(int)
+        lows = np.clip(centers - band, 0, m - width)[:, None]
+        columns = np.arange(m)[None]
+        cost = np.where((columns < lows) | (columns >= lows + width), np.inf, cost)
+
+    total = np.full((n + 1, m + 1), np.inf)
+    total[0, 0] = 0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            total[i, j] = cost[i - 1, j - 1] + min(total[i - 1, j - 1], total[i - 1, j], total[i, j - 1])
+
+    path = [(n - 1, m - 1)]
+    i, j = n, m
+    while (i, j) != (1, 1):
+        steps = [(i - 1, j - 1), (i - 1, j), (i, j - 1)]
+        i, j = min((step for step in steps if step[0] >= 1 and step[1] >= 1), key=lambda step: total[step])
+        path.append((i - 1, j - 1))
+    return total[n, m], np.array(path[::-1])
+
+
+def path_cost(query, reference, path):
+    return frame_distances(query, reference)[path[:, 0], path[:, 1]].sum()
+
+
+def check_path(path, n, m):
+    """路径从 (0, 0) 到 (N-1, M-1)，每步只前进一帧"""
+    assert tuple(path[0]) == (0, 0)
+    assert tuple(path[-1]) == (n - 1, m - 1)
+    steps = np.diff(path, axis=0)
+    assert ((steps >= 0) & (steps <= 1)).all() and (steps.sum(axis=1) > 0).all()
+
+
+@pytest.mark.parametrize('n, m', [(12, 12), (9, 15), (15, 9), (1, 6), (6, 1), (20, 31)])
+def test_dtw_matches_brute_force(n, m):
+    rng = np.random.default_rng(n * 100 + m)
+    query = rng.normal(size=(n, 5, 3))
+    reference = rng.normal(size=(m, 5, 3))
+    query[rng.random(query.shape[:2]) < 0.1] = np.nan
+
+    expected_cost, expected_path = brute_force_dtw(query, reference)
+    path = dtw_path(query, reference, band=max(n, m))
+    check_path(path, n, m)
+    assert path_cost(query, reference, path) == pytest.approx(expected_cost, rel=1e-5)
+    np.testing.assert_array_equal(path, expected_path)
+
+
+def test_dtw_band_matches_brute_force():
+    rng = np.random.default_rng(7)
+    query = rng.normal(size=(30, 4, 2))
+    reference = rng.normal(size=(45, 4, 2))
+
+    expected_cost, _ = brute_force_dtw(query, reference, band=3)
+    path = dtw_path(query, reference, band=3)
+    check_path(path, 30, 45)
+    assert path_cost(query, reference, path) == pytest.approx(expected_cost, rel=1e-5)
+
+
+@pytest.mark.parametrize('n, m, band', [(30, 5400, 60), (5, 400, 1), (3, 50, 0)])
+def test_dtw_widens_narrow_band(n, m, band):
+    """参考帧数远多于录制帧数时窗口自动放宽，相邻两行的窗口仍然衔接"""
+    rng = np.random.default_rng(m)
+    query = rng.normal(size=(n, 3, 2))
+    reference = rng.normal(size=(m, 3, 2))
+    path = dtw_path(query, reference, band)
+    check_path(path, n, m)
+    if m <= 400:
+        widened = int(np.ceil(np.ceil((m - 1) / (n - 1)) / 2))
+        expected_cost, _ = brute_force_dtw(query, reference, band=widened)
+        assert path_cost(query, reference, path) == pytest.approx(expected_cost, rel=1e-5)
+
+
+def test_score_short_recording():
+    """1 秒的录制对 3 分钟的参考序列评分"""
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(5400, 17, 3)).astype(np.float32)
+    recorded = reference[:30, :, :2] + rng.normal(size=(30, 17, 2)) * 0.01
+    result = RehearsalScorer(17, 30).score(reference, recorded)
+    assert result['recorded_frames'] == 30 and np.isfinite(result['mean_error'])
+
+
+def test_dtw_cells_estimate():
+    """准入控制的成本估算与评分时实际计算的格数一致（录制帧按参考帧率重采样）"""
+    scorer = RehearsalScorer(17, 30)
+    assert scorer.dtw_cells(5400, 5400) == 5400 * 121
+    assert scorer.dtw_cells(30, 5400) == 30 * dtw_band(30, 5400, 60)[1]
+    assert scorer.dtw_cells(601, 5400, recorded_fps=60) == 301 * 121
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""渲染后端：NumPy 参考实现的画面与 OpenCV 后端一致"""
+
+import pytest
+
+pytest.importorskip('cv2')
+
+from benchmarks.compare_backends import MAX_CHANGED, build_cases, image_diff, render_all  # noqa: E402
+from models.render_backends import RenderBackend, get_render_backend  # noqa: E402
+
+CASES, TOTAL_FRAMES = build_cases(30)
+
+
+@pytest.mark.parametrize('case', list(CASES))
+def test_numpy_backend_matches_opencv(case):
+    reference, _ = render_all(CASES[case], 'opencv', TOTAL_FRAMES)
+    frames, _ = render_all(CASES[case], 'numpy', TOTAL_FRAMES)
+    diff = image_diff(reference, frames)
+    assert diff['changed_pixel_ratio'] <= MAX_CHANGED, diff
+    assert diff['mean_abs_error'] < 1.0, diff
+
+
+def test_reference_backend_not_selectable():
+    """NumPy 参考实现不能在 RENDER_CONFIG['backend'] 中选择"""
+    with pytest.raises(Exception):
+        get_render_backend('numpy')
+    with pytest.raises(TypeError):
+        RenderBackend()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""分布式渲染：租约过期后分块可以被重新领取，工作进程被杀死时任务仍能完成"""
+
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from models.render_farm import run_workers
+from utils import work_queue
+from utils.work_queue import WorkQueue
+
+
+def killed_on_first_attempt(queue_path, worker_id, idle_exit):
+    """第一次领取到分块 0 时被杀死（SIGKILL），其余分块正常提交"""
+    queue = WorkQueue(queue_path)
+    idle_since = time.time()
+    while time.time() - idle_since < idle_exit:
+        task = queue.claim(worker_id)
+        if task is None:
+            time.sleep(0.05)
+            continue
+        if task['chunk_index'] == 0 and task['attempts'] == 1:
+            os.kill(os.getpid(), signal.SIGKILL)
+        queue.complete(task['job_id'], task['chunk_index'], worker_id, {'worker': worker_id})
+        idle_since = time.time()
+
+
+def always_killed(queue_path, worker_id, idle_exit):
+    WorkQueue(queue_path).claim(worker_id)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def drain_rollback_journal(queue_path, worker_id):
+    """多台主机上的工作进程：队列使用 DELETE 日志，逐个领取并提交分块"""
+    queue = WorkQueue(queue_path, journal_mode='DELETE')
+    while True:
+        task = queue.claim(worker_id)
+        if task is None:
+            return
+        queue.complete(task['job_id'], task['chunk_index'], worker_id, {'worker': worker_id})
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue.db')
+    queue.submit('job', {}, [{'start_frame': 0}, {'start_frame': 60}])
+
+    first = queue.claim('a', lease_seconds=0.05)
+    assert first['chunk_index'] == 0
+    assert queue.claim('b', lease_seconds=60)['chunk_index'] == 1
+    time.sleep(0.1)
+
+    retried = queue.claim('c', lease_seconds=60)
+    assert (retried['chunk_index'], retried['attempts']) == (0, 2)
+    # 原工作进程的续约和结果都不再被接受
+    assert not queue.renew('job', 0, 'a')
+    assert not queue.complete('job', 0, 'a', {})
+    assert queue.complete('job', 0, 'c', {})
+
+
+def test_released_lease_is_reclaimed_immediately(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue.db')
+    queue.submit('job', {}, [{'start_frame': 0}])
+    queue.claim('a', lease_seconds=60)
+    assert queue.claim('b') is None
+
+    assert queue.release('a') == 1
+    assert queue.claim('b')['attempts'] == 2
+
+
+def test_killed_worker_chunk_is_rerun(tmp_path):
+    queue_path = tmp_path / 'queue.db'
+    queue = WorkQueue(queue_path)
+    queue.submit('job', {}, [{'start_frame': start} for start in range(0, 300, 60)])
+
+    # 租约为默认的 120 秒，分块能在超时前完成说明被杀死的进程的租约已被放回队列
+    status = run_workers('job', 2, queue_path, target=killed_on_first_attempt, timeout=60)
+    assert status['chunks'] == {'done': 5}
+    results = queue.results('job')
+    assert results[0][1] == 2
+    assert results[0][0] == results[0][2]['worker']
+
+
+def test_repeated_crashes_fail_the_job(tmp_path):
+    queue_path = tmp_path / 'queue.db'
+    WorkQueue(queue_path).submit('job', {}, [{'start_frame': 0}])
+
+    status = run_workers('job', 1, queue_path, target=always_killed, timeout=60)
+    assert status['state'] == 'failed'
+
+
+@pytest.mark.parametrize('fs_type, expected', [('nfs4', 'DELETE'), ('cifs', 'DELETE'), ('ext4', 'WAL')])
+def test_auto_journal_mode_follows_filesystem(tmp_path, monkeypatch, fs_type, expected):
+    """auto 模式：队列在网络文件系统上时不使用 WAL"""
+    mounts = tmp_path / 'mounts'
+    mounts.write_text(f'/dev/sda1 / ext4 rw 0 0\nserver:/farm {tmp_path} {fs_type} rw 0 0\n', encoding='utf-8')
+    monkeypatch.setattr(work_queue, '_MOUNTS', str(mounts))
+
+    queue = WorkQueue(tmp_path / 'queue.db', journal_mode='auto')
+    assert queue.journal_mode == expected
+    assert queue._conn.execute('PRAGMA journal_mode').fetchone()[0].upper() == expected
+
+
+def test_rollback_journal_concurrent_workers(tmp_path):
+    """DELETE 日志下多个进程同时领取：每个分块只完成一次，不产生 WAL 文件"""
+    queue_path = tmp_path / 'queue.db'
+    queue = WorkQueue(queue_path, journal_mode='DELETE')
+    queue.submit('job', {}, [{'start_frame': start} for start in range(0, 1200, 60)])
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=drain_rollback_journal, args=(str(queue_path), f'host{i}'))
+                 for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    status = queue.status('job')
+    assert status['chunks'] == {'done': 20}
+    assert all(attempts == 1 for _, attempts, _ in queue.results('job'))
+    assert not (tmp_path / 'queue.db-wal').exists()
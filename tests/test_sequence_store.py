@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""序列存储：格式不对的 sequence_id 按不存在处理（接口返回 404）"""
+
+import pytest
+
+from utils.sequence_store import load_meta, sequence_data_path
+
+
+@pytest.mark.parametrize('sequence_id', [None, 123456789, 1.5, True, ['abcdef12'], '', '../etc/passwd',
+                                         'abcdef12\n', 'ABCDEF12'])
+def test_malformed_sequence_id_raises_key_error(sequence_id):
+    with pytest.raises(KeyError):
+        load_meta(sequence_id)
+    with pytest.raises(KeyError):
+        sequence_data_path(sequence_id)
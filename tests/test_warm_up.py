@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""预热：特征缓存每台主机只由一个服务进程预加载"""
+
+import pytest
+
+from models import pipeline
+
+
+def test_prewarm_claimed_once_per_host(tmp_path, monkeypatch):
+    pytest.importorskip('fcntl')
+    monkeypatch.setattr(pipeline, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(pipeline, '_prewarm_lock_file', None)
+
+    assert pipeline._claim_prewarm()
+    holder = pipeline._prewarm_lock_file
+    # 模拟同一主机上的另一个工作进程：锁已被持有
+    pipeline._prewarm_lock_file = None
+    assert not pipeline._claim_prewarm()
+
+    holder.close()
+    assert pipeline._claim_prewarm()
+    pipeline._prewarm_lock_file.close()
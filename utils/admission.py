@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""准入控制：按请求成本限制同时进行的分析和渲染，饱和时排队或返回429"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import jsonify
+
+from config import ADMISSION_CONFIG
+from utils.profiling import metrics, count
+
+
+class AdmissionRejected(Exception):
+    """资源饱和，请求被拒绝"""
+
+    def __init__(self, pool, retry_after, message):
+        super().__init__(message)
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class ResourcePool:
+    """一类资源：同时运行的请求数和成本总量都有上限，等待的请求按先来先到排队"""
+
+    def __init__(self, name, slots, capacity, max_queue, max_wait):
+        self.name = name
+        self.slots = slots
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.running = 0
+        self.in_use = 0.0
+        self._waiting = deque()
+        self._condition = threading.Condition()
+
+        # 每单位成本的平均耗时（秒），用于估算 Retry-After
+        self._seconds_per_unit = None
+
+    def acquire(self, cost):
+        """占用资源，排队超时或队列已满时抛出 AdmissionRejected"""
+        ticket = object()
+        with self._condition:
+            if not self._waiting and self._fits(cost):
+                self._admit(cost)
+                return
+
+            if len(self._waiting) >= self.max_queue:
+                count(f'admission_{self.name}_rejected')
+                raise AdmissionRejected(self.name, self._retry_after(cost), '服务器繁忙，排队已满')
+
+            self._waiting.append(ticket)
+            self._publish()
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not (self._waiting[0] is ticket and self._fits(cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        count(f'admission_{self.name}_rejected')
+                        raise AdmissionRejected(self.name, self._retry_after(cost), '服务器繁忙，排队超时')
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                # 队首离开后唤醒其他等待者
+                self._condition.notify_all()
+
+            self._admit(cost)
+
+    def release(self, cost, elapsed=None):
+        """释放资源，并用本次耗时更新成本估计"""
+        with self._condition:
+            self.running -= 1
+            self.in_use -= cost
+            if elapsed is not None and cost > 0:
+                per_unit = elapsed / cost
+                self._seconds_per_unit = per_unit if self._seconds_per_unit is None \
+                    else self._seconds_per_unit * 0.8 + per_unit * 0.2
+            self._publish()
+            self._condition.notify_all()
+
+    def status(self):
+        """当前状态"""
+        with self._condition:
+            return {
+                'slots': self.slots,
+                'running': self.running,
+                'queued': len(self._waiting),
+                'capacity': self.capacity,
+                'in_use': round(self.in_use, 1)
+            }
+
+    def _fits(self, cost):
+        # 单个超过总容量的请求在空闲时也允许执行，避免永远无法准入
+        if self.running >= self.slots:
+            return False
+        return self.running == 0 or self.in_use + cost <= self.capacity
+
+    def _admit(self, cost):
+        self.running += 1
+        self.in_use += cost
+        self._publish()
+
+    def _retry_after(self, cost):
+        """根据排在前面的工作量估算多少秒后重试"""
+        if self._seconds_per_unit is None:
+            return max(1, int(self.max_wait))
+        pending = self.in_use + cost * (len(self._waiting) + 1)
+        estimate = self._seconds_per_unit * pending / max(1, self.slots)
+        return int(min(max(1, math.ceil(estimate)), 600))
+
+    def _publish(self):
+        metrics.set_gauge(f'admission_{self.name}_running', self.running)
+        metrics.set_gauge(f'admission_{self.name}_queued', len(self._waiting))
+        metrics.set_gauge(f'admission_{self.name}_cost_in_use', round(self.in_use, 1))
+
+
+class AdmissionController:
+    def __init__(self, config=None):
+        config = config or ADMISSION_CONFIG
+        self.pools = {
+            name: ResourcePool(name, **config[name])
+            for name in ('analysis', 'render', 'scoring')
+        }
+
+    @contextmanager
+    def admit(self, pool_name, cost):
+        """在资源允许时执行代码块"""
+        pool = self.pools[pool_name]
+        pool.acquire(cost)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            pool.release(cost, time.monotonic() - start)
+
+    def reserve(self, pool_name, cost):
+        """占用资源直到调用返回的 release()，用于在请求返回后仍继续运行的后台任务"""
+        pool = self.pools[pool_name]
+        pool.acquire(cost)
+        start = time.monotonic()
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                pool.release(cost, time.monotonic() - start)
+
+        return release
+
+    def reject_response(self, pool_name, error):
+        """资源饱和时的429响应"""
+        response = jsonify({
+            'error': f'{str(error)}，请 {error.retry_after} 秒后重试',
+            'retry_after': error.retry_after,
+            'queue': self.pools[pool_name].status()
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    def guard(self, pool_name, estimate_cost):
+        """视图装饰器：estimate_cost() 估算当前请求成本，资源饱和时返回429和Retry-After"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                cost = estimate_cost()
+                try:
+                    with self.admit(pool_name, cost):
+                        return view(*args, **kwargs)
+                except AdmissionRejected as e:
+                    return self.reject_response(pool_name, e)
+            return wrapper
+        return decorator
+
+    def status(self):
+        return {name: pool.status() for name, pool in self.pools.items()}
+
+
+def estimate_audio_duration(filepath=None, size_bytes=None, extension=None):
+    """估算音频时长（秒）：优先读取文件头，失败时按文件大小估算"""
+    if filepath and os.path.isfile(filepath):
+        try:
+            import soundfile as sf
+            return float(sf.info(filepath).duration)
+        except Exception:
+            size_bytes = os.path.getsize(filepath)
+            extension = extension or os.path.splitext(filepath)[1][1:]
+
+    if not size_bytes:
+        return 0.0
+    bytes_per_second = ADMISSION_CONFIG['bytes_per_second'].get((extension or '').lower(), 16000)
+    return size_bytes / bytes_per_second
+
+
+def estimate_render_cost(duration, width, height, dancer_count=1):
+    """渲染成本：参考分辨率下的视频秒数，群舞按舞者数量适当增加"""
+    ref_width, ref_height = ADMISSION_CONFIG['reference_resolution']
+    pixel_factor = (width * height) / (ref_width * ref_height)
+    dancer_factor = 1 + 0.1 * max(0, dancer_count - 1)
+    return duration * pixel_factor * dancer_factor
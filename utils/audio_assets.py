@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""音轨缓存：每首歌（每个练习速度）只编码一次 AAC，之后的渲染直接复制音频流"""
+
+import os
+import threading
+from pathlib import Path
+
+from config import AUDIO_DIR, SEGMENT_CONFIG
+from utils.cache import file_content_hash, evict_lru, touch
+from utils.ffmpeg_utils import encode_audio, time_stretch_audio
+from utils.profiling import timed, count
+
+
+def audio_track(audio_path, speed=1.0):
+    """歌曲的 AAC 音轨（.m4a）路径，按 (音频内容哈希, 速度, 码率) 缓存，不存在时编码一次
+
+    speed 不为 1 时变速不变调后编码（练习速度）。传入的已经是缓存中的音轨时原样返回，
+    不会再做一次有损编码。
+    """
+    if Path(audio_path).resolve().parent == AUDIO_DIR.resolve():
+        touch(audio_path)
+        count('audio_track_hits')
+        return str(audio_path)
+
+    bitrate = SEGMENT_CONFIG['audio_bitrate']
+    stretched = abs(speed - 1.0) >= 1e-6
+    speed_tag = f"_x{speed:.3f}" if stretched else ''
+    output_path = AUDIO_DIR / f"{file_content_hash(audio_path)}{speed_tag}_{bitrate}.m4a"
+    if output_path.exists():
+        touch(output_path)
+        count('audio_track_hits')
+        return str(output_path)
+
+    # 先写临时文件再重命名，并发的渲染不会读到未完成的文件
+    temp_path = output_path.with_name(f".{output_path.stem}.{os.getpid()}.{threading.get_ident()}.m4a")
+    try:
+        if stretched:
+            with timed('practice.time_stretch'):
+                time_stretch_audio(audio_path, speed, str(temp_path), bitrate)
+        else:
+            with timed('audio_encode'):
+                encode_audio(audio_path, str(temp_path), bitrate)
+        os.replace(temp_path, output_path)
+    finally:
+        if temp_path.exists():
+            os.remove(temp_path)
+    count('audio_track_misses')
+
+    evict_lru(AUDIO_DIR, SEGMENT_CONFIG['audio_max_bytes'], ('*.m4a',), keep={output_path.name},
+              min_age=SEGMENT_CONFIG['min_age_seconds'], counter='audio_track_evictions')
+    return str(output_path)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""缓存工具：文件内容哈希、磁盘缓存目录的LRU淘汰和音乐特征缓存（进程内LRU + 磁盘JSON，多进程共享）"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from config import CACHE_DIR, FEATURE_CACHE_CONFIG
+from utils.profiling import count
+
+_hash_lock = threading.Lock()
+_hash_memo = {}
+
+
+def file_content_hash(filepath):
+    """计算文件内容的SHA1，按 (路径, 大小, 修改时间) 记忆，文件未变化时不重复读取"""
+    filepath = str(filepath)
+    stat = os.stat(filepath)
+    memo_key = (filepath, stat.st_size, stat.st_mtime_ns)
+
+    with _hash_lock:
+        cached = _hash_memo.get(memo_key)
+    if cached:
+        return cached
+
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[memo_key] = content_hash
+    return content_hash
+
+
+def atomic_write_bytes(path, data):
+    """先写临时文件再重命名，避免其他进程读到写了一半的文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def touch(path):
+    """命中缓存时更新修改时间，供LRU淘汰使用（不依赖文件系统的 atime 设置）"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict_lru(directory, max_bytes, patterns=('*',), keep=(), min_age=0, counter=None):
+    """目录中匹配的文件总大小超过 max_bytes 时，从最久未用的文件开始删除，返回删除的文件数
+
+    keep 中的文件名和最近 min_age 秒内用过的文件不删除；临时文件（以 . 开头）不计入。
+    """
+    entries = []
+    for pattern in patterns:
+        for path in Path(directory).glob(pattern):
+            if path.name.startswith('.'):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - min_age
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime >= cutoff:
+            break
+        if path.name in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        if counter:
+            count(counter)
+    return removed
+
+
+class FeatureCache:
+    """音乐特征缓存
+
+    进程内保留最近使用的条目，磁盘上按键保存JSON，供同一台机器上的所有工作进程共享。
+    """
+
+    def __init__(self, cache_dir=None, memory_entries=None):
+        self.cache_dir = Path(cache_dir or CACHE_DIR / "features")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_entries = memory_entries or FEATURE_CACHE_CONFIG['memory_entries']
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """写入缓存"""
+        atomic_write_bytes(self._path(key), json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        self._remember(key, value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
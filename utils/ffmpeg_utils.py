@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""ffmpeg 工具：H.264 分段编码、无重编码拼接和音频合成"""
+
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from config import SEGMENT_CONFIG
+
+
+def get_ffmpeg_exe():
+    """优先使用 imageio-ffmpeg 自带的 ffmpeg，否则使用系统 PATH 中的 ffmpeg"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+def run_ffmpeg(args):
+    """执行 ffmpeg，失败时抛出异常"""
+    command = [get_ffmpeg_exe(), '-y', '-hide_banner', '-loglevel', 'error'] + [str(a) for a in args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg 执行失败: {result.stderr.decode('utf-8', errors='ignore').strip()}")
+
+
+class VideoEncoder:
+    """通过管道把 BGR 帧送入 ffmpeg 编码为 H.264
+
+    每个输出文件从关键帧开始，因此编码好的分段可以直接无重编码拼接。
+    """
+
+    def __init__(self, output_path, width, height, frame_rate, output_format=None):
+        self.output_path = str(output_path)
+        args = [
+            get_ffmpeg_exe(), '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', str(frame_rate),
+            '-i', '-',
+            '-an',
+            '-c:v', SEGMENT_CONFIG['codec'],
+            '-preset', SEGMENT_CONFIG['preset'],
+            '-crf', str(SEGMENT_CONFIG['crf']),
+            '-pix_fmt', 'yuv420p'
+        ]
+        if output_format:
+            args += ['-f', output_format]
+        args.append(self.output_path)
+
+        self._process = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        self._process.stdin.write(frame.tobytes())
+
+    def close(self):
+        """结束编码并等待 ffmpeg 退出"""
+        self._process.stdin.close()
+        stderr = self._process.stderr.read()
+        if self._process.wait() != 0:
+            raise Exception(f"视频编码失败: {stderr.decode('utf-8', errors='ignore').strip()}")
+
+    def abort(self):
+        """放弃编码并删除未完成的文件"""
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._process.kill()
+        self._process.wait()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def concat_videos(segment_paths, output_path, audio_path=None, duration=None, copy_audio=False):
+    """用 concat 分离器无重编码地拼接分段，可同时合入音轨
+
+    copy_audio 为 True 时音轨（须为AAC）直接复制，否则编码为AAC。
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+        for path in segment_paths:
+            # concat 列表中的单引号需要转义
+            escaped = str(Path(path).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        list_path = f.name
+
+    try:
+        args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            args += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-c:a', 'copy' if copy_audio else 'aac',
+                     '-shortest']
+        args += ['-c:v', 'copy']
+        if duration:
+            args += ['-t', f'{duration:.3f}']
+        args += ['-movflags', '+faststart', output_path]
+        run_ffmpeg(args)
+    finally:
+        os.remove(list_path)
+
+    return output_path
+
+
+def encode_audio(audio_path, output_path, bitrate='192k'):
+    """把音频编码为 AAC（.m4a）"""
+    run_ffmpeg(['-i', audio_path, '-vn', '-c:a', 'aac', '-b:a', bitrate, '-f', 'mp4', output_path])
+    return output_path
+
+
+def mux_audio(video_path, audio_path, output_path, duration=None):
+    """把已编码的视频和 AAC 音轨无重编码地合成，音轨截取到视频长度"""
+    args = ['-i', video_path, '-i', audio_path, '-map', '0:v', '-map', '1:a', '-c', 'copy', '-shortest']
+    if duration:
+        args += ['-t', f'{duration:.3f}']
+    args += ['-movflags', '+faststart', output_path]
+    run_ffmpeg(args)
+    return output_path
+
+
+def mux_ts_segment(video_path, audio_path, start_time, duration, output_path):
+    """把一个视频分段和对应时间段的音频封装为 MPEG-TS（HLS 分段），音视频都不重新编码
+
+    audio_path 应为整首歌只编码一次的 AAC 音轨（见 audio_assets.audio_track）。按时间戳选取
+    [start_time, start_time + duration) 内的 AAC 帧原样复制，相邻分段的音频首尾相接，
+    不会像逐段编码那样在每段开头引入编码器延迟（卡顿、咔哒声、音画逐段漂移）。
+    时间戳从 start_time 开始，使各分段在播放列表中连续。
+    """
+    if not audio_path:
+        run_ffmpeg(['-i', video_path, '-c:v', 'copy', '-output_ts_offset', f'{start_time:.3f}',
+                    '-avoid_negative_ts', 'disabled', '-f', 'mpegts', output_path])
+        return output_path
+
+    # 先按原始时间戳选出这一段的 AAC 帧；-copyts 保留第一帧相对 start_time 的偏移，
+        # 中间文件用 NUT 保留音频的原始时间基（Matroska 只有毫秒精度）
+    audio_part = Path(output_path).with_suffix('.nut')
+    try:
+        run_ffmpeg(['-copyts', '-i', audio_path, '-map', '0:a', '-c:a', 'copy',
+                    '-ss', f'{start_time:.3f}', '-to', f'{start_time + duration:.3f}',
+                    '-f', 'nut', str(audio_part)])
+        run_ffmpeg(['-copyts', '-i', video_path, '-i', str(audio_part), '-map', '0:v', '-map', '1:a?',
+                    '-c', 'copy', '-output_ts_offset', f'{start_time:.3f}', '-avoid_negative_ts', 'disabled',
+                    '-f', 'mpegts', output_path])
+    finally:
+        audio_part.unlink(missing_ok=True)
+    return output_path
+
+
+def time_stretch_audio(audio_path, speed, output_path, bitrate='192k'):
+    """用 atempo 滤镜变速不变调，输出 AAC（.m4a）
+
+    单个 atempo 的倍率限制在 0.5～2.0，超出时串联多个。
+    """
+    factors = []
+    remaining = speed
+    while remaining < 0.5 or remaining > 2.0:
+        factor = 0.5 if remaining < 0.5 else 2.0
+        factors.append(factor)
+        remaining /= factor
+    factors.append(remaining)
+
+    atempo = ','.join(f'atempo={factor:.6f}' for factor in factors)
+    run_ffmpeg(['-i', audio_path, '-vn', '-filter:a', atempo, '-c:a', 'aac', '-b:a', bitrate,
+                '-f', 'mp4', output_path])
+    return output_path
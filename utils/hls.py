@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""HLS 输出：把渲染好的视频分段逐个加入播放列表，渲染完成前即可开始播放"""
+
+import math
+import os
+import threading
+from pathlib import Path
+
+from utils.audio_assets import audio_track
+from utils.cache import atomic_write_bytes, file_content_hash, touch
+from utils.ffmpeg_utils import mux_ts_segment
+
+
+class HlsPlaylist:
+    """EVENT 类型的 HLS 播放列表
+
+    每加入一个分段就重写 m3u8；TS 分段按视频分段和音频内容命名，
+    放在共享的分段目录中，重新渲染时未变化的时间段直接复用。
+    """
+
+    def __init__(self, playlist_path, segment_dir, audio_path, target_duration):
+        self.playlist_path = Path(playlist_path)
+        self.segment_dir = Path(segment_dir)
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        if audio_path and os.path.exists(audio_path):
+            # 整首歌只编码一次 AAC，各 TS 分段从中按时间复制
+            self.audio_path = audio_track(audio_path)
+            self.audio_hash = file_content_hash(audio_path)[:12]
+        else:
+            self.audio_path = None
+            self.audio_hash = 'mute'
+        self.target_duration = int(math.ceil(target_duration))
+        self.entries = []
+        self.ended = False
+        self._write()
+
+    def add_segment(self, video_segment_path, start_time, duration):
+        """加入一个视频分段（on_segment 回调）"""
+        name = f"{Path(video_segment_path).stem}_{self.audio_hash}.ts"
+        ts_path = self.segment_dir / name
+        if ts_path.exists():
+            touch(ts_path)
+        else:
+            temp_path = ts_path.with_name(f".{ts_path.stem}.{os.getpid()}.{threading.get_ident()}.ts")
+            mux_ts_segment(video_segment_path, self.audio_path, start_time, duration, temp_path)
+            os.replace(temp_path, ts_path)
+
+        self.entries.append((name, duration))
+        self._write()
+
+    def finish(self):
+        """全部分段加入后标记播放列表结束"""
+        self.ended = True
+        self._write()
+
+    def _write(self):
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.target_duration}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:EVENT'
+        ]
+        for name, duration in self.entries:
+            lines.append(f'#EXTINF:{duration:.3f},')
+            lines.append(f'segments/{name}')
+        if self.ended:
+            lines.append('#EXT-X-ENDLIST')
+        atomic_write_bytes(self.playlist_path, ('\n'.join(lines) + '\n').encode('utf-8'))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""解码音频缓存：重采样后的单声道信号以原始 float32 文件保存，读取时用 np.memmap 零拷贝映射"""
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from config import CACHE_DIR, PCM_CACHE_CONFIG
+from utils.cache import evict_lru
+from utils.profiling import count
+
+
+class PcmCache:
+    """按 (音频内容哈希, 采样率) 缓存解码后的信号
+
+    磁盘上的文件供同一台机器上的所有工作进程共享；总大小超过 max_bytes 时
+    按最近访问时间淘汰最久未用的文件。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or CACHE_DIR / "pcm")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or PCM_CACHE_CONFIG['max_bytes']
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回只读的 float32 memmap，未命中返回 None"""
+        path = self._path(key)
+        try:
+            signal = np.memmap(path, dtype=np.float32, mode='r')
+            # 访问时间用于LRU淘汰（不依赖文件系统的 atime 设置）
+            os.utime(path)
+        except (OSError, ValueError):
+            count('pcm_cache_misses')
+            return None
+        count('pcm_cache_hits')
+        return signal
+
+    def put(self, key, signal):
+        """写入解码后的信号，返回映射后的只读 memmap"""
+        path = self._path(key)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        np.ascontiguousarray(signal, dtype=np.float32).tofile(temp_path)
+        os.replace(temp_path, path)
+        self._evict()
+        return self.get(key)
+
+    def _evict(self):
+        """总大小超过上限时删除最久未访问的文件（刚写入的文件最后淘汰）"""
+        # 已映射的文件在 Linux 上删除后映射仍然有效
+        with self._lock:
+            evict_lru(self.cache_dir, self.max_bytes, ('*.f32',), counter='pcm_cache_evictions')
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.f32"
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""波形峰值金字塔：多分辨率的 (最小值, 最大值) 包络，供前端绘制可缩放的波形
+
+文件格式（小端）：
+    头部   4s 魔数 b'PEAK' | H 版本 | H 级数 | I 采样率 | I 第0级每对峰值的采样数 | Q 采样总数
+    级长度 每级一个 I（峰值对数）
+    数据   各级依次排列，每对峰值为两个 int8（最小值, 最大值），振幅按 127 量化
+第 k 级每对峰值覆盖 samples_per_peak × 2^k 个采样。
+"""
+
+import struct
+
+import numpy as np
+
+from utils.cache import atomic_write_bytes
+
+MAGIC = b'PEAK'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHIIQ')
+
+
+def build_pyramid(y, samples_per_peak, levels):
+    """从解码后的信号构建峰值金字塔，返回各级 (K, 2) 的 int8 数组"""
+    if len(y) == 0:
+        return [np.zeros((0, 2), dtype=np.int8) for _ in range(levels)]
+
+    starts = np.arange(0, len(y), samples_per_peak)
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+
+    pyramid = []
+    for _ in range(levels):
+        # 最小值向下取整、最大值向上取整，量化后包络不会比原信号窄
+        pyramid.append(np.stack([
+            np.clip(np.floor(mins * 127), -127, 127),
+            np.clip(np.ceil(maxs * 127), -127, 127)
+        ], axis=1).astype(np.int8))
+
+        # 相邻两对合并为上一级的一对，奇数个时最后一对单独保留
+        if len(mins) % 2:
+            mins, maxs = np.append(mins, mins[-1]), np.append(maxs, maxs[-1])
+        mins = np.minimum(mins[0::2], mins[1::2])
+        maxs = np.maximum(maxs[0::2], maxs[1::2])
+
+    return pyramid
+
+
+def write_peaks(path, pyramid, sample_rate, samples_per_peak, sample_count):
+    """把峰值金字塔写成二进制文件"""
+    header = _HEADER.pack(MAGIC, VERSION, len(pyramid), sample_rate, samples_per_peak, sample_count)
+    lengths = struct.pack(f'<{len(pyramid)}I', *[len(level) for level in pyramid])
+    atomic_write_bytes(path, header + lengths + b''.join(level.tobytes() for level in pyramid))
+
+
+def read_peaks(path):
+    """读取峰值文件，返回 dict(sample_rate, samples_per_peak, sample_count, levels)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, level_count, sample_rate, samples_per_peak, sample_count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Exception(f"不支持的峰值文件: {path}")
+
+    lengths = struct.unpack_from(f'<{level_count}I', data, _HEADER.size)
+    offset = _HEADER.size + 4 * level_count
+    levels = []
+    for length in lengths:
+        levels.append(np.frombuffer(data, dtype=np.int8, count=length * 2, offset=offset).reshape(length, 2))
+        offset += length * 2
+
+    return {
+        'sample_rate': sample_rate,
+        'samples_per_peak': samples_per_peak,
+        'sample_count': sample_count,
+        'levels': levels
+    }
+
+
+def select_range(peaks, width, start_time=0.0, end_time=None):
+    """选出 [start_time, end_time) 内峰值对数不少于 width 的最粗一级（每像素至少一对）
+
+    返回 (级别, 该级每对峰值的采样数, 起始序号, (K, 2) 峰值)
+    """
+    sample_rate = peaks['sample_rate']
+    start = max(0, int(start_time * sample_rate))
+    end = peaks['sample_count'] if end_time is None else min(peaks['sample_count'], int(end_time * sample_rate))
+    end = max(end, start + 1)
+
+    level = 0
+    for candidate in range(len(peaks['levels']) - 1, -1, -1):
+        span = peaks['samples_per_peak'] << candidate
+        if (end - start) / span >= width:
+            level = candidate
+            break
+
+    span = peaks['samples_per_peak'] << level
+    first, last = start // span, -(-end // span)
+    return level, span, first, peaks['levels'][level][first:last]
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""性能监控：阶段计时、计数器、Prometheus 导出和单请求性能剖析"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import PROFILING_CONFIG
+
+
+class MetricsRegistry:
+    """进程级的阶段耗时直方图和计数器"""
+
+    def __init__(self, buckets=None):
+        self.buckets = sorted(buckets or PROFILING_CONFIG['histogram_buckets'])
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, stage, seconds, count=1):
+        """记录一次（或 count 次合计）阶段耗时"""
+        with self._lock:
+            timer = self._timers.get(stage)
+            if timer is None:
+                timer = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                         'buckets': [0] * len(self.buckets)}
+                self._timers[stage] = timer
+            timer['count'] += count
+            timer['sum'] += seconds
+            timer['max'] = max(timer['max'], seconds / count)
+            index = bisect.bisect_left(self.buckets, seconds / count)
+            if index < len(self.buckets):
+                timer['buckets'][index] += count
+
+    def increment(self, name, value=1):
+        """计数器累加"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """设置瞬时值（例如排队深度）"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        """返回当前数据的副本"""
+        with self._lock:
+            return {
+                'timers': {stage: dict(timer, buckets=list(timer['buckets']))
+                           for stage, timer in self._timers.items()},
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges)
+            }
+
+    def render_prometheus(self, prefix='dance'):
+        """按 Prometheus 文本格式导出"""
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds histogram'
+        ]
+        for stage, timer in sorted(snapshot['timers'].items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, timer['buckets']):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {timer["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {timer["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {timer["count"]}')
+
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class StageTrace:
+    """单次请求内各阶段的耗时汇总"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    def add(self, stage, seconds):
+        entry = self.stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+
+    def increment(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, trace_dict):
+        """合并另一个进程返回的记录（to_dict 的结果）"""
+        for stage, entry in trace_dict.get('stages', {}).items():
+            mine = self.stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+            mine['count'] += entry['count']
+            mine['total'] += entry['total_ms'] / 1000
+            mine['max'] = max(mine['max'], entry['max_ms'] / 1000)
+        for name, value in trace_dict.get('counters', {}).items():
+            self.increment(name, value)
+
+    def to_dict(self):
+        """转换为可写入报告的字典（毫秒）"""
+        return {
+            'wall_time_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'stages': {
+                stage: {
+                    'count': entry['count'],
+                    'total_ms': round(entry['total'] * 1000, 3),
+                    'mean_ms': round(entry['total'] * 1000 / entry['count'], 3),
+                    'max_ms': round(entry['max'] * 1000, 3)
+                }
+                for stage, entry in self.stages.items()
+            },
+            'counters': dict(self.counters)
+        }
+
+
+# 进程级注册表与当前请求的记录
+metrics = MetricsRegistry()
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+@contextmanager
+def trace_request():
+    """在当前上下文中收集各阶段耗时"""
+    trace = StageTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record(stage, seconds):
+    """记录一次阶段耗时"""
+    metrics.observe(stage, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def count(name, value=1):
+    """计数器累加"""
+    metrics.increment(name, value)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.increment(name, value)
+
+
+def merge_trace(trace_dict):
+    """把后台进程中的阶段耗时并入本进程的注册表和当前请求记录
+
+    后台进程只返回各阶段的次数和合计，直方图按平均耗时归桶。
+    """
+    for stage, entry in trace_dict.get('stages', {}).items():
+        metrics.observe(stage, entry['total_ms'] / 1000, count=entry['count'])
+    for name, value in trace_dict.get('counters', {}).items():
+        metrics.increment(name, value)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.merge(trace_dict)
+
+
+@contextmanager
+def timed(stage):
+    """为代码块计时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_iter(iterable, stage):
+    """逐项计时地迭代（例如逐帧渲染的生成器）"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        record(stage, time.perf_counter() - start)
+        yield item
+
+
+@contextmanager
+def profile_request(output_dir, name, engine='cprofile'):
+    """可选的单请求性能剖析
+
+    engine 为 'pyinstrument' 且已安装时输出 HTML，否则输出 cProfile 的 .prof 文件。
+    yield 一个字典，退出后其中的 'filename' 为生成的文件名。
+    """
+    result = {'filename': None}
+
+    profiler = None
+    if engine == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+        except ImportError:
+            profiler = None
+
+    if profiler is not None:
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result['filename'] = f"{name}.html"
+            (Path(output_dir) / result['filename']).write_text(profiler.output_html(), encoding='utf-8')
+        return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        result['filename'] = f"{name}.prof"
+        profiler.dump_stats(str(Path(output_dir) / result['filename']))
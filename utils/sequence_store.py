@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""舞蹈序列存储：保存生成结果供局部重新生成使用"""
+
+import io
+import json
+import re
+import uuid
+
+import numpy as np
+
+from config import SEQUENCE_DIR
+from utils.cache import atomic_write_bytes
+
+_SEQUENCE_ID = re.compile(r'^[0-9a-f]{8,32}$')
+
+
+def new_sequence_id():
+    return uuid.uuid4().hex[:12]
+
+
+def save_sequence(dance_sequence, meta, sequence_id=None):
+    """保存序列(.npy)和元数据(.json)，返回 sequence_id"""
+    sequence_id = sequence_id or new_sequence_id()
+    meta = dict(meta, sequence_id=sequence_id)
+
+    buffer = io.BytesIO()
+    np.save(buffer, dance_sequence)
+    atomic_write_bytes(_path(sequence_id, 'npy'), buffer.getvalue())
+    atomic_write_bytes(_path(sequence_id, 'json'),
+                       json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8'))
+    return sequence_id
+
+
+def load_meta(sequence_id):
+    """只读取元数据，不存在时抛出 KeyError"""
+    _check_id(sequence_id)
+    meta_path = _path(sequence_id, 'json')
+    if not meta_path.exists():
+        raise KeyError(sequence_id)
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def sequence_data_path(sequence_id):
+    """序列数据文件(.npy)路径，不存在时抛出 KeyError"""
+    _check_id(sequence_id)
+    data_path = _path(sequence_id, 'npy')
+    if not data_path.exists():
+        raise KeyError(sequence_id)
+    return data_path
+
+
+def load_sequence(sequence_id):
+    """读取序列和元数据，不存在时抛出 KeyError"""
+    meta = load_meta(sequence_id)
+    return np.load(sequence_data_path(sequence_id)), meta
+
+
+def _check_id(sequence_id):
+    """请求中的 sequence_id 可能是数字、null 等任意 JSON 值，格式不对时同样按不存在处理"""
+    if not isinstance(sequence_id, str) or not _SEQUENCE_ID.fullmatch(sequence_id):
+        raise KeyError(sequence_id)
+
+
+def _path(sequence_id, extension):
+    return SEQUENCE_DIR / f"{sequence_id}.{extension}"
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""SQLite 租约任务队列：协调者发布分块任务，任意数量的工作进程（可在不同主机上）按租约领取
+
+每个分块领取时获得一个有期限的租约，工作进程在处理过程中续约；进程崩溃或失联时租约过期，
+其他工作进程可以重新领取。完成时只接受仍持有租约的工作进程的结果。
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import FARM_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, chunk_index)
+);
+CREATE INDEX IF NOT EXISTS chunks_state ON chunks (state, lease_expires);
+"""
+
+
+# 网络文件系统：不支持 WAL 需要的共享内存，多台主机共用的队列只能使用回滚日志
+_NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', '9p', 'ceph', 'fuse.ceph',
+                        'glusterfs', 'fuse.glusterfs', 'lustre', 'gpfs', 'afs', 'fuse.s3fs'}
+_MOUNTS = '/proc/mounts'
+
+
+def filesystem_type(path):
+    """path 所在文件系统的类型（读取 /proc/mounts 中最长的匹配挂载点），无法判断时返回 None"""
+    try:
+        with open(_MOUNTS, 'r', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+
+    path = os.path.realpath(path)
+    best = None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            if best is None or len(mount_point) > len(best[0]):
+                best = (mount_point, fs_type)
+    return best[1] if best else None
+
+
+def resolve_journal_mode(db_path, journal_mode=None):
+    """队列的 SQLite 日志模式：auto 时本地磁盘用 WAL，网络文件系统（含 Windows 的 UNC 路径）用 DELETE"""
+    journal_mode = (journal_mode or FARM_CONFIG['journal_mode']).upper()
+    if journal_mode != 'AUTO':
+        return journal_mode
+    if str(db_path).startswith('\\\\') or filesystem_type(Path(db_path).parent) in _NETWORK_FILESYSTEMS:
+        return 'DELETE'
+    return 'WAL'
+
+
+class WorkQueue:
+    """任务状态：running / done / failed；分块状态：pending / leased / done / failed"""
+
+    def __init__(self, db_path=None, max_attempts=None, journal_mode=None):
+        self.db_path = Path(db_path or FARM_CONFIG['queue_path'])
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts or FARM_CONFIG['max_attempts']
+
+        # 自动提交模式，写操作显式使用 BEGIN IMMEDIATE，领取分块时不会与其他进程交错
+        self._conn = sqlite3.connect(str(self.db_path), timeout=60, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self.journal_mode = resolve_journal_mode(self.db_path, journal_mode)
+        self._conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def submit(self, job_id, payload, chunk_payloads):
+        """发布任务及其全部分块"""
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO jobs (job_id, payload, state, chunk_count, created_at) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, json.dumps(payload, ensure_ascii=False), 'running', len(chunk_payloads),
+                          time.time()))
+            conn.executemany('INSERT INTO chunks (job_id, chunk_index, payload, state) VALUES (?, ?, ?, ?)',
+                             [(job_id, index, json.dumps(chunk, ensure_ascii=False), 'pending')
+                              for index, chunk in enumerate(chunk_payloads)])
+
+    def claim(self, worker, lease_seconds=None):
+        """领取一个待处理（或租约已过期）的分块，没有时返回 None
+
+        返回 dict(job_id, chunk_index, attempts, payload, job)，payload 和 job 为发布时的内容。
+        """
+        lease_seconds = lease_seconds or FARM_CONFIG['lease_seconds']
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约过期且已用完尝试次数的分块直接判为失败
+            expired = conn.execute(
+                "SELECT job_id, chunk_index FROM chunks WHERE state = 'leased' AND lease_expires < ? "
+                "AND attempts >= ?", (now, self.max_attempts)).fetchall()
+            for row in expired:
+                self._fail_locked(conn, row['job_id'], row['chunk_index'], '租约多次过期，工作进程可能已退出')
+
+            row = conn.execute(
+                "SELECT c.job_id, c.chunk_index, c.attempts, c.payload, j.payload AS job FROM chunks c "
+                "JOIN jobs j ON j.job_id = c.job_id "
+                "WHERE j.state = 'running' AND (c.state = 'pending' OR (c.state = 'leased' AND c.lease_expires < ?)) "
+                "ORDER BY j.created_at, c.chunk_index LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+
+            conn.execute("UPDATE chunks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                         "WHERE job_id = ? AND chunk_index = ?",
+                         (worker, now + lease_seconds, row['job_id'], row['chunk_index']))
+
+        return {
+            'job_id': row['job_id'],
+            'chunk_index': row['chunk_index'],
+            'attempts': row['attempts'] + 1,
+            'payload': json.loads(row['payload']),
+            'job': json.loads(row['job'])
+        }
+
+    def renew(self, job_id, chunk_index, worker, lease_seconds=None):
+        """续约，租约已被其他工作进程取得时返回 False"""
+        lease_seconds = lease_seconds or FARM_CONFIG['lease_seconds']
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE chunks SET lease_expires = ? WHERE job_id = ? AND chunk_index = ? "
+                "AND state = 'leased' AND worker = ?", (time.time() + lease_seconds, job_id, chunk_index, worker))
+        return cursor.rowcount == 1
+
+    def release(self, worker):
+        """工作进程已退出：它持有的租约立即过期，其他工作进程可以马上重新领取，返回分块数"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE chunks SET lease_expires = 0 WHERE state = 'leased' AND worker = ?",
+                                  (worker,))
+        return cursor.rowcount
+
+    def complete(self, job_id, chunk_index, worker, result):
+        """提交分块结果，只接受仍持有租约的工作进程；返回是否被接受"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE chunks SET state = 'done', result = ?, lease_expires = NULL WHERE job_id = ? "
+                "AND chunk_index = ? AND state = 'leased' AND worker = ?",
+                (json.dumps(result, ensure_ascii=False), job_id, chunk_index, worker))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, chunk_index, worker, error):
+        """分块处理失败：尝试次数未用完时放回队列，否则整个任务失败"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM chunks WHERE job_id = ? AND chunk_index = ? AND state = 'leased' "
+                               "AND worker = ?", (job_id, chunk_index, worker)).fetchone()
+            if row is None:
+                return
+            if row['attempts'] >= self.max_attempts:
+                self._fail_locked(conn, job_id, chunk_index, error)
+            else:
+                conn.execute("UPDATE chunks SET state = 'pending', worker = NULL, lease_expires = NULL, error = ? "
+                             "WHERE job_id = ? AND chunk_index = ?", (error, job_id, chunk_index))
+
+    def _fail_locked(self, conn, job_id, chunk_index, error):
+        conn.execute("UPDATE chunks SET state = 'failed', error = ? WHERE job_id = ? AND chunk_index = ?",
+                     (error, job_id, chunk_index))
+        conn.execute("UPDATE jobs SET state = 'failed', error = ?, finished_at = ? WHERE job_id = ? "
+                     "AND state = 'running'", (f"分块 {chunk_index} 失败: {error}", time.time(), job_id))
+
+    def finish(self, job_id, state, result=None, error=None):
+        """协调者合成结果后标记任务完成或失败"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                         (state, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                          time.time(), job_id))
+
+    def status(self, job_id):
+        """任务状态和各状态的分块数，任务不存在时抛出 KeyError"""
+        job = self._conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if job is None:
+            raise KeyError(job_id)
+        counts = dict(self._conn.execute('SELECT state, COUNT(*) FROM chunks WHERE job_id = ? GROUP BY state',
+                                         (job_id,)).fetchall())
+        return {
+            'job_id': job_id,
+            'state': job['state'],
+            'payload': json.loads(job['payload']),
+            'chunk_count': job['chunk_count'],
+            'chunks': counts,
+            'result': json.loads(job['result']) if job['result'] else None,
+            'error': job['error']
+        }
+
+    def running_results(self):
+        """未结束的任务中已完成分块的结果，缓存淘汰时保留它们引用的文件"""
+        rows = self._conn.execute("SELECT c.result FROM chunks c JOIN jobs j ON j.job_id = c.job_id "
+                                  "WHERE j.state = 'running' AND c.state = 'done'").fetchall()
+        return [json.loads(row['result']) for row in rows if row['result']]
+
+    def results(self, job_id):
+        """按顺序返回各分块的 (worker, attempts, 结果)"""
+        rows = self._conn.execute('SELECT worker, attempts, result FROM chunks WHERE job_id = ? ORDER BY chunk_index',
+                                  (job_id,)).fetchall()
+        return [(row['worker'], row['attempts'], json.loads(row['result']) if row['result'] else None)
+                for row in rows]